@@ -0,0 +1,164 @@
+import datetime
+import hashlib
+import os
+import tempfile
+import zlib
+
+from db import connection, transaction, resolve_path
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Generated invoices and uploaded vouchers, kept for good and stored once per distinct
+# content. Blobs are named by the SHA-256 of their original bytes and sharded into
+# ab/cd/ directories; archive_refs maps an invoice number or voucher reference to its
+# blob, so fetching one is a primary-key lookup and a single file read.
+ARCHIVE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'archive')
+# Compression is only kept when it saves at least this fraction of the size; PDFs
+# are often compressed already and then gain nothing
+MIN_SAVING = 0.05
+ZLIB_LEVEL = 6
+ZSTD_LEVEL = 10
+
+EXTENSIONS = {'none': '', 'zlib': '.z', 'zstd': '.zst'}
+
+ARCHIVE_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS archive_blobs(
+        sha256 TEXT PRIMARY KEY,
+        size INTEGER NOT NULL,
+        stored_size INTEGER NOT NULL,
+        compression TEXT NOT NULL,
+        created_at TEXT) WITHOUT ROWID""",
+    """CREATE TABLE IF NOT EXISTS archive_refs(
+        kind TEXT NOT NULL,
+        ref TEXT NOT NULL,
+        sha256 TEXT NOT NULL,
+        compression TEXT NOT NULL,
+        filename TEXT,
+        created_at TEXT,
+        PRIMARY KEY (kind, ref)) WITHOUT ROWID""",
+    "CREATE INDEX IF NOT EXISTS idx_archive_refs_blob ON archive_refs(sha256)",
+]
+
+
+def configure(archive_dir=None):
+    """Set the archive directory from app config"""
+    global ARCHIVE_DIR
+    if archive_dir:
+        ARCHIVE_DIR = os.path.abspath(archive_dir)
+
+
+_schema_ready = set()
+
+
+def ensure_schema(db_path=None):
+    """Create the archive index tables once per process and database"""
+    db_path = resolve_path(db_path)
+    if db_path in _schema_ready:
+        return
+    with transaction(db_path) as conn:
+        for statement in ARCHIVE_SCHEMA:
+            conn.execute(statement)
+    _schema_ready.add(db_path)
+
+
+def blob_path(sha256, compression):
+    return os.path.join(ARCHIVE_DIR, sha256[:2], sha256[2:4], sha256 + EXTENSIONS[compression])
+
+
+def compress(data):
+    """(compression, stored bytes): zstd when installed, else zlib, else the bytes as they are"""
+    if zstandard is not None:
+        packed, method = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data), 'zstd'
+    else:
+        packed, method = zlib.compress(data, ZLIB_LEVEL), 'zlib'
+    if len(packed) <= len(data) * (1 - MIN_SAVING):
+        return method, packed
+    return 'none', data
+
+
+def decompress(compression, stored):
+    if compression == 'zlib':
+        return zlib.decompress(stored)
+    if compression == 'zstd':
+        if zstandard is None:
+            raise RuntimeError("This blob is zstd-compressed; install the zstandard package to read it")
+        return zstandard.ZstdDecompressor().decompress(stored)
+    return stored
+
+
+def _write_blob(path, stored):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Unique temp file then rename: concurrent writers of the same content never see a partial blob
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(stored)
+    os.replace(temp_path, path)
+
+
+def put_blob(data, db_path=None):
+    """
+    Store data once under its SHA-256, compressed where that helps.
+    Returns (sha256, compression), which is all read_blob needs to get it back.
+    """
+    ensure_schema(db_path)
+    sha256 = hashlib.sha256(data).hexdigest()
+    with connection(db_path) as conn:
+        existing = conn.execute("SELECT compression FROM archive_blobs WHERE sha256 = ?", (sha256,)).fetchone()
+    if existing and os.path.exists(blob_path(sha256, existing['compression'])):
+        return sha256, existing['compression']
+    compression, stored = compress(data)
+    # The file is in place before any index row points at it
+    _write_blob(blob_path(sha256, compression), stored)
+    with connection(db_path) as conn:
+        conn.execute("INSERT OR REPLACE INTO archive_blobs(sha256, size, stored_size, compression, created_at) "
+                     "VALUES(?, ?, ?, ?, ?)", (sha256, len(data), len(stored), compression,
+                                               datetime.datetime.now().isoformat(timespec='seconds')))
+    return sha256, compression
+
+
+def read_blob(sha256, compression):
+    """The original bytes of a blob; raises OSError if its file is missing"""
+    with open(blob_path(sha256, compression), 'rb') as f:
+        return decompress(compression, f.read())
+
+
+def store(kind, ref, data, filename=None, db_path=None):
+    """
+    Archive data under (kind, ref), e.g. ('invoice', 'INV-000712') or ('voucher', <sha256>),
+    replacing whatever that ref pointed to before. Content already in the archive is
+    not written again. Returns the blob's SHA-256.
+    """
+    sha256, compression = put_blob(data, db_path)
+    with connection(db_path) as conn:
+        conn.execute("INSERT OR REPLACE INTO archive_refs(kind, ref, sha256, compression, filename, created_at) "
+                     "VALUES(?, ?, ?, ?, ?, ?)", (kind, ref, sha256, compression, filename,
+                                                  datetime.datetime.now().isoformat(timespec='seconds')))
+    return sha256
+
+
+def load(kind, ref, db_path=None):
+    """(data, filename) archived under (kind, ref), or None if there is none"""
+    ensure_schema(db_path)
+    with connection(db_path) as conn:
+        row = conn.execute("SELECT sha256, compression, filename FROM archive_refs WHERE kind = ? AND ref = ?",
+                           (kind, ref)).fetchone()
+    if not row:
+        return None
+    try:
+        return read_blob(row['sha256'], row['compression']), row['filename']
+    except OSError as e:
+        print(f"DEBUG: Archived {kind} {ref} is indexed but its blob could not be read: {e}")
+        return None
+
+
+def archive_stats(db_path=None):
+    """Blob count, original and stored bytes, and how many refs point at them"""
+    ensure_schema(db_path)
+    with connection(db_path) as conn:
+        blobs = conn.execute("SELECT COUNT(*) AS blobs, COALESCE(SUM(size), 0) AS size, "
+                             "COALESCE(SUM(stored_size), 0) AS stored_size FROM archive_blobs").fetchone()
+        refs = conn.execute("SELECT COUNT(*) FROM archive_refs").fetchone()[0]
+    return {'blobs': blobs['blobs'], 'refs': refs, 'bytes': blobs['size'], 'stored_bytes': blobs['stored_size']}
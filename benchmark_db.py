@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Invoice Database Benchmark
+Starts several worker processes (like gunicorn workers, each with a few request
+threads) that allocate invoice numbers and write ledger invoices to the same SQLite
+database at once, then checks that no number was handed out twice, that numbers
+given back at exit leave no gaps, that every invoice reached the ledger, and how
+long numbering and ledger writes waited on the write lock.
+
+    python benchmark_db.py                          # 8 processes x 2 threads x 100 invoices, WAL
+    python benchmark_db.py --processes 16 --block-size 1
+    python benchmark_db.py --journal-mode DELETE    # compare with the rollback journal
+"""
+
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import db
+from db import close_connections, connection
+from invoice_ledger import record_invoice
+from invoice_numbers import get_allocator, release_invoice_numbers, find_number_gaps
+
+
+def print_header(title):
+    print("\n" + "="*60)
+    print(f" {title}")
+    print("="*60)
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def sample_invoice(inv_num):
+    return {
+        'invoice_date': '2025-08-01', 'voucher_number': f"V{inv_num}", 'passenger_names': 'Guest, Test',
+        'customer_name': 'Guest, Test', 'billing_address': 'Travel with Flair (Pty) Ltd',
+        'check_in': '2025/08/01', 'check_out': '2025/08/03', 'length_of_stay': '2',
+        'total_payment_received': 100.0,
+        'line_items': [{'description': 'Accommodation', 'qty': 2, 'unit_price': 1250.0, 'total': 2500.0},
+                       {'description': 'Transport', 'qty': 1, 'unit_price': 400.0, 'total': 400.0}]
+    }
+
+
+def request_thread(allocator, db_path, count, start_event, out):
+    start_event.wait()
+    for _ in range(count):
+        started = time.perf_counter()
+        inv_num = allocator.allocate()
+        allocated = time.perf_counter()
+        record_invoice(sample_invoice(inv_num), inv_num, db_path=db_path)
+        out['numbers'].append(inv_num)
+        out['allocate_ms'].append((allocated - started) * 1000)
+        out['ledger_ms'].append((time.perf_counter() - allocated) * 1000)
+
+
+def worker(db_path, journal_mode, threads, count, block_size, start_event, results):
+    db.configure(db_path=db_path, journal_mode=journal_mode)
+    allocator = get_allocator(db_path, block_size=block_size)
+    out = {'numbers': [], 'allocate_ms': [], 'ledger_ms': []}
+    pool = [threading.Thread(target=request_thread, args=(allocator, db_path, count, start_event, out))
+            for _ in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    # Leave part of a block unused, as a worker shutting down mid-block would
+    release_invoice_numbers()
+    connections = db.get_pool(db_path).opened
+    close_connections()
+    results.put((os.getpid(), out, allocator.reservations, connections))
+
+
+def run(processes, threads, count, block_size, db_path, journal_mode):
+    ctx = multiprocessing.get_context('spawn')
+    start_event = ctx.Event()
+    results = ctx.Queue()
+    workers = [ctx.Process(target=worker, args=(db_path, journal_mode, threads, count, block_size,
+                                                start_event, results))
+               for _ in range(processes)]
+    for proc in workers:
+        proc.start()
+    time.sleep(0.5)  # let every worker import and get ready before starting together
+
+    started = time.perf_counter()
+    start_event.set()
+    collected = [results.get() for _ in workers]
+    elapsed = time.perf_counter() - started
+    for proc in workers:
+        proc.join()
+    return collected, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check invoice numbering and ledger writes across processes')
+    parser.add_argument('--processes', type=int, default=8)
+    parser.add_argument('--threads', type=int, default=2, help='Request threads per process')
+    parser.add_argument('--count', type=int, default=100, help='Invoices written per thread')
+    parser.add_argument('--block-size', type=int, default=10)
+    parser.add_argument('--journal-mode', default='WAL', help='WAL (default) or DELETE')
+    parser.add_argument('--db', help='Database file (default: a fresh temporary file)')
+    args = parser.parse_args()
+
+    db_path = os.path.abspath(args.db or os.path.join(tempfile.mkdtemp(), 'invoices.db'))
+    db.configure(db_path=db_path, journal_mode=args.journal_mode)
+    print_header("Invoice Numbering and Ledger Writes")
+    print(f"{args.processes} processes x {args.threads} threads x {args.count} invoices, "
+          f"blocks of {args.block_size}, {args.journal_mode} journal, db {db_path}")
+
+    collected, elapsed = run(args.processes, args.threads, args.count, args.block_size, db_path, args.journal_mode)
+    numbers = [n for _, out, _, _ in collected for n in out['numbers']]
+    allocate_ms = [t for _, out, _, _ in collected for t in out['allocate_ms']]
+    ledger_ms = [t for _, out, _, _ in collected for t in out['ledger_ms']]
+    reservations = sum(r for _, _, r, _ in collected)
+    connections = sum(c for _, _, _, c in collected)
+    duplicates = len(numbers) - len(set(numbers))
+    gaps = find_number_gaps(db_path)
+    with connection(db_path) as conn:
+        recorded = conn.execute("SELECT COUNT(*) FROM invoices").fetchone()[0]
+    missing = len(set(numbers)) - recorded
+
+    print_header("Results")
+    print(f"Written:          {len(numbers)} invoices in {elapsed:.2f}s ({len(numbers) / elapsed:.0f}/s)")
+    print(f"Block reservations (write-lock transactions): {reservations}")
+    print(f"Connections opened: {connections} across {args.processes} processes")
+    for label, samples in (('Numbering', allocate_ms), ('Ledger write', ledger_ms)):
+        print(f"{label + ' latency:':<22}p50 {percentile(samples, 50):.2f} ms, p99 {percentile(samples, 99):.2f} ms, "
+              f"max {max(samples):.2f} ms")
+    print(f"{'✓' if not duplicates else '✗'} Duplicates: {duplicates}")
+    print(f"{'✓' if not gaps else '✗'} Gaps: {len(gaps)}")
+    print(f"{'✓' if not missing else '✗'} Invoices missing from the ledger: {missing}")
+    return 1 if duplicates or gaps or missing else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
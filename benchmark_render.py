@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""
+Rendering Benchmark
+Renders a fixed set of invoices with every available PDF engine and reports
+latency percentiles, peak RSS and output size. Results can be saved as a JSON
+baseline and later runs checked against it so slow template changes get caught.
+
+    python benchmark_render.py                      # run and print results
+    python benchmark_render.py --save-baseline      # store results as the baseline
+    python benchmark_render.py --check              # fail if slower than the baseline
+    python benchmark_render.py --check-determinism  # fail if two renders differ in bytes
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+LINE_ITEM_SIZES = [1, 5, 20, 100]
+DEFAULT_BASELINE = os.path.join('benchmarks', 'render_baseline.json')
+
+
+def print_header(title):
+    print("\n" + "="*60)
+    print(f" {title}")
+    print("="*60)
+
+
+def build_fixture(line_item_count):
+    """Build a deterministic invoice with the given number of line items"""
+    line_items = [{
+        'description': 'Accommodation - Room booked for guest',
+        'qty': 30,
+        'unit_price': 850.0,
+        'total': 25500.0
+    }]
+    extras = [
+        ('Daily Transport - Airport and site transfers', 300.0),
+        ('Personal Services - Laundry', 150.0),
+        ('Meals - Dinner', 220.0)
+    ]
+    for i in range(line_item_count - 1):
+        description, price = extras[i % len(extras)]
+        line_items.append({
+            'description': f"{description} (day {i + 1})",
+            'qty': 1,
+            'unit_price': price,
+            'total': price
+        })
+    return {
+        'check_in': '2025/08/01',
+        'check_out': '2025/08/31',
+        'length_of_stay': '30',
+        'voucher_number': 'G846886',
+        'passenger_names': 'KEKANA, THABO MR',
+        'customer_name': 'KEKANA, THABO MR',
+        'total_payment_received': '0.00',
+        'invoice_date': '2025-08-31',
+        'invoice_total': sum(item['total'] for item in line_items),
+        'line_items': line_items
+    }
+
+
+def available_engines():
+    from invoice_renderer import wkhtmltopdf_available
+    engines = ['reportlab']
+    if wkhtmltopdf_available():
+        engines.insert(0, 'wkhtmltopdf')
+    return engines
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def peak_rss_kb():
+    """Peak RSS of this process and of any renderer subprocesses, in KB"""
+    if resource is None:
+        return None
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    if sys.platform == 'darwin':  # macOS reports bytes
+        own, children = own // 1024, children // 1024
+    return max(own, children)
+
+
+def run_case(engine, line_item_count, iterations, warmup):
+    """Benchmark one engine/size pair in this process and return its measurements"""
+    from main import app
+    from invoice_renderer import render_invoice_pdf_wkhtmltopdf, render_invoice_pdf_reportlab
+
+    render = render_invoice_pdf_wkhtmltopdf if engine == 'wkhtmltopdf' else render_invoice_pdf_reportlab
+    timings = []
+    output_size = 0
+    with app.app_context():
+        for i in range(warmup + iterations):
+            invoice_data = build_fixture(line_item_count)
+            started = time.perf_counter()
+            pdf_bytes = render(invoice_data, 'INV-000001')
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            if i >= warmup:
+                timings.append(elapsed_ms)
+            output_size = len(pdf_bytes)
+
+    return {
+        'iterations': iterations,
+        'p50_ms': round(percentile(timings, 50), 2),
+        'p95_ms': round(percentile(timings, 95), 2),
+        'p99_ms': round(percentile(timings, 99), 2),
+        'peak_rss_kb': peak_rss_kb(),
+        'output_bytes': output_size
+    }
+
+
+def run_case_isolated(engine, line_item_count, iterations, warmup):
+    """Run a case in a fresh interpreter so peak RSS belongs to that case alone"""
+    cmd = [sys.executable, os.path.abspath(__file__), '--worker', engine, str(line_item_count),
+           '--iterations', str(iterations), '--warmup', str(warmup)]
+    # The app's own background warm-up would overlap the measured renders
+    env = dict(os.environ, RENDERER_WARMUP='0')
+    proc = subprocess.run(cmd, capture_output=True, text=True, env=env,
+                          cwd=os.path.dirname(os.path.abspath(__file__)))
+    if proc.returncode != 0:
+        raise RuntimeError(f"{engine}/{line_item_count} failed:\n{proc.stderr.strip()}")
+    # The app prints debug output; the measurements are always the last line
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def run_benchmark(engines, sizes, iterations, warmup):
+    results = {}
+    for engine in engines:
+        results[engine] = {}
+        for size in sizes:
+            print(f"Rendering {size:>3} line items with {engine}...")
+            results[engine][str(size)] = run_case_isolated(engine, size, iterations, warmup)
+    return {
+        'generated_at': datetime.datetime.now().isoformat(timespec='seconds'),
+        'host': platform.node(),
+        'python': platform.python_version(),
+        'results': results
+    }
+
+
+def print_results(report):
+    print_header("Render Benchmark Results")
+    print(f"{'engine':<12} {'items':>5} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'peak RSS KB':>12} {'bytes':>9}")
+    for engine, cases in report['results'].items():
+        for size, r in cases.items():
+            rss = r['peak_rss_kb'] if r['peak_rss_kb'] is not None else '-'
+            print(f"{engine:<12} {size:>5} {r['p50_ms']:>9} {r['p95_ms']:>9} {r['p99_ms']:>9} {rss:>12} {r['output_bytes']:>9}")
+
+
+def check_determinism(engines, sizes):
+    """Render each fixture twice per engine and confirm the PDF bytes are identical"""
+    from main import app
+    from invoice_renderer import render_invoice_pdf_wkhtmltopdf, render_invoice_pdf_reportlab
+
+    print_header("Determinism Check")
+    failures = 0
+    with app.app_context():
+        for engine in engines:
+            render = render_invoice_pdf_wkhtmltopdf if engine == 'wkhtmltopdf' else render_invoice_pdf_reportlab
+            for size in sizes:
+                first = render(build_fixture(size), 'INV-000001', deterministic=True)
+                time.sleep(1.1)  # make sure a wall-clock timestamp would differ
+                second = render(build_fixture(size), 'INV-000001', deterministic=True)
+                if first == second:
+                    print(f"✓ {engine} with {size} line items is byte-identical")
+                else:
+                    failures += 1
+                    print(f"✗ {engine} with {size} line items differs between renders")
+    return failures
+
+
+def compare_to_baseline(report, baseline, threshold):
+    """Return a list of regressions where p50 exceeds the baseline by more than threshold"""
+    regressions = []
+    for engine, cases in report['results'].items():
+        for size, r in cases.items():
+            base = baseline.get('results', {}).get(engine, {}).get(size)
+            if not base:
+                continue
+            if r['p50_ms'] > base['p50_ms'] * threshold:
+                regressions.append(
+                    f"{engine} with {size} line items: p50 {r['p50_ms']} ms vs baseline {base['p50_ms']} ms")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark invoice PDF rendering engines')
+    parser.add_argument('--engines', help='Comma-separated engines (default: all available)')
+    parser.add_argument('--sizes', default=','.join(str(s) for s in LINE_ITEM_SIZES),
+                        help='Comma-separated line item counts')
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--warmup', type=int, default=2)
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='Baseline JSON file')
+    parser.add_argument('--save-baseline', action='store_true', help='Store these results as the baseline')
+    parser.add_argument('--check', action='store_true', help='Exit non-zero if slower than the baseline')
+    parser.add_argument('--threshold', type=float, default=1.5,
+                        help='Allowed p50 slowdown factor before --check fails')
+    parser.add_argument('--output', help='Also write the results JSON to this file')
+    parser.add_argument('--check-determinism', action='store_true',
+                        help='Only check that repeated renders are byte-identical')
+    parser.add_argument('--worker', nargs=2, metavar=('ENGINE', 'SIZE'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        engine, size = args.worker
+        print(json.dumps(run_case(engine, int(size), args.iterations, args.warmup)))
+        return 0
+
+    engines = args.engines.split(',') if args.engines else available_engines()
+    sizes = [int(s) for s in args.sizes.split(',')]
+    if args.check_determinism:
+        return 1 if check_determinism(engines, sizes) else 0
+
+    report = run_benchmark(engines, sizes, args.iterations, args.warmup)
+    print_results(report)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline) or '.', exist_ok=True)
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nBaseline saved to {args.baseline}")
+
+    if args.check:
+        if not os.path.exists(args.baseline):
+            print(f"\nNo baseline found at {args.baseline}; run with --save-baseline first")
+            return 1
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(report, baseline, args.threshold)
+        if regressions:
+            print_header("Regressions")
+            for line in regressions:
+                print(f"✗ {line}")
+            return 1
+        print("\n✓ No regressions against the baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
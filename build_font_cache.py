@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Font Cache Builder
+Builds the fontconfig cache for the fonts bundled in assets/fonts, so wkhtmltopdf
+never scans for fonts while rendering. Run it once on the host after every deploy
+(the cache records absolute paths, so it cannot be built elsewhere and uploaded):
+
+    python build_font_cache.py
+"""
+
+import os
+import subprocess
+import sys
+
+from invoice_renderer import FONTS_DIR, FONTCONFIG_FILE, renderer_environ
+
+# Families invoice.html asks for; each should resolve to a bundled font
+CHECK_FAMILIES = ['Segoe UI', 'Tahoma', 'Geneva', 'Verdana', 'sans-serif', 'Courier New', 'monospace']
+
+
+def print_header(title):
+    print("\n" + "="*60)
+    print(f" {title}")
+    print("="*60)
+
+
+def build_font_cache():
+    """Run fc-cache against the private fontconfig file; returns True on success"""
+    try:
+        result = subprocess.run(['fc-cache', '-f', '-v'], env=renderer_environ(),
+                                capture_output=True, text=True)
+    except FileNotFoundError:
+        print("✗ fc-cache not found; install fontconfig on this host")
+        return False
+    if result.returncode != 0:
+        print(f"✗ fc-cache failed:\n{result.stderr.strip()}")
+        return False
+    print(f"✓ Font cache built in {os.path.join(FONTS_DIR, 'cache')}")
+    return True
+
+
+def check_font_resolution():
+    """Confirm every requested family resolves to a bundled font file"""
+    all_bundled = True
+    for family in CHECK_FAMILIES:
+        result = subprocess.run(['fc-match', '-f', '%{file}', family], env=renderer_environ(),
+                                capture_output=True, text=True)
+        font_file = result.stdout.strip()
+        bundled = os.path.dirname(os.path.abspath(font_file)) == os.path.abspath(FONTS_DIR)
+        all_bundled = all_bundled and bundled
+        print(f"{'✓' if bundled else '✗'} {family:<12} -> {font_file or 'no match'}")
+    return all_bundled
+
+
+def main():
+    print_header("Building Font Cache")
+    if not os.path.exists(FONTCONFIG_FILE):
+        print(f"✗ {FONTCONFIG_FILE} missing")
+        return 1
+    if not build_font_cache():
+        return 1
+
+    print_header("Checking Font Resolution")
+    return 0 if check_font_resolution() else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,197 @@
+import csv
+import io
+import json
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from invoice_renderer import build_invoice_data, render_invoice_pdf
+
+# CSV columns for bulk uploads: one row per line item, rows sharing an
+# invoice_number (or voucher_number when no number is given) form one invoice
+CSV_INVOICE_FIELDS = ['invoice_number', 'voucher_number', 'passenger_names', 'check_in',
+                      'check_out', 'length_of_stay', 'total_payment_received']
+CSV_LINE_ITEM_FIELDS = ['description', 'qty', 'unit_price', 'total']
+
+# Progress of running and recently finished bulk jobs, keyed by job id
+BULK_JOBS = {}
+_jobs_lock = threading.Lock()
+JOB_RETENTION_SECONDS = 3600
+
+
+def invoice_data_from_payload(payload):
+    """
+    Convert one bulk payload into invoice data.
+    Accepts either review-form fields (description_0, qty_0, ...) or a
+    structured dict with a 'line_items' list.
+    """
+    if not isinstance(payload.get('line_items'), list):
+        return build_invoice_data(payload)
+
+    form = {k: v for k, v in payload.items() if k != 'line_items'}
+    for i, item in enumerate(payload['line_items']):
+        qty = item.get('qty', 0)
+        unit_price = item.get('unit_price', 0)
+        total = item.get('total')
+        if total in (None, ''):
+            try:
+                total = int(qty) * float(unit_price)
+            except (ValueError, TypeError):
+                total = 0
+        form[f'description_{i}'] = str(item.get('description', ''))
+        form[f'qty_{i}'] = str(qty)
+        form[f'unit_price_{i}'] = str(unit_price)
+        form[f'total_{i}'] = str(total)
+    return build_invoice_data(form)
+
+
+def parse_bulk_csv(text):
+    """Group CSV rows into structured invoice payloads"""
+    payloads = {}
+    for row in csv.DictReader(io.StringIO(text)):
+        row = {k.strip(): (v or '').strip() for k, v in row.items() if k}
+        key = row.get('invoice_number') or row.get('voucher_number')
+        if not key:
+            continue
+        if key not in payloads:
+            payloads[key] = {f: row.get(f, '') for f in CSV_INVOICE_FIELDS}
+            payloads[key]['line_items'] = []
+        if row.get('description'):
+            payloads[key]['line_items'].append({f: row.get(f, '') for f in CSV_LINE_ITEM_FIELDS})
+    return list(payloads.values())
+
+
+def check_bulk_payloads(body):
+    """Return the invoice list from a JSON body, raising ValueError for anything that is not a list of objects"""
+    payloads = body.get('invoices', []) if isinstance(body, dict) else body
+    if not isinstance(payloads, list):
+        raise ValueError('expected a list of invoices')
+    for index, payload in enumerate(payloads):
+        if not isinstance(payload, dict):
+            raise ValueError(f'invoice {index} is not an object')
+        items = payload.get('line_items')
+        if isinstance(items, list) and not all(isinstance(item, dict) for item in items):
+            raise ValueError(f'invoice {index} has a line item that is not an object')
+    return payloads
+
+
+def parse_bulk_request(req):
+    """Read bulk invoice payloads from a JSON body or an uploaded JSON/CSV file"""
+    if req.is_json:
+        return check_bulk_payloads(req.get_json())
+
+    file = req.files.get('invoices_file')
+    if not file or not file.filename:
+        return []
+    text = file.read().decode('utf-8-sig')
+    if file.filename.lower().endswith('.json'):
+        return check_bulk_payloads(json.loads(text))
+    return parse_bulk_csv(text)
+
+
+def start_job(job_id, total, skipped=0):
+    now = time.time()
+    with _jobs_lock:
+        # Drop finished jobs nobody has asked about for a while
+        for old_id in [j for j, p in BULK_JOBS.items()
+                       if p['finished_at'] and now - p['finished_at'] > JOB_RETENTION_SECONDS]:
+            del BULK_JOBS[old_id]
+        BULK_JOBS[job_id] = {
+            'job_id': job_id,
+            'status': 'running',
+            'total': total,
+            'done': 0,
+            'failed': 0,
+            'skipped': skipped,
+            'started_at': now,
+            'finished_at': None
+        }
+
+
+def _update_job(job_id, **changes):
+    with _jobs_lock:
+        job = BULK_JOBS.get(job_id)
+        if not job:
+            return
+        for key, value in changes.items():
+            job[key] = job[key] + value if key in ('done', 'failed') else value
+
+
+def get_job_progress(job_id):
+    with _jobs_lock:
+        job = BULK_JOBS.get(job_id)
+        return dict(job) if job else None
+
+
+class _ZipStream:
+    """Write-only file object collecting zip output until the generator drains it"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        chunks, self._chunks = self._chunks, []
+        return b''.join(chunks)
+
+
+def _render_in_app(app, invoice_data, inv_num):
+    # Worker threads have no app context of their own for render_template
+    with app.app_context():
+        return render_invoice_pdf(invoice_data, inv_num)
+
+
+def skipped_report(skipped):
+    """Text listing vouchers left out of a bulk run because they were already invoiced"""
+    lines = [f"Voucher {voucher_number} was already invoiced as {invoice_number}"
+             for voucher_number, invoice_number in skipped]
+    return "\n".join(lines) + "\n"
+
+
+def stream_invoice_zip(app, jobs, job_id, max_workers=4, skipped=(), on_rendered=None):
+    """
+    Render (invoice_data, invoice_number) jobs on a worker pool and yield a ZIP
+    archive chunk by chunk as each PDF finishes. Skipped duplicate vouchers are
+    listed in skipped_duplicates.txt. on_rendered(invoice_data, invoice_number) is
+    called for each invoice once its PDF exists, never for one that failed.
+    """
+    stream = _ZipStream()
+    pool = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        # PDFs are already compressed, so store them rather than deflate again
+        with zipfile.ZipFile(stream, 'w', compression=zipfile.ZIP_STORED) as zf:
+            if skipped:
+                zf.writestr("skipped_duplicates.txt", skipped_report(skipped))
+            futures = {pool.submit(_render_in_app, app, invoice_data, inv_num): (invoice_data, inv_num)
+                       for invoice_data, inv_num in jobs}
+            for future in as_completed(futures):
+                invoice_data, inv_num = futures[future]
+                try:
+                    pdf_bytes = future.result()
+                except Exception as e:
+                    print(f"Bulk export: failed to render {inv_num}: {e}")
+                    zf.writestr(f"errors/Invoice_{inv_num}.txt", f"Failed to render invoice: {e}")
+                    _update_job(job_id, failed=1)
+                else:
+                    zf.writestr(f"Invoice_{inv_num}.pdf", pdf_bytes)
+                    if on_rendered:
+                        on_rendered(invoice_data, inv_num)
+                    _update_job(job_id, done=1)
+                yield stream.drain()
+        yield stream.drain()
+        _update_job(job_id, status='finished', finished_at=time.time())
+    except GeneratorExit:
+        _update_job(job_id, status='cancelled', finished_at=time.time())
+        raise
+    except Exception:
+        _update_job(job_id, status='failed', finished_at=time.time())
+        raise
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,147 @@
+import atexit
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+# One pool of long-lived connections per process for invoices.db. Connections are
+# opened once with WAL and the pragmas below, then lent to one thread at a time, so
+# request handlers no longer pay for a connect and schema read on every query.
+DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'invoices.db')
+JOURNAL_MODE = 'WAL'      # readers never block the writer; use DELETE on filesystems without shared memory
+SYNCHRONOUS = 'NORMAL'    # safe with WAL: a power cut can lose the last commits but never corrupts
+BUSY_TIMEOUT_MS = 30000   # how long a write waits for another process's write lock
+CACHED_STATEMENTS = 256   # prepared statements kept per connection
+POOL_SIZE = 8             # idle connections kept per process; busier moments open extra ones
+
+
+def configure(db_path=None, journal_mode=None, synchronous=None, busy_timeout_ms=None):
+    """Apply the app's database settings; call before the first connection is used"""
+    global DB_PATH, JOURNAL_MODE, SYNCHRONOUS, BUSY_TIMEOUT_MS
+    if db_path:
+        DB_PATH = os.path.abspath(db_path)
+    if journal_mode:
+        JOURNAL_MODE = journal_mode.upper()
+    if synchronous:
+        SYNCHRONOUS = synchronous.upper()
+    if busy_timeout_ms is not None:
+        BUSY_TIMEOUT_MS = int(busy_timeout_ms)
+
+
+def resolve_path(db_path=None):
+    """The absolute database path for db_path, or the configured one"""
+    return os.path.abspath(db_path) if db_path else DB_PATH
+
+
+def open_connection(db_path):
+    """
+    A new tuned connection. isolation_level=None: the only transactions are the ones
+    callers open explicitly with BEGIN, so nothing holds a lock between statements.
+    """
+    conn = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT_MS / 1000, isolation_level=None,
+                           check_same_thread=False, cached_statements=CACHED_STATEMENTS)
+    conn.row_factory = sqlite3.Row
+    conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+    conn.execute(f"PRAGMA journal_mode = {JOURNAL_MODE}")
+    conn.execute(f"PRAGMA synchronous = {SYNCHRONOUS}")
+    conn.execute("PRAGMA foreign_keys = ON")
+    return conn
+
+
+class ConnectionPool:
+    """Connections to one database, each used by a single thread at a time"""
+
+    def __init__(self, db_path, size=POOL_SIZE):
+        self.db_path = db_path
+        self.size = size
+        self.opened = 0
+        self._idle = []
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def acquire(self):
+        with self._lock:
+            if os.getpid() != self._pid:
+                # Connections inherited across a fork must never be used (or closed) by the child
+                self._idle = []
+                self.opened = 0
+                self._pid = os.getpid()
+            if self._idle:
+                return self._idle.pop()
+            self.opened += 1
+        return open_connection(self.db_path)
+
+    def release(self, conn):
+        if conn.in_transaction:
+            # A caller failed between BEGIN and COMMIT; never lend out a half-done transaction
+            conn.rollback()
+        with self._lock:
+            if os.getpid() == self._pid and len(self._idle) < self.size:
+                self._idle.append(conn)
+                return
+            self.opened -= 1
+        conn.close()
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+            if os.getpid() != self._pid:
+                return 0
+            self.opened -= len(idle)
+        for conn in idle:
+            conn.close()
+        return len(idle)
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_path=None):
+    path = resolve_path(db_path)
+    with _pools_lock:
+        pool = _pools.get(path)
+        if pool is None:
+            pool = ConnectionPool(path)
+            _pools[path] = pool
+        return pool
+
+
+@contextmanager
+def connection(db_path=None):
+    """Borrow a pooled connection for the duration of the block"""
+    pool = get_pool(db_path)
+    conn = pool.acquire()
+    try:
+        yield conn
+    finally:
+        pool.release(conn)
+
+
+@contextmanager
+def transaction(db_path=None, mode='IMMEDIATE'):
+    """
+    Borrow a connection inside BEGIN IMMEDIATE ... COMMIT, rolled back on error.
+    IMMEDIATE takes the write lock up front, so the transaction never fails halfway
+    with SQLITE_BUSY after reading.
+    """
+    with connection(db_path) as conn:
+        conn.execute(f"BEGIN {mode}")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+
+def close_connections():
+    """Close every idle pooled connection; runs at interpreter and worker exit"""
+    for pool in list(_pools.values()):
+        try:
+            pool.close()
+        except sqlite3.Error as e:
+            print(f"DEBUG: Could not close database connections for {pool.db_path}: {e}")
+
+
+atexit.register(close_connections)
@@ -92,6 +92,26 @@ def main():
         'requirements.txt',
         'voucher_parser.py',
         'invoice_generator.py',
+        'invoice_renderer.py',
+        'invoice_payload.py',
+        'invoice_formats.py',
+        'bulk_export.py',
+        'payment_stamp.py',
+        'money.py',
+        'render_manager.py',
+        'submission_pack.py',
+        'invoice_numbers.py',
+        'invoice_ledger.py',
+        'invoice_search.py',
+        'invoice_rollups.py',
+        'invoice_export.py',
+        'export_invoices.py',
+        'db.py',
+        'archive_store.py',
+        'draft_store.py',
+        'idempotency.py',
+        'gunicorn.conf.py',
+        'build_font_cache.py',
         'README.md',
         'PYTHONANYWHERE_DEPLOYMENT.md'
     ]
@@ -113,6 +133,9 @@ def main():
             shutil.copytree(dir_path, os.path.join(deploy_dir, dir_path))
             print(f"  ✓ Copied {dir_path}/")
     
+    # The font cache holds host-specific paths; it is built on the server instead
+    shutil.rmtree(os.path.join(deploy_dir, 'assets', 'fonts', 'cache'), ignore_errors=True)
+    
     # Create uploads and generated directories
     os.makedirs(os.path.join(deploy_dir, 'uploads'), exist_ok=True)
     os.makedirs(os.path.join(deploy_dir, 'generated'), exist_ok=True)
@@ -127,6 +150,7 @@ def main():
     print("4. Create a directory called 'UlendoInvoiceApp'")
     print("5. Upload all files from the 'deployment_package' folder")
     print("6. Follow the detailed instructions in PYTHONANYWHERE_DEPLOYMENT.md")
+    print("7. In a Bash console, run 'python build_font_cache.py' to build the invoice font cache")
     
     print("\nImportant Notes:")
     print("- Free accounts have limited storage and processing power")
@@ -0,0 +1,103 @@
+import json
+import re
+import secrets
+import time
+
+from db import connection, transaction, resolve_path
+
+# Invoice data on its way from upload, manual entry or edit to the review form is kept
+# here, and only a short draft id travels in the URL. The review page autosaves into
+# the draft as staff edit it; every save pushes the expiry back by DRAFT_TTL_SECONDS.
+DRAFT_TTL_SECONDS = 24 * 3600
+PURGE_INTERVAL = 600  # expired drafts are deleted at most this often, on the next write
+DRAFT_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{12}$')
+
+DRAFT_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS drafts(
+        draft_id TEXT PRIMARY KEY,
+        data TEXT NOT NULL,
+        updated_at REAL NOT NULL,
+        expires_at REAL NOT NULL) WITHOUT ROWID""",
+    "CREATE INDEX IF NOT EXISTS idx_drafts_expires ON drafts(expires_at)",
+]
+
+
+def configure(ttl_seconds=None):
+    """Set how long an untouched draft is kept"""
+    global DRAFT_TTL_SECONDS
+    if ttl_seconds:
+        DRAFT_TTL_SECONDS = int(ttl_seconds)
+
+
+_schema_ready = set()
+_last_purge = 0.0
+
+
+def ensure_schema(db_path=None):
+    """Create the drafts table once per process and database"""
+    db_path = resolve_path(db_path)
+    if db_path in _schema_ready:
+        return
+    with transaction(db_path) as conn:
+        for statement in DRAFT_SCHEMA:
+            conn.execute(statement)
+    _schema_ready.add(db_path)
+
+
+def _purge_if_due(db_path):
+    global _last_purge
+    if time.time() - _last_purge > PURGE_INTERVAL:
+        _last_purge = time.time()
+        purge_expired_drafts(db_path)
+
+
+def create_draft(data, db_path=None):
+    """Store invoice data as a new draft and return its id"""
+    ensure_schema(db_path)
+    _purge_if_due(db_path)
+    draft_id = secrets.token_urlsafe(9)
+    now = time.time()
+    with connection(db_path) as conn:
+        conn.execute("INSERT INTO drafts(draft_id, data, updated_at, expires_at) VALUES(?, ?, ?, ?)",
+                     (draft_id, json.dumps(data), now, now + DRAFT_TTL_SECONDS))
+    return draft_id
+
+
+def load_draft(draft_id, db_path=None):
+    """The draft's data, or None if the id is unknown or the draft has expired"""
+    if not DRAFT_ID_PATTERN.match(draft_id or ''):
+        return None
+    ensure_schema(db_path)
+    with connection(db_path) as conn:
+        row = conn.execute("SELECT data FROM drafts WHERE draft_id = ? AND expires_at > ?",
+                           (draft_id, time.time())).fetchone()
+    return json.loads(row['data']) if row else None
+
+
+def save_draft(draft_id, data, db_path=None):
+    """Replace a draft's data and extend its expiry. Returns False if it has already expired."""
+    if not DRAFT_ID_PATTERN.match(draft_id or ''):
+        return False
+    ensure_schema(db_path)
+    _purge_if_due(db_path)
+    now = time.time()
+    with connection(db_path) as conn:
+        cursor = conn.execute("UPDATE drafts SET data = ?, updated_at = ?, expires_at = ? "
+                              "WHERE draft_id = ? AND expires_at > ?",
+                              (json.dumps(data), now, now + DRAFT_TTL_SECONDS, draft_id, now))
+        return cursor.rowcount > 0
+
+
+def delete_draft(draft_id, db_path=None):
+    if not DRAFT_ID_PATTERN.match(draft_id or ''):
+        return
+    ensure_schema(db_path)
+    with connection(db_path) as conn:
+        conn.execute("DELETE FROM drafts WHERE draft_id = ?", (draft_id,))
+
+
+def purge_expired_drafts(db_path=None):
+    """Delete expired drafts; returns how many there were"""
+    ensure_schema(db_path)
+    with connection(db_path) as conn:
+        return conn.execute("DELETE FROM drafts WHERE expires_at <= ?", (time.time(),)).rowcount
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Invoice CSV Export
+Writes ledger invoices for a date range as CSV for the bookkeeper, in one of the
+accounting import layouts. Rows stream from the database to the file, so a year's
+export needs no more memory than a day's:
+
+    python export_invoices.py --from 2025-01-01 --to 2025-12-31 --preset xero -o invoices_2025.csv
+    python export_invoices.py --from 2025-08-01 --to 2025-08-31          # summary to stdout
+"""
+
+import argparse
+import datetime
+import os
+import sys
+import time
+
+import db
+from invoice_export import PRESETS, stream_invoices_csv
+
+
+def iso_date(value):
+    datetime.date.fromisoformat(value)
+    return value
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export ledger invoices as CSV for accounting software')
+    parser.add_argument('--from', dest='start', type=iso_date, help='First invoice date (YYYY-MM-DD)')
+    parser.add_argument('--to', dest='end', type=iso_date, help='Last invoice date (YYYY-MM-DD)')
+    parser.add_argument('--preset', choices=sorted(PRESETS), default='summary')
+    parser.add_argument('-o', '--output', help='CSV file to write (default: stdout)')
+    parser.add_argument('--db', default=os.getenv('INVOICE_DB_PATH'),
+                        help='invoices.db to read (default: INVOICE_DB_PATH or the project database)')
+    args = parser.parse_args()
+
+    if args.db:
+        db.configure(db_path=args.db)
+    started = time.perf_counter()
+    out = open(args.output, 'w', encoding='utf-8', newline='') if args.output else sys.stdout
+    try:
+        written = 0
+        for chunk in stream_invoices_csv(args.preset, start=args.start, end=args.end):
+            out.write(chunk)
+            written += len(chunk)
+    finally:
+        if args.output:
+            out.close()
+    if args.output:
+        print(f"✓ Wrote {written / 1024:.0f} KB to {args.output} in {time.perf_counter() - started:.2f}s",
+              file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,16 @@
+# gunicorn -c gunicorn.conf.py main:app
+import os
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.getenv('GUNICORN_WORKERS', 2))
+threads = int(os.getenv('GUNICORN_THREADS', 4))
+# Renders can take a while; keep in step with RENDER_TIMEOUT + RENDER_QUEUE_TIMEOUT
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 120))
+
+
+def worker_exit(server, worker):
+    """Give back the worker's unused invoice numbers and close its database connections"""
+    from db import close_connections
+    from invoice_numbers import release_invoice_numbers
+    release_invoice_numbers()
+    close_connections()
@@ -0,0 +1,130 @@
+import hashlib
+import re
+import time
+
+from archive_store import put_blob, read_blob
+from db import connection, transaction, resolve_path
+
+# Each review form carries a random idempotency key. The first submission claims the
+# key (state 'pending'), renders, and records its result: invoice number, the response
+# blob's SHA-256 in the archive, and how it was sent. A repeat of the same submission
+# within the window - a double-click or a browser retry - gets that response back
+# without rendering or allocating another invoice number. The key is combined with a
+# fingerprint of the form, so the same form submitted with other values or another
+# format is a separate request.
+IDEMPOTENCY_WINDOW_SECONDS = 3600
+PENDING_TIMEOUT_SECONDS = 120  # a claim older than this belonged to a request that died
+PENDING_WAIT_SECONDS = 30      # how long a repeat waits for the first submission to finish
+POLL_INTERVAL = 0.2
+PURGE_INTERVAL = 600
+KEY_PATTERN = re.compile(r'^[A-Za-z0-9_-]{16,64}$')
+
+IDEMPOTENCY_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS idempotency_keys(
+        request_key TEXT PRIMARY KEY,
+        state TEXT NOT NULL,
+        invoice_number TEXT,
+        sha256 TEXT,
+        compression TEXT,
+        mimetype TEXT,
+        filename TEXT,
+        created_at REAL NOT NULL,
+        expires_at REAL NOT NULL) WITHOUT ROWID""",
+    "CREATE INDEX IF NOT EXISTS idx_idempotency_expires ON idempotency_keys(expires_at)",
+]
+
+
+def configure(window_seconds=None):
+    """Set how long a completed request can be replayed"""
+    global IDEMPOTENCY_WINDOW_SECONDS
+    if window_seconds:
+        IDEMPOTENCY_WINDOW_SECONDS = int(window_seconds)
+
+
+_schema_ready = set()
+_last_purge = 0.0
+
+
+def ensure_schema(db_path=None):
+    """Create the idempotency table once per process and database"""
+    db_path = resolve_path(db_path)
+    if db_path in _schema_ready:
+        return
+    with transaction(db_path) as conn:
+        for statement in IDEMPOTENCY_SCHEMA:
+            conn.execute(statement)
+    _schema_ready.add(db_path)
+
+
+def request_key(key, form, ignore=('idempotency_key', 'draft_id')):
+    """
+    The stored key for one submission: the form's key plus a hash of everything else
+    it sent. None when the form carries no usable key.
+    """
+    if not KEY_PATTERN.match(key or ''):
+        return None
+    fingerprint = hashlib.sha256()
+    for name in sorted(form):
+        if name not in ignore:
+            fingerprint.update(f"{name}\0{form[name]}\0".encode('utf-8'))
+    return f"{key}:{fingerprint.hexdigest()[:32]}"
+
+
+def claim(req_key, db_path=None):
+    """
+    Claim a request key. Returns None when the caller now owns it and should do the
+    work, or the existing row (state 'pending' or 'done') when another submission has it.
+    """
+    global _last_purge
+    ensure_schema(db_path)
+    now = time.time()
+    with transaction(db_path) as conn:
+        if now - _last_purge > PURGE_INTERVAL:
+            _last_purge = now
+            conn.execute("DELETE FROM idempotency_keys WHERE expires_at <= ?", (now,))
+        row = conn.execute("SELECT * FROM idempotency_keys WHERE request_key = ?", (req_key,)).fetchone()
+        if row and row['expires_at'] > now and not (
+                row['state'] == 'pending' and now - row['created_at'] > PENDING_TIMEOUT_SECONDS):
+            return dict(row)
+        conn.execute("INSERT OR REPLACE INTO idempotency_keys(request_key, state, created_at, expires_at) "
+                     "VALUES(?, 'pending', ?, ?)", (req_key, now, now + IDEMPOTENCY_WINDOW_SECONDS))
+    return None
+
+
+def complete(req_key, invoice_number, content, mimetype, filename, db_path=None):
+    """Record the response of a claimed request so repeats can be answered with it"""
+    sha256, compression = put_blob(content, db_path)
+    with connection(db_path) as conn:
+        conn.execute("UPDATE idempotency_keys SET state = 'done', invoice_number = ?, sha256 = ?, compression = ?, "
+                     "mimetype = ?, filename = ? WHERE request_key = ?",
+                     (invoice_number, sha256, compression, mimetype, filename, req_key))
+
+
+def release(req_key, db_path=None):
+    """Give up a claim after a failure, so a retry does the work again"""
+    with connection(db_path) as conn:
+        conn.execute("DELETE FROM idempotency_keys WHERE request_key = ? AND state = 'pending'", (req_key,))
+
+
+def wait_for_result(req_key, timeout=None, db_path=None):
+    """Poll until a pending request is done; returns its row, or None if it is still pending or was released"""
+    deadline = time.time() + (PENDING_WAIT_SECONDS if timeout is None else timeout)
+    while True:
+        with connection(db_path) as conn:
+            row = conn.execute("SELECT * FROM idempotency_keys WHERE request_key = ?", (req_key,)).fetchone()
+        if not row:
+            return None
+        if row['state'] == 'done':
+            return dict(row)
+        if time.time() >= deadline:
+            return None
+        time.sleep(POLL_INTERVAL)
+
+
+def load_result(row):
+    """(content, mimetype, filename) of a done request, or None if its blob is gone"""
+    try:
+        return read_blob(row['sha256'], row['compression']), row['mimetype'], row['filename']
+    except OSError as e:
+        print(f"DEBUG: Response for {row['invoice_number']} could not be read from the archive: {e}")
+        return None
@@ -0,0 +1,156 @@
+import csv
+import datetime
+import io
+
+from db import connection
+from invoice_ledger import ensure_schema
+
+# CSV exports of the ledger for accounting software. Rows are read with fetchmany()
+# and written out in chunks as they are read, so memory stays flat however long the
+# date range is. Each preset is a list of (header, value function) columns and says
+# whether it has one row per invoice or one per line item.
+FETCH_SIZE = 500
+PAYMENT_TERMS_DAYS = 30          # due date for presets that need one
+XERO_ACCOUNT_CODE = '200'        # Sales account in Xero's default chart of accounts
+XERO_TAX_TYPE = 'Tax on Sales'   # the lodge's rates include VAT
+CURRENCY = 'ZAR'
+
+
+def amount(cents):
+    """Cents as a plain decimal, e.g. 123450 -> '1234.50', as accounting imports expect"""
+    sign = '-' if cents < 0 else ''
+    return f"{sign}{abs(cents) // 100}.{abs(cents) % 100:02d}"
+
+
+def due_date(invoice_date):
+    try:
+        date = datetime.date.fromisoformat(invoice_date)
+    except (TypeError, ValueError):
+        return ''
+    return (date + datetime.timedelta(days=PAYMENT_TERMS_DAYS)).isoformat()
+
+
+def day_first(iso_date):
+    """2025-08-01 -> 01/08/2025 for imports that read South African dates"""
+    try:
+        return datetime.date.fromisoformat(iso_date).strftime('%d/%m/%Y')
+    except (TypeError, ValueError):
+        return iso_date or ''
+
+
+def _outstanding(row):
+    return amount(max(0, row['invoice_total_cents'] - row['payment_received_cents']))
+
+
+INVOICE_COLUMNS = [
+    ('Invoice Number', lambda r: r['invoice_number']),
+    ('Invoice Date', lambda r: r['invoice_date']),
+    ('Agency', lambda r: r['agency']),
+    ('Voucher Number', lambda r: r['voucher_number']),
+    ('Guest', lambda r: r['passenger_names']),
+    ('Check In', lambda r: r['check_in']),
+    ('Check Out', lambda r: r['check_out']),
+]
+
+PRESETS = {
+    'summary': {
+        'line_items': False,
+        'columns': INVOICE_COLUMNS + [
+            ('Total', lambda r: amount(r['invoice_total_cents'])),
+            ('Paid', lambda r: amount(r['payment_received_cents'])),
+            ('Outstanding', _outstanding),
+        ]
+    },
+    'line_items': {
+        'line_items': True,
+        'columns': INVOICE_COLUMNS + [
+            ('Line', lambda r: r['position'] + 1),
+            ('Description', lambda r: r['description']),
+            ('Qty', lambda r: r['qty']),
+            ('Unit Price', lambda r: amount(r['unit_price_cents'])),
+            ('Line Total', lambda r: amount(r['total_cents'])),
+            ('Invoice Total', lambda r: amount(r['invoice_total_cents'])),
+        ]
+    },
+    # Xero sales invoice import template (required columns, starred as in Xero's template)
+    'xero': {
+        'line_items': True,
+        'columns': [
+            ('*ContactName', lambda r: r['agency'] or r['customer_name']),
+            ('*InvoiceNumber', lambda r: r['invoice_number']),
+            ('Reference', lambda r: r['voucher_number']),
+            ('*InvoiceDate', lambda r: day_first(r['invoice_date'])),
+            ('*DueDate', lambda r: day_first(due_date(r['invoice_date']))),
+            ('*Description', lambda r: f"{r['description']} - {r['passenger_names']}".strip(' -')),
+            ('*Quantity', lambda r: r['qty']),
+            ('*UnitAmount', lambda r: amount(r['unit_price_cents'])),
+            ('*AccountCode', lambda r: XERO_ACCOUNT_CODE),
+            ('*TaxType', lambda r: XERO_TAX_TYPE),
+            ('Currency', lambda r: CURRENCY),
+        ]
+    },
+    # QuickBooks Online invoice import
+    'quickbooks': {
+        'line_items': True,
+        'columns': [
+            ('InvoiceNo', lambda r: r['invoice_number']),
+            ('Customer', lambda r: r['agency'] or r['customer_name']),
+            ('InvoiceDate', lambda r: day_first(r['invoice_date'])),
+            ('DueDate', lambda r: day_first(due_date(r['invoice_date']))),
+            ('Memo', lambda r: f"Voucher {r['voucher_number']} - {r['passenger_names']}"),
+            ('ItemDescription', lambda r: r['description']),
+            ('ItemQuantity', lambda r: r['qty']),
+            ('ItemRate', lambda r: amount(r['unit_price_cents'])),
+            ('ItemAmount', lambda r: amount(r['total_cents'])),
+        ]
+    },
+}
+
+
+def _export_query(line_items, start, end):
+    clauses, params = [], []
+    if start:
+        clauses.append("i.invoice_date >= ?")
+        params.append(start)
+    if end:
+        clauses.append("i.invoice_date <= ?")
+        params.append(end)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+    if line_items:
+        return (f"SELECT i.*, l.position, l.description, l.qty, l.unit_price_cents, l.total_cents "
+                f"FROM invoices i JOIN line_items l ON l.invoice_number = i.invoice_number {where} "
+                f"ORDER BY i.invoice_date, i.invoice_number, l.position", params)
+    return f"SELECT i.* FROM invoices i {where} ORDER BY i.invoice_date, i.invoice_number", params
+
+
+def stream_invoices_csv(preset='summary', start=None, end=None, db_path=None):
+    """
+    Yield CSV text for invoices dated start..end (inclusive ISO dates, either may be
+    None) in a preset's layout, one chunk per FETCH_SIZE rows read.
+    Raises ValueError for an unknown preset before anything is read.
+    """
+    if preset not in PRESETS:
+        raise ValueError(f"Unknown preset '{preset}'. Choose one of: {', '.join(PRESETS)}")
+    ensure_schema(db_path)
+    columns = PRESETS[preset]['columns']
+    sql, params = _export_query(PRESETS[preset]['line_items'], start, end)
+    return _stream_rows(columns, sql, params, db_path)
+
+
+def _stream_rows(columns, sql, params, db_path):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([header for header, _ in columns])
+    with connection(db_path) as conn:
+        cursor = conn.execute(sql, params)
+        while True:
+            rows = cursor.fetchmany(FETCH_SIZE)
+            if not rows:
+                break
+            writer.writerows([value(row) for _, value in columns] for row in rows)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        cursor.close()
+    if buffer.tell():
+        yield buffer.getvalue()
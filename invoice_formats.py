@@ -0,0 +1,70 @@
+import csv
+import io
+
+from bulk_export import CSV_INVOICE_FIELDS, CSV_LINE_ITEM_FIELDS
+from invoice_payload import build_payload, dump_payload, PAYLOAD_SCHEMA, PAYLOAD_VERSION
+from invoice_renderer import render_invoice_pdf, render_invoice_html
+
+# Output formats for one invoice, keyed by the ?format= name. Each renderer takes
+# the intermediate invoice model (see build_invoice_model) and returns bytes.
+RENDERERS = {}
+
+# Extra invoice columns in CSV output; the rest match the bulk export CSV so files round-trip
+CSV_EXTRA_FIELDS = ['invoice_date', 'invoice_total']
+
+
+def register_renderer(name, mimetype, extension):
+    """Decorator registering a renderer function for an output format"""
+    def decorator(func):
+        RENDERERS[name] = {'render': func, 'mimetype': mimetype, 'extension': extension}
+        return func
+    return decorator
+
+
+def build_invoice_model(invoice_data, inv_num):
+    """
+    The intermediate invoice model every format is rendered from: the same
+    normalised dict that is embedded in generated PDFs.
+    """
+    return build_payload(invoice_data, inv_num)['invoice']
+
+
+def render_invoice(invoice_data, inv_num, fmt='pdf'):
+    """
+    Render an invoice in the requested format.
+    Returns (content_bytes, mimetype, filename); raises ValueError for unknown formats.
+    """
+    renderer = RENDERERS.get(fmt)
+    if not renderer:
+        raise ValueError(f"Unsupported format '{fmt}'. Choose one of: {', '.join(sorted(RENDERERS))}")
+    content = renderer['render'](build_invoice_model(invoice_data, inv_num))
+    return content, renderer['mimetype'], f"Invoice_{inv_num}.{renderer['extension']}"
+
+
+@register_renderer('pdf', 'application/pdf', 'pdf')
+def render_pdf(invoice):
+    return render_invoice_pdf(invoice, invoice['invoice_number'])
+
+
+@register_renderer('html', 'text/html; charset=utf-8', 'html')
+def render_html(invoice):
+    """Self-contained HTML (the logo is inlined) suitable for sending as an email body"""
+    return render_invoice_html(invoice, invoice['invoice_number']).encode('utf-8')
+
+
+@register_renderer('json', 'application/json', 'json')
+def render_json(invoice):
+    return dump_payload({'schema': PAYLOAD_SCHEMA, 'version': PAYLOAD_VERSION, 'invoice': invoice})
+
+
+@register_renderer('csv', 'text/csv; charset=utf-8', 'csv')
+def render_csv(invoice):
+    """One row per line item, in the same layout the bulk export accepts"""
+    invoice_fields = CSV_INVOICE_FIELDS + CSV_EXTRA_FIELDS
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(invoice_fields + CSV_LINE_ITEM_FIELDS)
+    invoice_row = [invoice.get(field, '') for field in invoice_fields]
+    for item in invoice['line_items']:
+        writer.writerow(invoice_row + [item.get(field, '') for field in CSV_LINE_ITEM_FIELDS])
+    return buffer.getvalue().encode('utf-8')
@@ -1,9 +1,26 @@
 import pdfplumber
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfgen import canvas
+from reportlab.lib.units import cm
+from reportlab.lib.utils import ImageReader
 from datetime import datetime
-import sqlite3
+from functools import lru_cache
+import io
+import itertools
 import os
 import re
 
+from money import to_cents
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow normally comes with reportlab; without it the logo is used full size
+    Image = None
+
+LOGO_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'assets', 'logo.png')
+# The logo is drawn about 150px wide; 300px keeps it sharp in print
+LOGO_MAX_PX = 300
+
 def extract_text_with_words(page):
     """
     Extract text from PDF page using word-level extraction for better spacing.
@@ -804,23 +821,6 @@ def parse_voucher_pdf(pdf_path):
     
     return data
 
-def get_next_invoice_number(db_path='invoices.db'):
-    conn = sqlite3.connect(db_path)
-    c = conn.cursor()
-    c.execute("CREATE TABLE IF NOT EXISTS metadata(key TEXT PRIMARY KEY, value INTEGER)")
-    
-    # Initialize last_inv if it doesn't exist. The first invoice number generated should be 700.
-    c.execute("INSERT OR IGNORE INTO metadata(key, value) VALUES('last_inv', 699)")
-    conn.commit()
-
-    # Atomically increment and retrieve the next invoice number
-    c.execute("UPDATE metadata SET value = value + 1 WHERE key = 'last_inv'")
-    c.execute("SELECT value FROM metadata WHERE key = 'last_inv'")
-    next_num = c.fetchone()[0]
-    conn.commit()
-    conn.close()
-    return f"INV-{next_num:06d}"
-
 def cleanup_old_files(directory, days_old=7):
     current_time = datetime.now()
     for filename in os.listdir(directory):
@@ -829,4 +829,479 @@ def cleanup_old_files(directory, days_old=7):
             file_mod_time = datetime.fromtimestamp(os.path.getmtime(filepath))
             if (current_time - file_mod_time).days > days_old:
                 os.remove(filepath)
-                print(f"Deleted old file: {filepath}")
\ No newline at end of file
+                print(f"Deleted old file: {filepath}")
+
+def fill_invoice_template(output_dir, invoice_number, data, force_single_page=True):
+    output_path = os.path.join(output_dir, f"Invoice_{invoice_number}.pdf")
+    draw_invoice_pdf(output_path, invoice_number, data, force_single_page)
+    return output_path
+
+
+def render_invoice_pdf_bytes(invoice_number, data, force_single_page=True, invariant=False):
+    """Render an invoice with reportlab entirely in memory and return the PDF bytes"""
+    buffer = io.BytesIO()
+    draw_invoice_pdf(buffer, invoice_number, data, force_single_page, invariant)
+    return buffer.getvalue()
+
+
+def format_invoice_date(invoice_date=None):
+    """Format an ISO invoice date (YYYY-MM-DD) for display, defaulting to today"""
+    if invoice_date:
+        formatted = _format_iso_date(str(invoice_date))
+        if formatted:
+            return formatted
+    return datetime.now().strftime('%d %B %Y')
+
+
+@lru_cache(maxsize=512)
+def _format_iso_date(invoice_date):
+    try:
+        return datetime.strptime(invoice_date, '%Y-%m-%d').strftime('%d %B %Y')
+    except ValueError:
+        return None
+
+
+@lru_cache(maxsize=1)
+def logo_png_bytes():
+    """
+    The logo scaled down once per process to LOGO_MAX_PX, as PNG bytes.
+    Returns None when the logo is missing or cannot be scaled.
+    """
+    if Image is None or not os.path.exists(LOGO_PATH):
+        return None
+    try:
+        with Image.open(LOGO_PATH) as im:
+            im.thumbnail((LOGO_MAX_PX, LOGO_MAX_PX), Image.LANCZOS)
+            buffer = io.BytesIO()
+            im.save(buffer, format='PNG', optimize=True)
+            return buffer.getvalue()
+    except OSError as e:
+        print(f"DEBUG: Could not scale logo: {e}")
+        return None
+
+
+@lru_cache(maxsize=1)
+def _reportlab_logo():
+    """The logo as a reusable reportlab image, decoded once instead of on every render"""
+    logo_png = logo_png_bytes()
+    return ImageReader(io.BytesIO(logo_png)) if logo_png else LOGO_PATH
+
+
+
+# Line item pagination for long invoices (e.g. 30-90 night stays with daily extras).
+# An invoice of up to SINGLE_PAGE_ROWS items fits on one page with the payment details
+# below the table. Longer invoices move those details to the last page, next to the
+# invoice total, so their first page holds as many rows less one for "Carried forward".
+SINGLE_PAGE_ROWS = 15
+FIRST_PAGE_ROWS = SINGLE_PAGE_ROWS - 1
+PAGE_ROWS = 28
+
+
+def paginate_line_items(line_items, first_page_rows=FIRST_PAGE_ROWS, page_rows=PAGE_ROWS,
+                        single_page_rows=SINGLE_PAGE_ROWS):
+    """
+    Split line items into page-sized chunks, consuming them lazily.
+    Yields one dict per page with its rows, the subtotal brought forward from
+    earlier pages and the running subtotal to carry forward. Items are read ahead
+    (at most single_page_rows + 1) so the last page is flagged and can show the
+    invoice total instead, and so an invoice that fits on one page is never split.
+    """
+    items = iter(line_items)
+    ahead = list(itertools.islice(items, single_page_rows + 1))
+    if len(ahead) <= single_page_rows:
+        yield {
+            'number': 1,
+            'rows': ahead,
+            'brought_forward': 0.0,
+            'carried_forward': sum(float(item.get('total', 0)) for item in ahead),
+            'is_first': True,
+            'is_last': True
+        }
+        return
+    items = itertools.chain(ahead, items)
+    end = object()
+    pending = next(items, end)
+    number = 1
+    running_total = 0.0
+    capacity = first_page_rows
+    while True:
+        rows = []
+        brought_forward = running_total
+        while pending is not end and len(rows) < capacity:
+            rows.append(pending)
+            running_total += float(pending.get('total', 0))
+            pending = next(items, end)
+        yield {
+            'number': number,
+            'rows': rows,
+            'brought_forward': brought_forward,
+            'carried_forward': running_total,
+            'is_first': number == 1,
+            'is_last': pending is end
+        }
+        if pending is end:
+            return
+        number += 1
+        capacity = page_rows
+
+
+# reportlab layout: rows stop above the footer band, and the summary block needs this much room
+ROW_AREA_BOTTOM = 2.5 * cm
+SUMMARY_BLOCK_HEIGHT = 9 * cm
+
+
+def draw_line_item_header(c, y_pos, text_color):
+    """Draw the line item table header row and return the y position of the first row"""
+    c.setFillColorRGB(0.99, 0.99, 0.99)  # Near-white background for headers
+    c.rect(2 * cm, y_pos - 0.1 * cm, 15 * cm, 0.6 * cm, fill=True, stroke=True)
+    
+    c.setFillColorRGB(*text_color)
+    c.setFont("Helvetica-Bold", 10)
+    c.drawString(2.2 * cm, y_pos + 0.1 * cm, "Description")
+    c.drawString(9 * cm, y_pos + 0.1 * cm, "Qty")
+    c.drawString(11.5 * cm, y_pos + 0.1 * cm, "Unit Price")
+    c.drawString(14.5 * cm, y_pos + 0.1 * cm, "Total")
+    
+    c.setFont("Helvetica", 9)
+    return y_pos - 0.6 * cm  # Reduced spacing from 0.8cm to 0.6cm
+
+
+def draw_subtotal_row(c, y_pos, label, amount, text_color):
+    """Draw a brought/carried forward subtotal row and return the next row's y position"""
+    c.setFillColorRGB(0.95, 0.95, 0.95)
+    c.rect(2 * cm, y_pos - 0.1 * cm, 15 * cm, 0.6 * cm, fill=True, stroke=False)
+    c.setFillColorRGB(*text_color)
+    c.setFont("Helvetica-Bold", 9)
+    c.drawString(2.2 * cm, y_pos + 0.1 * cm, label)
+    c.drawString(14.7 * cm, y_pos + 0.1 * cm, f"ZAR {amount:.2f}")
+    c.setFont("Helvetica", 9)
+    return y_pos - 0.6 * cm
+
+
+def draw_invoice_pdf(target, invoice_number, data, force_single_page=True, invariant=False):
+    """
+    Draw the invoice with reportlab into a file path or file-like object.
+    invariant=True makes reportlab omit its own timestamps and random document ID.
+    This is the only copy to change: deploy_to_pythonanywhere.py rebuilds
+    deployment_package/ from these files, replacing its older invoice_generator.py.
+    """
+    c = canvas.Canvas(target, pagesize=A4, invariant=int(invariant))
+    width, height = A4
+    
+    # Define colors using the brand palette
+    header_color = (0.79, 0.50, 0.08)  # Golden-brown #ca8015
+    accent_color = (0.90, 0.65, 0.20)  # Lighter golden #e6a533
+    text_color = (0.0, 0.0, 0.0)       # Black #000000
+    white_color = (1.0, 1.0, 1.0)      # White #ffffff
+    
+    # Header background rectangle
+    c.setFillColorRGB(*header_color)
+    c.rect(0, height - 4 * cm, width, 4 * cm, fill=True, stroke=False)
+    
+    # Logo area (if logo exists)
+    if os.path.exists(LOGO_PATH):
+        # Draw logo background circle
+        c.setFillColorRGB(*white_color)
+        c.circle(3 * cm, height - 2.5 * cm, 0.8 * cm, fill=True, stroke=False)
+        
+        # Draw logo image
+        try:
+            c.drawImage(_reportlab_logo(), 2.2 * cm, height - 3.3 * cm, width=1.6 * cm, height=1.6 * cm, mask='auto')
+        except (OSError, ValueError, TypeError) as e:
+            # An unreadable logo leaves the circle empty rather than failing the invoice
+            print(f"DEBUG: Could not draw logo: {e}")
+    
+    # Company name and tagline
+    c.setFillColorRGB(*white_color)  # White text
+    c.setFont("Helvetica-Bold", 24)
+    c.drawString(5 * cm, height - 2.5 * cm, "Ulendo Lodge & Apartments")
+
+    c.setFont("Helvetica", 12)
+    c.drawString(5 * cm, height - 3.2 * cm, "Refined accommodation for corporate and business professionals")
+    
+    # Invoice details box (top right)
+    c.setFillColorRGB(0.99, 0.99, 0.99)  # Near-white background
+    c.rect(13 * cm, height - 3.8 * cm, 6 * cm, 2.5 * cm, fill=True, stroke=True)
+    
+    c.setFillColorRGB(*text_color)
+    c.setFont("Helvetica-Bold", 14)
+    c.drawString(13.5 * cm, height - 2 * cm, "INVOICE")
+    c.setFont("Helvetica", 10)
+    c.drawString(13.5 * cm, height - 2.4 * cm, f"Invoice #: {invoice_number}")
+    c.drawString(13.5 * cm, height - 2.7 * cm, f"Date: {format_invoice_date(data.get('invoice_date'))}")
+    
+    # Voucher and booking information section
+    y_pos = height - 5.5 * cm
+    c.setFillColorRGB(*accent_color)
+    c.rect(2 * cm, y_pos - 0.5 * cm, 15 * cm, 0.6 * cm, fill=True, stroke=False)
+    
+    c.setFillColorRGB(*white_color)  # White text
+    c.setFont("Helvetica-Bold", 12)
+    c.drawString(2.2 * cm, y_pos - 0.2 * cm, "BOOKING DETAILS")
+    
+    # Booking details
+    y_pos -= 1 * cm  # Reduced spacing from 1.2cm to 1cm
+    c.setFillColorRGB(*text_color)
+    c.setFont("Helvetica", 10)
+    
+    # Create a two-column layout for booking details
+    left_col = 2 * cm
+    right_col = 10 * cm
+    
+    if data.get('voucher_number'):
+        c.drawString(left_col, y_pos, "Voucher Number:")
+        c.setFont("Helvetica-Bold", 10)
+        c.drawString(left_col + 3 * cm, y_pos, str(data['voucher_number']))
+        c.setFont("Helvetica", 10)
+    
+    if data.get('length_of_stay'):
+        c.drawString(right_col, y_pos, "Length of Stay:")
+        c.setFont("Helvetica-Bold", 10)
+        c.drawString(right_col + 3 * cm, y_pos, f"{data['length_of_stay']} days")
+        c.setFont("Helvetica", 10)
+    
+    y_pos -= 0.4 * cm  # Reduced spacing from 0.5cm to 0.4cm
+    
+    if data.get('check_in'):
+        c.drawString(left_col, y_pos, "Check-in Date:")
+        c.setFont("Helvetica-Bold", 10)
+        c.drawString(left_col + 3 * cm, y_pos, str(data['check_in']))
+        c.setFont("Helvetica", 10)
+    
+    if data.get('check_out'):
+        c.drawString(right_col, y_pos, "Check-out Date:")
+        c.setFont("Helvetica-Bold", 10)
+        c.drawString(right_col + 3 * cm, y_pos, str(data['check_out']))
+        c.setFont("Helvetica", 10)
+    
+    # Customer information section
+    y_pos -= 1 * cm  # Reduced spacing from 1.2cm to 1cm
+    c.setFillColorRGB(*accent_color)
+    c.rect(2 * cm, y_pos - 0.5 * cm, 15 * cm, 0.6 * cm, fill=True, stroke=False)
+    
+    c.setFillColorRGB(*white_color)  # White text
+    c.setFont("Helvetica-Bold", 12)
+    c.drawString(2.2 * cm, y_pos - 0.2 * cm, "CUSTOMER INFORMATION")
+    
+    y_pos -= 0.8 * cm  # Reduced spacing from 1cm to 0.8cm
+    c.setFillColorRGB(*text_color)
+    customer_name = data.get('customer_name', '').strip()
+    if customer_name:
+        c.setFont("Helvetica", 10)
+        c.drawString(2 * cm, y_pos, "Guest Name:")
+        c.setFont("Helvetica-Bold", 10)
+        c.drawString(4 * cm, y_pos, customer_name)
+    
+    # Line items table
+    y_pos -= 1.2 * cm  # Reduced spacing from 1.5cm to 1.2cm
+    c.setFillColorRGB(*accent_color)
+    c.rect(2 * cm, y_pos - 0.5 * cm, 15 * cm, 0.6 * cm, fill=True, stroke=False)
+    
+    c.setFillColorRGB(*white_color)  # White text
+    c.setFont("Helvetica-Bold", 12)
+    c.drawString(2.2 * cm, y_pos - 0.2 * cm, "SERVICES PROVIDED")
+    
+    # Table headers
+    y_pos -= 1 * cm  # Reduced spacing from 1.2cm to 1cm
+    y_pos = draw_line_item_header(c, y_pos, text_color)
+    row_height = 0.6 * cm  # Reduced row height from 0.7cm to 0.6cm
+    
+    # Long invoices continue on further pages; one row per page is kept for the carried-forward subtotal
+    first_page_rows = max(1, int((y_pos - ROW_AREA_BOTTOM) / row_height) - 1)
+    continuation_rows = int((height - 2 * cm - 0.6 * cm - ROW_AREA_BOTTOM) / row_height) - 2
+    
+    for page in paginate_line_items(data.get('line_items', []), first_page_rows, continuation_rows,
+                                    single_page_rows=first_page_rows):
+        if not page['is_first']:
+            c.showPage()
+            y_pos = draw_line_item_header(c, height - 2 * cm, text_color)
+            y_pos = draw_subtotal_row(c, y_pos, "Brought forward", page['brought_forward'], text_color)
+        
+        for i, item in enumerate(page['rows']):
+            # Alternate row colors
+            if i % 2 == 0:
+                c.setFillColorRGB(0.999, 0.999, 0.999)  # Near-white alternating rows
+                c.rect(2 * cm, y_pos - 0.1 * cm, 15 * cm, row_height, fill=True, stroke=False)
+            
+            c.setFillColorRGB(*text_color)
+            
+            # Wrap description if too long
+            description = str(item['description'])[:50]  # Reduced from 60 to 50 characters
+            if len(str(item['description'])) > 50:
+                description += "..."
+            
+            c.drawString(2.2 * cm, y_pos + 0.1 * cm, description)
+            c.drawString(9.2 * cm, y_pos + 0.1 * cm, str(item['qty']))
+            c.drawString(11.7 * cm, y_pos + 0.1 * cm, f"ZAR {item['unit_price']:.2f}")
+            c.drawString(14.7 * cm, y_pos + 0.1 * cm, f"ZAR {item['total']:.2f}")
+            y_pos -= row_height
+        
+        if not page['is_last']:
+            draw_subtotal_row(c, y_pos, "Carried forward", page['carried_forward'], text_color)
+    
+    # Keep the payment summary and business information together on one page
+    if y_pos < SUMMARY_BLOCK_HEIGHT:
+        c.showPage()
+        y_pos = height - 2 * cm
+    
+    # Payment summary section
+    y_pos -= 0.8 * cm  # Reduced spacing from 1cm to 0.8cm
+    
+    # Calculate totals
+    subtotal = sum(float(item['total']) for item in data.get('line_items', []))
+    total_payment_received = 0.0
+    
+    if data.get('total_payment_received'):
+        try:
+            total_payment_received = to_cents(data['total_payment_received']) / 100
+        except ValueError:
+            total_payment_received = 0.0
+    
+    outstanding_balance = subtotal - total_payment_received
+    
+    # Payment summary box
+    c.setFillColorRGB(0.999, 0.999, 0.999)  # Near-white background
+    c.rect(11 * cm, y_pos - 2.3 * cm, 6 * cm, 2.6 * cm, fill=True, stroke=True)  # Reduced height from 2.8cm to 2.6cm
+    
+    c.setFillColorRGB(*text_color)
+    c.setFont("Helvetica-Bold", 12)
+    c.drawString(11.5 * cm, y_pos - 0.5 * cm, "PAYMENT SUMMARY")
+
+    c.setFont("Helvetica", 10)
+    c.drawString(11.5 * cm, y_pos - 1 * cm, "Subtotal:")
+    c.drawRightString(16.5 * cm, y_pos - 1 * cm, f"ZAR {subtotal:.2f}")
+    
+    c.drawString(11.5 * cm, y_pos - 1.4 * cm, "Payment Received:")
+    c.drawRightString(16.5 * cm, y_pos - 1.4 * cm, f"ZAR {total_payment_received:.2f}")
+    
+    # Outstanding balance with accent color
+    c.setFillColorRGB(*header_color)
+    c.rect(11.2 * cm, y_pos - 2.2 * cm, 5.6 * cm, 0.5 * cm, fill=True, stroke=False)
+    
+    c.setFillColorRGB(*white_color)  # White text
+    c.setFont("Helvetica-Bold", 11)
+    c.drawString(11.5 * cm, y_pos - 2 * cm, "Outstanding Balance:")
+    c.drawRightString(16.5 * cm, y_pos - 2 * cm, f"ZAR {outstanding_balance:.2f}")
+    
+    # Extended business information section (add before payment summary)
+    y_pos -= 2.5 * cm  # Reduced spacing from 3cm to 2.5cm
+    
+    # Business Information Header
+    c.setFillColorRGB(*accent_color)
+    c.rect(2 * cm, y_pos - 0.5 * cm, 15 * cm, 0.6 * cm, fill=True, stroke=False)
+    
+    c.setFillColorRGB(*white_color)
+    c.setFont("Helvetica-Bold", 12)
+    c.drawString(2.2 * cm, y_pos - 0.2 * cm, "BUSINESS INFORMATION")
+    
+    y_pos -= 1 * cm  # Reduced spacing from 1.2cm to 1cm
+    c.setFillColorRGB(*text_color)
+    
+    # Contact Information (Left Column)
+    left_col = 2 * cm
+    right_col = 10.5 * cm
+    
+    c.setFont("Helvetica-Bold", 9)
+    c.drawString(left_col, y_pos, "Our Address:")
+    c.setFont("Helvetica", 8)
+    c.drawString(left_col, y_pos - 0.35 * cm, "Ulendo Lodge And Apartment")  # Reduced spacing
+    c.drawString(left_col, y_pos - 0.65 * cm, "10 Sinclair Road")  # Reduced spacing
+    c.drawString(left_col, y_pos - 0.95 * cm, "Lambton, Germiston, 1401")  # Reduced spacing
+    c.drawString(left_col, y_pos - 1.25 * cm, "Tel: 067 623 7170")  # Reduced spacing
+    c.drawString(left_col, y_pos - 1.55 * cm, "Email: info@ulendolodge.com")  # Reduced spacing
+    
+    # Bank Account Information (Right Column)
+    c.setFont("Helvetica-Bold", 9)
+    c.drawString(right_col, y_pos, "Our Bank Account:")
+    c.setFont("Helvetica", 8)
+    c.drawString(right_col, y_pos - 0.35 * cm, "Account Name: Ulendo Lodge And Apartments")  # Reduced spacing
+    c.drawString(right_col, y_pos - 0.65 * cm, "Account Number: 10 23 106 061 9")  # Reduced spacing
+    c.drawString(right_col, y_pos - 0.95 * cm, "Bank: Standard Bank")  # Reduced spacing
+    c.drawString(right_col, y_pos - 1.25 * cm, "Branch Code: 002442")  # Reduced spacing
+    c.drawString(right_col, y_pos - 1.55 * cm, "Type: Current Account")  # Reduced spacing
+    
+    # Important Note
+    y_pos -= 1.5 * cm  # Reduced spacing from 2.5cm to 1.5cm
+    c.setFillColorRGB(*header_color)
+    c.rect(2 * cm, y_pos - 0.3 * cm, 15 * cm, 0.5 * cm, fill=True, stroke=False)
+    
+    c.setFillColorRGB(*white_color)
+    c.setFont("Helvetica-Bold", 9)
+    c.drawString(2.2 * cm, y_pos - 0.1 * cm, "PLEASE NOTE: Send your Proof of payment to info@ulendolodge.com")
+    
+    # House Rules and Policies (if space allows, otherwise start new page)
+    if y_pos < 4 * cm and not force_single_page:  # Only break page if not forcing single page
+        c.showPage()  # Start new page for policies
+        y_pos = height - 2 * cm
+        # Add all policies on new page
+        add_policies_section(c, y_pos, header_color, accent_color, white_color, text_color)
+    elif y_pos >= 4 * cm:
+        # Add policies on current page if there's enough space
+        y_pos -= 1.5 * cm
+        add_policies_section(c, y_pos, header_color, accent_color, white_color, text_color)
+    # If force_single_page and not enough space, skip policies entirely
+    
+    # Footer section
+    c.setFillColorRGB(*header_color)
+    c.rect(0, 0, width, 2 * cm, fill=True, stroke=False)
+    
+    c.setFillColorRGB(*white_color)  # White text
+    c.setFont("Helvetica-Oblique", 10)
+    c.drawCentredString(width / 2, 1.2 * cm, "Thank you for choosing Ulendo Lodge & Apartments!")
+    c.setFont("Helvetica", 8)
+    c.drawCentredString(width / 2, 0.6 * cm, "Refined accommodation for corporate and business professionals")
+    
+    c.save()
+
+
+def add_policies_section(c, y_pos, header_color, accent_color, white_color, text_color):
+    """Add the policies section to the PDF with optimized spacing"""
+    # House Rules
+    c.setFillColorRGB(*accent_color)
+    c.rect(2 * cm, y_pos - 0.4 * cm, 15 * cm, 0.5 * cm, fill=True, stroke=False)
+    
+    c.setFillColorRGB(*white_color)
+    c.setFont("Helvetica-Bold", 10)
+    c.drawString(2.2 * cm, y_pos - 0.1 * cm, "HOUSE RULES")
+    
+    y_pos -= 0.6 * cm
+    c.setFillColorRGB(*text_color)
+    c.setFont("Helvetica", 8)
+    c.drawString(2.5 * cm, y_pos, "• Check-in time is any time after 14:00")
+    c.drawString(2.5 * cm, y_pos - 0.25 * cm, "• Check-out is 10:00 the following day")
+    c.drawString(2.5 * cm, y_pos - 0.5 * cm, "• Please respect other Guests in terms of noise")
+    c.drawString(2.5 * cm, y_pos - 0.75 * cm, "• Lapa and braai areas may not be occupied as of 10pm")
+    
+    # Refund Policy
+    y_pos -= 1.5 * cm
+    c.setFillColorRGB(*accent_color)
+    c.rect(2 * cm, y_pos - 0.4 * cm, 15 * cm, 0.5 * cm, fill=True, stroke=False)
+    
+    c.setFillColorRGB(*white_color)
+    c.setFont("Helvetica-Bold", 10)
+    c.drawString(2.2 * cm, y_pos - 0.1 * cm, "REFUND POLICY")
+    
+    y_pos -= 0.6 * cm
+    c.setFillColorRGB(*text_color)
+    c.setFont("Helvetica", 8)
+    c.drawString(2.5 * cm, y_pos, "• 100% Refund will be granted with 72 hours notice of check in")
+    c.drawString(2.5 * cm, y_pos - 0.25 * cm, "• 50% Refund will be granted with 24 hours notice of check in")
+    c.drawString(2.5 * cm, y_pos - 0.5 * cm, "• Failure to check in will result in zero refund as the room was reserved")
+    
+    # Public Liability
+    y_pos -= 1.2 * cm
+    c.setFillColorRGB(*accent_color)
+    c.rect(2 * cm, y_pos - 0.4 * cm, 15 * cm, 0.5 * cm, fill=True, stroke=False)
+    
+    c.setFillColorRGB(*white_color)
+    c.setFont("Helvetica-Bold", 10)
+    c.drawString(2.2 * cm, y_pos - 0.1 * cm, "PUBLIC LIABILITY")
+    
+    y_pos -= 0.6 * cm
+    c.setFillColorRGB(*text_color)
+    c.setFont("Helvetica", 8)
+    c.drawString(2.5 * cm, y_pos, "• Ulendo Lodge has the right to reserve admission")
+    c.drawString(2.5 * cm, y_pos - 0.25 * cm, "• We are not responsible for any damage/loss of any kind to visitor property")
+    c.drawString(2.5 * cm, y_pos - 0.5 * cm, "• Visitors will be held accountable for any damages to business property")
+    
+    return y_pos
@@ -0,0 +1,316 @@
+import datetime
+
+from db import connection, transaction, resolve_path
+from invoice_rollups import create_rollups, apply_invoice, revenue_report as rollup_report
+from invoice_search import create_search_index, index_invoice, index_voucher, search
+from money import to_cents
+
+# Every generated invoice is recorded here as structured rows, so looking an invoice
+# up, editing it or reporting on it is an indexed query instead of re-parsing PDFs.
+# Amounts are stored as integer cents.
+LEDGER_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS invoices(
+        invoice_number TEXT PRIMARY KEY,
+        invoice_date TEXT,
+        voucher_number TEXT,
+        voucher_ref TEXT,
+        passenger_names TEXT,
+        customer_name TEXT,
+        agency TEXT,
+        billing_address TEXT,
+        check_in TEXT,
+        check_out TEXT,
+        length_of_stay TEXT,
+        remarks TEXT,
+        invoice_total_cents INTEGER NOT NULL DEFAULT 0,
+        payment_received_cents INTEGER NOT NULL DEFAULT 0,
+        created_at TEXT,
+        updated_at TEXT)""",
+    """CREATE TABLE IF NOT EXISTS line_items(
+        id INTEGER PRIMARY KEY,
+        invoice_number TEXT NOT NULL REFERENCES invoices(invoice_number) ON DELETE CASCADE,
+        position INTEGER NOT NULL,
+        description TEXT,
+        qty INTEGER,
+        unit_price_cents INTEGER,
+        total_cents INTEGER)""",
+    """CREATE TABLE IF NOT EXISTS payments(
+        id INTEGER PRIMARY KEY,
+        invoice_number TEXT NOT NULL REFERENCES invoices(invoice_number) ON DELETE CASCADE,
+        amount_cents INTEGER NOT NULL,
+        received_at TEXT,
+        source TEXT)""",
+    """CREATE TABLE IF NOT EXISTS vouchers(
+        voucher_ref TEXT PRIMARY KEY,
+        voucher_number TEXT,
+        passenger_names TEXT,
+        check_in TEXT,
+        check_out TEXT,
+        remarks TEXT,
+        uploaded_at TEXT)""",
+    "CREATE INDEX IF NOT EXISTS idx_invoices_date ON invoices(invoice_date, invoice_number)",
+    "CREATE INDEX IF NOT EXISTS idx_invoices_voucher ON invoices(voucher_number)",
+    "CREATE INDEX IF NOT EXISTS idx_invoices_guest ON invoices(customer_name COLLATE NOCASE)",
+    "CREATE INDEX IF NOT EXISTS idx_invoices_check_in ON invoices(check_in)",
+    "CREATE INDEX IF NOT EXISTS idx_invoices_check_out ON invoices(check_out)",
+    "CREATE INDEX IF NOT EXISTS idx_line_items_invoice ON line_items(invoice_number, position)",
+    "CREATE INDEX IF NOT EXISTS idx_payments_invoice ON payments(invoice_number)",
+    "CREATE INDEX IF NOT EXISTS idx_vouchers_number ON vouchers(voucher_number)",
+]
+
+# Which invoice first billed each voucher, by voucher number and by uploaded file hash.
+# Primary-key lookups, so checking a freshly parsed voucher costs one index probe each.
+DUPLICATE_SCHEMA = {
+    'invoiced_vouchers': [
+        """CREATE TABLE invoiced_vouchers(
+            voucher_number TEXT PRIMARY KEY,
+            invoice_number TEXT NOT NULL) WITHOUT ROWID""",
+        "CREATE INDEX idx_invoiced_vouchers_invoice ON invoiced_vouchers(invoice_number)",
+        # Invoices recorded before this table existed; the earliest invoice of a voucher wins
+        "INSERT OR IGNORE INTO invoiced_vouchers(voucher_number, invoice_number) "
+        "SELECT upper(replace(trim(voucher_number), ' ', '')), invoice_number FROM invoices "
+        "WHERE trim(voucher_number) != '' ORDER BY created_at, invoice_number",
+    ],
+    'invoiced_voucher_files': [
+        """CREATE TABLE invoiced_voucher_files(
+            voucher_ref TEXT PRIMARY KEY,
+            invoice_number TEXT NOT NULL) WITHOUT ROWID""",
+        "CREATE INDEX idx_invoiced_voucher_files_invoice ON invoiced_voucher_files(invoice_number)",
+        "INSERT OR IGNORE INTO invoiced_voucher_files(voucher_ref, invoice_number) "
+        "SELECT voucher_ref, invoice_number FROM invoices WHERE voucher_ref != '' "
+        "ORDER BY created_at, invoice_number",
+    ],
+}
+
+# Columns added after a table was first created, so older databases are brought up to date
+ADDED_COLUMNS = {'invoices': [('remarks', 'TEXT')]}
+
+INVOICE_COLUMNS = ['invoice_number', 'invoice_date', 'voucher_number', 'voucher_ref', 'passenger_names',
+                   'customer_name', 'agency', 'billing_address', 'check_in', 'check_out', 'length_of_stay',
+                   'remarks']
+
+VOUCHER_COLUMNS = ['voucher_number', 'passenger_names', 'check_in', 'check_out', 'remarks']
+
+
+_schema_ready = set()
+
+
+def ensure_schema(db_path=None):
+    """Create the ledger tables and indexes once per process and database"""
+    db_path = resolve_path(db_path)
+    if db_path in _schema_ready:
+        return
+    with transaction(db_path) as conn:
+        for statement in LEDGER_SCHEMA:
+            conn.execute(statement)
+        for table, added in ADDED_COLUMNS.items():
+            existing = {row['name'] for row in conn.execute(f"PRAGMA table_info({table})")}
+            for column, column_type in added:
+                if column not in existing:
+                    conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+        for table, statements in DUPLICATE_SCHEMA.items():
+            if not conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone():
+                for statement in statements:
+                    conn.execute(statement)
+        create_search_index(conn)
+        create_rollups(conn)
+    _schema_ready.add(db_path)
+
+
+def agency_from_address(billing_address):
+    """The agency an invoice is billed to: the first line of its billing address"""
+    lines = [line.strip() for line in (billing_address or '').splitlines() if line.strip()]
+    return lines[0] if lines else ''
+
+
+def voucher_key(voucher_number):
+    """Voucher numbers compare without spaces or case: 'g 846886' is G846886"""
+    return str(voucher_number or '').strip().replace(' ', '').upper()
+
+
+def _now():
+    return datetime.datetime.now().isoformat(timespec='seconds')
+
+
+def record_invoice(invoice_data, inv_num, db_path=None, source='invoice'):
+    """
+    Write an invoice, its line items and any newly received payment in one transaction.
+    Regenerating an existing invoice number replaces its details and line items; a
+    change in the payment received is recorded as a payment of the difference.
+    """
+    ensure_schema(db_path)
+    now = _now()
+    row = {column: str(invoice_data.get(column) or '') for column in INVOICE_COLUMNS}
+    row['invoice_number'] = inv_num
+    row['agency'] = agency_from_address(row['billing_address'])
+    received_cents = to_cents(invoice_data.get('total_payment_received') or 0)
+    items = [(inv_num, position, item.get('description', ''), int(item.get('qty') or 0),
+              to_cents(item.get('unit_price') or 0), to_cents(item.get('total') or 0))
+             for position, item in enumerate(invoice_data.get('line_items', []))]
+    total_cents = sum(item[5] for item in items)
+
+    with transaction(db_path) as conn:
+        existing = conn.execute("SELECT invoice_date, agency, payment_received_cents FROM invoices "
+                                "WHERE invoice_number = ?", (inv_num,)).fetchone()
+        if existing:
+            # Take the invoice's previous figures out of the rollups before replacing it
+            old_items = conn.execute("SELECT description, qty, total_cents FROM line_items WHERE invoice_number = ?",
+                                     (inv_num,)).fetchall()
+            apply_invoice(conn, existing['invoice_date'], existing['agency'], old_items, sign=-1)
+        columns = INVOICE_COLUMNS + ['invoice_total_cents', 'payment_received_cents', 'updated_at']
+        values = [row[column] for column in INVOICE_COLUMNS] + [total_cents, received_cents, now]
+        if existing:
+            conn.execute(f"UPDATE invoices SET {', '.join(c + ' = ?' for c in columns[1:])} "
+                         "WHERE invoice_number = ?", values[1:] + [inv_num])
+            conn.execute("DELETE FROM line_items WHERE invoice_number = ?", (inv_num,))
+        else:
+            conn.execute(f"INSERT INTO invoices({', '.join(columns)}, created_at) "
+                         f"VALUES({', '.join('?' * (len(columns) + 1))})", values + [now])
+        conn.executemany("INSERT INTO line_items(invoice_number, position, description, qty, "
+                         "unit_price_cents, total_cents) VALUES(?, ?, ?, ?, ?, ?)", items)
+        apply_invoice(conn, row['invoice_date'], row['agency'], [(item[2], item[3], item[5]) for item in items])
+        # Keep the voucher -> invoice claims this invoice holds in step with its current voucher
+        conn.execute("DELETE FROM invoiced_vouchers WHERE invoice_number = ?", (inv_num,))
+        conn.execute("DELETE FROM invoiced_voucher_files WHERE invoice_number = ?", (inv_num,))
+        if voucher_key(row['voucher_number']):
+            conn.execute("INSERT OR IGNORE INTO invoiced_vouchers(voucher_number, invoice_number) VALUES(?, ?)",
+                         (voucher_key(row['voucher_number']), inv_num))
+        if row['voucher_ref']:
+            conn.execute("INSERT OR IGNORE INTO invoiced_voucher_files(voucher_ref, invoice_number) VALUES(?, ?)",
+                         (row['voucher_ref'], inv_num))
+        index_invoice(conn, inv_num, {'voucher_number': row['voucher_number'], 'guest': row['passenger_names'],
+                                      'descriptions': ' '.join(item[2] for item in items),
+                                      'remarks': row['remarks'], 'agency': row['agency']})
+        previous_cents = existing['payment_received_cents'] if existing else 0
+        if received_cents != previous_cents:
+            conn.execute("INSERT INTO payments(invoice_number, amount_cents, received_at, source) "
+                         "VALUES(?, ?, ?, ?)", (inv_num, received_cents - previous_cents, now, source))
+
+
+def find_invoiced_voucher(voucher_number=None, voucher_ref=None, exclude_invoice=None, db_path=None):
+    """
+    The invoice number that already billed this voucher, matched by voucher number or
+    by the uploaded file's hash; None if it has not been invoiced. exclude_invoice is
+    the invoice being edited, which is never a duplicate of itself.
+    """
+    ensure_schema(db_path)
+    with connection(db_path) as conn:
+        for table, column, value in (('invoiced_vouchers', 'voucher_number', voucher_key(voucher_number)),
+                                     ('invoiced_voucher_files', 'voucher_ref', voucher_ref)):
+            if not value:
+                continue
+            row = conn.execute(f"SELECT invoice_number FROM {table} WHERE {column} = ?", (value,)).fetchone()
+            if row and row['invoice_number'] != exclude_invoice:
+                return row['invoice_number']
+    return None
+
+
+def record_voucher(voucher_data, voucher_ref, db_path=None):
+    """Record an uploaded voucher by its stored reference so it can be searched for"""
+    ensure_schema(db_path)
+    row = [str(voucher_data.get(column) or '') for column in VOUCHER_COLUMNS]
+    with transaction(db_path) as conn:
+        conn.execute(f"INSERT INTO vouchers(voucher_ref, {', '.join(VOUCHER_COLUMNS)}, uploaded_at) "
+                     f"VALUES(?, {', '.join('?' * len(VOUCHER_COLUMNS))}, ?) "
+                     f"ON CONFLICT(voucher_ref) DO UPDATE SET "
+                     f"{', '.join(c + ' = excluded.' + c for c in VOUCHER_COLUMNS)}",
+                     [voucher_ref] + row + [_now()])
+        index_voucher(conn, voucher_ref, {'voucher_number': row[0], 'guest': row[1], 'remarks': row[4]})
+
+
+def record_payment_total(inv_num, payment_received, db_path=None, source='stamp'):
+    """
+    Bring an invoice's payment received up to date, recording the difference as a
+    payment. Returns False if the invoice is not in the ledger.
+    """
+    ensure_schema(db_path)
+    received_cents = to_cents(payment_received)
+    with transaction(db_path) as conn:
+        existing = conn.execute("SELECT payment_received_cents FROM invoices WHERE invoice_number = ?",
+                                (inv_num,)).fetchone()
+        if not existing:
+            return False
+        now = _now()
+        if received_cents != existing['payment_received_cents']:
+            conn.execute("INSERT INTO payments(invoice_number, amount_cents, received_at, source) "
+                         "VALUES(?, ?, ?, ?)",
+                         (inv_num, received_cents - existing['payment_received_cents'], now, source))
+            conn.execute("UPDATE invoices SET payment_received_cents = ?, updated_at = ? WHERE invoice_number = ?",
+                         (received_cents, now, inv_num))
+        return True
+
+
+def _invoice_from_row(row, items):
+    invoice = {column: row[column] or '' for column in INVOICE_COLUMNS}
+    invoice['invoice_total'] = row['invoice_total_cents'] / 100
+    invoice['total_payment_received'] = row['payment_received_cents'] / 100
+    invoice['line_items'] = [{
+        'description': item['description'],
+        'qty': item['qty'],
+        'unit_price': item['unit_price_cents'] / 100,
+        'total': item['total_cents'] / 100
+    } for item in items]
+    return invoice
+
+
+def get_invoice(inv_num, db_path=None):
+    """An invoice with its line items and payments, shaped like the embedded payload; None if unknown"""
+    ensure_schema(db_path)
+    with connection(db_path) as conn:
+        row = conn.execute("SELECT * FROM invoices WHERE invoice_number = ?", (inv_num,)).fetchone()
+        if not row:
+            return None
+        items = conn.execute("SELECT * FROM line_items WHERE invoice_number = ? ORDER BY position",
+                             (inv_num,)).fetchall()
+        invoice = _invoice_from_row(row, items)
+        invoice['payments'] = [{'amount': p['amount_cents'] / 100, 'received_at': p['received_at'],
+                                'source': p['source']}
+                               for p in conn.execute("SELECT * FROM payments WHERE invoice_number = ? "
+                                                     "ORDER BY id", (inv_num,))]
+        return invoice
+
+
+def find_invoices(voucher_number=None, guest=None, check_in_from=None, check_in_to=None,
+                  check_out_from=None, check_out_to=None, limit=100, db_path=None):
+    """
+    Invoice summaries (no line items) matching every filter given, newest number first.
+    Guest names match case-insensitively on a prefix; dates compare as stored text.
+    """
+    ensure_schema(db_path)
+    clauses, params = [], []
+    if voucher_number:
+        clauses.append("voucher_number = ?")
+        params.append(voucher_number)
+    if guest:
+        # Prefix match on the NOCASE index: a range scan instead of LIKE's full scan
+        clauses.append("customer_name >= ? COLLATE NOCASE AND customer_name < ? COLLATE NOCASE")
+        params.extend([guest, guest + '\uffff'])
+    for column, op, value in (('check_in', '>=', check_in_from), ('check_in', '<=', check_in_to),
+                              ('check_out', '>=', check_out_from), ('check_out', '<=', check_out_to)):
+        if value:
+            clauses.append(f"{column} {op} ?")
+            params.append(value)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+    with connection(db_path) as conn:
+        rows = conn.execute(f"SELECT * FROM invoices {where} ORDER BY invoice_number DESC LIMIT ?",
+                            params + [int(limit)]).fetchall()
+        results = []
+        for row in rows:
+            summary = {column: row[column] or '' for column in INVOICE_COLUMNS}
+            summary['invoice_total'] = row['invoice_total_cents'] / 100
+            summary['total_payment_received'] = row['payment_received_cents'] / 100
+            results.append(summary)
+        return results
+
+
+def search_ledger(text, date_from=None, date_to=None, limit=50, db_path=None):
+    """Ranked full-text search over invoices and vouchers; see invoice_search.search"""
+    ensure_schema(db_path)
+    return search(text, date_from=date_from, date_to=date_to, limit=limit, db_path=db_path)
+
+
+def revenue_report(period_type='month', start=None, end=None, agency=None, by_agency=False, db_path=None):
+    """Revenue, room nights and extras per period from the rollups; see invoice_rollups.revenue_report"""
+    ensure_schema(db_path)
+    return rollup_report(period_type=period_type, start=start, end=end, agency=agency, by_agency=by_agency,
+                         db_path=db_path)
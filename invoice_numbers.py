@@ -0,0 +1,238 @@
+import atexit
+import collections
+import datetime
+import os
+import re
+import sqlite3
+import threading
+
+from db import connection, transaction, resolve_path
+
+# Invoice numbers are handed out from per-process blocks reserved in one short
+# BEGIN IMMEDIATE transaction, so generating an invoice rarely takes the write lock
+# for more than a single insert. Viewing a form only peeks and never reserves.
+FIRST_INVOICE_NUMBER = 700
+DEFAULT_BLOCK_SIZE = 10
+
+
+def format_invoice_number(number):
+    return f"INV-{number:06d}"
+
+
+def parse_invoice_number(invoice_number):
+    """The integer in INV-000712 (or 712), or None for a number that is not numeric"""
+    match = re.fullmatch(r'(?:INV-)?0*(\d+)', (invoice_number or '').strip())
+    return int(match.group(1)) if match else None
+
+
+def invoice_number_from_url(raw_inv):
+    """The stored invoice number for one typed into a URL or lookup box: 712 means INV-000712"""
+    raw_inv = raw_inv.strip()
+    if raw_inv.isdigit():
+        return format_invoice_number(int(raw_inv))
+    return raw_inv if raw_inv.startswith('INV-') else f"INV-{raw_inv}"
+
+
+_schema_ready = set()
+
+
+def ensure_schema(db_path=None):
+    """Create the allocator tables once per process and database"""
+    db_path = resolve_path(db_path)
+    if db_path in _schema_ready:
+        return
+    with transaction(db_path) as conn:
+        conn.execute("CREATE TABLE IF NOT EXISTS metadata(key TEXT PRIMARY KEY, value INTEGER)")
+        # The first invoice number generated should be 700
+        conn.execute("INSERT OR IGNORE INTO metadata(key, value) VALUES('last_inv', ?)", (FIRST_INVOICE_NUMBER - 1,))
+        # Numbers issued before gap tracking existed are not checked for gaps
+        conn.execute("INSERT OR IGNORE INTO metadata(key, value) "
+                     "SELECT 'gap_check_from', value + 1 FROM metadata WHERE key = 'last_inv'")
+        conn.execute("CREATE TABLE IF NOT EXISTS issued_numbers(number INTEGER PRIMARY KEY, issued_at TEXT)")
+        conn.execute("CREATE TABLE IF NOT EXISTS free_numbers(number INTEGER PRIMARY KEY, returned_at TEXT)")
+    _schema_ready.add(db_path)
+
+
+class InvoiceNumberAllocator:
+    """
+    Hands out invoice numbers from a block reserved for this process.
+    Numbers given back (e.g. at shutdown) are reused first by the next reservation,
+    so an invoice can get a lower number than one generated before it; numbering is
+    unique and gap-free, not strictly in date order. Numbers lost to a crash show up
+    in find_number_gaps(). A number already issued, e.g. typed on a form, is skipped.
+    """
+
+    def __init__(self, db_path, block_size=DEFAULT_BLOCK_SIZE):
+        self.db_path = resolve_path(db_path)
+        self.block_size = max(1, int(block_size))
+        self.reservations = 0
+        self._block = collections.deque()
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def _check_fork(self):
+        # A block inherited from a parent process is not ours to use; it becomes a gap
+        if os.getpid() != self._pid:
+            self._block.clear()
+            self._lock = threading.Lock()
+            self._pid = os.getpid()
+
+    def _reserve_block(self):
+        ensure_schema(self.db_path)
+        now = datetime.datetime.now().isoformat(timespec='seconds')
+        with transaction(self.db_path) as conn:
+            numbers = [row[0] for row in conn.execute(
+                "SELECT number FROM free_numbers ORDER BY number LIMIT ?", (self.block_size,))]
+            if numbers:
+                conn.execute(f"DELETE FROM free_numbers WHERE number IN ({','.join('?' * len(numbers))})", numbers)
+            needed = self.block_size - len(numbers)
+            if needed:
+                last = conn.execute("SELECT value FROM metadata WHERE key = 'last_inv'").fetchone()[0]
+                conn.execute("UPDATE metadata SET value = ? WHERE key = 'last_inv'", (last + needed,))
+                numbers.extend(range(last + 1, last + needed + 1))
+        self.reservations += 1
+        print(f"DEBUG: Reserved invoice numbers {numbers[0]}-{numbers[-1]} at {now}")
+        self._block.extend(numbers)
+
+    def peek(self):
+        """The number the next allocation will most likely get; reserves nothing"""
+        with self._lock:
+            self._check_fork()
+            if self._block:
+                return format_invoice_number(self._block[0])
+        return format_invoice_number(peek_unreserved_number(self.db_path))
+
+    def allocate(self):
+        """Commit the next invoice number for an invoice that is being generated"""
+        while True:
+            with self._lock:
+                self._check_fork()
+                if not self._block:
+                    self._reserve_block()
+                number = self._block.popleft()
+            try:
+                with connection(self.db_path) as conn:
+                    conn.execute("INSERT INTO issued_numbers(number, issued_at) VALUES(?, ?)",
+                                 (number, datetime.datetime.now().isoformat(timespec='seconds')))
+            except sqlite3.IntegrityError:
+                # Typed on a form before the counter got here; never issue it twice
+                print(f"DEBUG: Skipping invoice number {number}, it was already issued")
+                continue
+            return format_invoice_number(number)
+
+    def record(self, invoice_number):
+        """
+        Mark a number typed on a form as issued, so no reservation hands it out again.
+        Recording a number that was already issued (re-generating that invoice) is a no-op.
+        """
+        number = parse_invoice_number(invoice_number)
+        if number is None:
+            return False
+        ensure_schema(self.db_path)
+        with transaction(self.db_path) as conn:
+            conn.execute("INSERT OR IGNORE INTO issued_numbers(number, issued_at) VALUES(?, ?)",
+                         (number, datetime.datetime.now().isoformat(timespec='seconds')))
+            conn.execute("DELETE FROM free_numbers WHERE number = ?", (number,))
+        return True
+
+    def release(self):
+        """Return this process's unused numbers so the next reservation reuses them"""
+        with self._lock:
+            if os.getpid() != self._pid or not self._block:
+                return 0
+            numbers = list(self._block)
+            self._block.clear()
+        now = datetime.datetime.now().isoformat(timespec='seconds')
+        with connection(self.db_path) as conn:
+            conn.executemany("INSERT OR IGNORE INTO free_numbers(number, returned_at) VALUES(?, ?)",
+                             [(n, now) for n in numbers])
+        return len(numbers)
+
+
+def peek_unreserved_number(db_path):
+    """Lowest number a new reservation would hand out, read without taking a write lock"""
+    db_path = resolve_path(db_path)
+    if not os.path.exists(db_path):
+        return FIRST_INVOICE_NUMBER
+    with connection(db_path) as conn:
+        try:
+            row = conn.execute("SELECT MIN(number) FROM free_numbers WHERE number NOT IN "
+                               "(SELECT number FROM issued_numbers)").fetchone()
+            if row and row[0] is not None:
+                return row[0]
+        except sqlite3.OperationalError:
+            pass  # Older database without the allocator tables yet
+        try:
+            row = conn.execute("SELECT value FROM metadata WHERE key = 'last_inv'").fetchone()
+        except sqlite3.OperationalError:
+            return FIRST_INVOICE_NUMBER
+        number = row[0] + 1 if row else FIRST_INVOICE_NUMBER
+        # Typed numbers ahead of the counter are skipped when the counter reaches them
+        while conn.execute("SELECT 1 FROM issued_numbers WHERE number = ?", (number,)).fetchone():
+            number += 1
+        return number
+
+
+def is_number_issued(invoice_number, db_path=None):
+    """Whether a number was already given to an invoice, allocated or typed"""
+    number = parse_invoice_number(invoice_number)
+    if number is None:
+        return False
+    ensure_schema(db_path)
+    with connection(db_path) as conn:
+        return conn.execute("SELECT 1 FROM issued_numbers WHERE number = ?", (number,)).fetchone() is not None
+
+
+def find_number_gaps(db_path):
+    """
+    Numbers that were reserved but never issued nor given back, e.g. because a
+    worker crashed holding a block. Numbers held by running workers also appear.
+    Typed numbers count as issued; those beyond the counter are not gaps (yet).
+    """
+    ensure_schema(db_path)
+    with connection(db_path) as conn:
+        start = conn.execute("SELECT value FROM metadata WHERE key = 'gap_check_from'").fetchone()[0]
+        last = conn.execute("SELECT value FROM metadata WHERE key = 'last_inv'").fetchone()[0]
+        accounted = {row[0] for row in conn.execute(
+            "SELECT number FROM issued_numbers WHERE number BETWEEN ? AND ? "
+            "UNION SELECT number FROM free_numbers WHERE number BETWEEN ? AND ?", (start, last, start, last))}
+    return [n for n in range(start, last + 1) if n not in accounted]
+
+
+_allocators = {}
+_allocators_lock = threading.Lock()
+
+
+def get_allocator(db_path=None, block_size=None):
+    """The allocator for a database (default: the configured one), created once per process"""
+    db_path = resolve_path(db_path)
+    with _allocators_lock:
+        allocator = _allocators.get(db_path)
+        if allocator is None:
+            allocator = InvoiceNumberAllocator(db_path, block_size or DEFAULT_BLOCK_SIZE)
+            _allocators[db_path] = allocator
+        return allocator
+
+
+def peek_invoice_number(db_path=None):
+    return get_allocator(db_path).peek()
+
+
+def allocate_invoice_number(db_path=None):
+    return get_allocator(db_path).allocate()
+
+
+def record_invoice_number(invoice_number, db_path=None):
+    return get_allocator(db_path).record(invoice_number)
+
+
+def release_invoice_numbers():
+    """Give back every unused reserved number; runs at interpreter exit"""
+    for allocator in list(_allocators.values()):
+        try:
+            allocator.release()
+        except sqlite3.Error as e:
+            print(f"DEBUG: Could not return unused invoice numbers: {e}")
+
+
+atexit.register(release_invoice_numbers)
@@ -0,0 +1,95 @@
+import io
+import json
+
+from PyPDF2 import PdfReader
+
+from money import to_cents
+
+# Every generated invoice carries its structured data as an embedded JSON file,
+# so editing it never has to scrape the PDF text again
+PAYLOAD_FILENAME = 'ulendo-invoice.json'
+PAYLOAD_SCHEMA = 'ulendo-invoice'
+PAYLOAD_VERSION = 1
+
+INVOICE_FIELDS = ['invoice_number', 'invoice_date', 'voucher_number', 'passenger_names',
+                  'customer_name', 'check_in', 'check_out', 'length_of_stay', 'voucher_ref',
+                  'billing_address', 'remarks']
+
+
+def build_payload(invoice_data, inv_num):
+    """
+    Build the versioned payload dict for an invoice. Amounts were validated by
+    build_invoice_data; they are normalised through cents (stored as rands) so the
+    payload always matches the ledger and the rendered figures.
+    """
+    invoice = {field: invoice_data.get(field, '') for field in INVOICE_FIELDS}
+    invoice['invoice_number'] = inv_num
+    invoice['total_payment_received'] = to_cents(invoice_data.get('total_payment_received') or 0) / 100
+    line_items = [(item, to_cents(item.get('unit_price', 0)), to_cents(item.get('total', 0)))
+                  for item in invoice_data.get('line_items', [])]
+    invoice['line_items'] = [{
+        'description': item.get('description', ''),
+        'qty': item.get('qty', 0),
+        'unit_price': unit_price_cents / 100,
+        'total': total_cents / 100
+    } for item, unit_price_cents, total_cents in line_items]
+    # The invoice total is always the sum of the line items, as on the rendered invoice
+    invoice['invoice_total'] = sum(total_cents for _, _, total_cents in line_items) / 100
+    return {'schema': PAYLOAD_SCHEMA, 'version': PAYLOAD_VERSION, 'invoice': invoice}
+
+
+def dump_payload(payload):
+    # sort_keys keeps the attachment byte-stable for deterministic PDFs
+    return json.dumps(payload, sort_keys=True).encode('utf-8')
+
+
+def payload_bytes(invoice_data, inv_num):
+    return dump_payload(build_payload(invoice_data, inv_num))
+
+
+def invoice_payload_bytes(invoice):
+    """Serialise an already-built invoice dict (e.g. one read back from a PDF)"""
+    return dump_payload({'schema': PAYLOAD_SCHEMA, 'version': PAYLOAD_VERSION, 'invoice': invoice})
+
+
+def _embedded_files(names_tree):
+    """Yield (name, filespec) pairs from a PDF name tree, following /Kids"""
+    names = names_tree.get('/Names', [])
+    for i in range(0, len(names) - 1, 2):
+        yield str(names[i]), names[i + 1].get_object()
+    for kid in names_tree.get('/Kids', []):
+        yield from _embedded_files(kid.get_object())
+
+
+def read_payload(source):
+    """
+    Read the embedded invoice payload from PDF bytes, a path or a file object.
+    Returns the invoice dict, or None for PDFs without a (supported) payload.
+    """
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+    try:
+        reader = PdfReader(source)
+        root = reader.trailer['/Root'].get_object()
+        names = root.get('/Names')
+        if not names or '/EmbeddedFiles' not in names.get_object():
+            return None
+        for name, filespec in _embedded_files(names.get_object()['/EmbeddedFiles'].get_object()):
+            if name != PAYLOAD_FILENAME:
+                continue
+            payload = json.loads(filespec['/EF']['/F'].get_object().get_data())
+            if payload.get('schema') != PAYLOAD_SCHEMA or payload.get('version', 0) > PAYLOAD_VERSION:
+                print(f"DEBUG: Unsupported invoice payload {payload.get('schema')} v{payload.get('version')}")
+                return None
+            return payload['invoice']
+    except Exception as e:
+        print(f"DEBUG: Could not read embedded invoice payload: {e}")
+    return None
+
+
+def payload_to_review_data(invoice):
+    """Shape an embedded payload like parse_existing_invoice's result for the review page"""
+    data = dict(invoice)
+    data['invoice_number_from_pdf'] = invoice.get('invoice_number', '')
+    data['outstanding_balance'] = max(0.0, invoice.get('invoice_total', 0) - invoice.get('total_payment_received', 0))
+    return data
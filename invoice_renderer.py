@@ -0,0 +1,565 @@
+import base64
+import datetime
+import hashlib
+import io
+import os
+import sqlite3
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+
+import pdfkit
+from flask import render_template, stream_template, current_app
+from PyPDF2 import PdfReader, PdfWriter
+from PyPDF2.generic import ArrayObject, NameObject
+
+from invoice_generator import (render_invoice_pdf_bytes, format_invoice_date,
+                               paginate_line_items, logo_png_bytes, LOGO_PATH)
+from archive_store import store
+from invoice_payload import PAYLOAD_FILENAME, payload_bytes
+from money import to_cents
+import render_manager
+from render_manager import render_slot, render_counts, RenderTimeoutError
+
+# PDF options for wkhtmltopdf (to ensure single page and other settings)
+PDF_OPTIONS = {
+    'page-size': 'A4',
+    'margin-top': '0mm',
+    'margin-right': '0mm',
+    'margin-bottom': '0mm',
+    'margin-left': '0mm',
+    'encoding': "UTF-8",
+    'enable-local-file-access': None
+}
+
+# Bundled fonts with a private fontconfig setup, so wkhtmltopdf resolves the same
+# fonts on every host without falling back to a system-wide font search
+FONTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'assets', 'fonts')
+FONTCONFIG_FILE = os.path.join(FONTS_DIR, 'fonts.conf')
+
+_pdfkit_configuration = None
+
+# Renderer readiness, probed once at startup and cached so requests never re-check.
+# engine is 'wkhtmltopdf' when available, otherwise the in-process 'reportlab' fallback.
+RENDERER_STATUS = {
+    'ready': False,
+    'engine': None,
+    'wkhtmltopdf': False,
+    'wkhtmltopdf_path': None,
+    'error': None,
+    'checked_at': None,
+    'warmed_up': False,
+    'warmup_ms': None
+}
+
+# Archiving generated PDFs happens off the request path on one background thread
+_archive_executor = ThreadPoolExecutor(max_workers=1)
+
+
+def build_invoice_data(data):
+    """Build the invoice data dict from submitted review-form fields"""
+    invoice_data = {
+        'check_in': data.get('check_in', ''),
+        'check_out': data.get('check_out', ''),
+        'length_of_stay': data.get('length_of_stay', ''),
+        'voucher_number': data.get('voucher_number', ''),
+        'voucher_ref': data.get('voucher_ref', ''),
+        'billing_address': data.get('billing_address', ''),
+        'remarks': data.get('remarks', ''),
+        'passenger_names': data.get('passenger_names', ''),
+        'customer_name': data.get('passenger_names', ''), # Use passenger names as customer name
+        'total_payment_received': data.get('total_payment_received', '0.00'),
+        'invoice_date': data.get('invoice_date') or datetime.date.today().isoformat(),
+        'line_items': []
+    }
+
+    # Amounts are validated and normalised here, once; everything downstream trusts them
+    for i in range(len(data.keys())): # Iterate through potential line item indices
+        desc_key = f'description_{i}'
+        qty_key = f'qty_{i}'
+        unit_price_key = f'unit_price_{i}'
+        total_key = f'total_{i}'
+
+        if data.get(desc_key) and data.get(qty_key) and data.get(unit_price_key) and data.get(total_key):
+            try:
+                description = data.get(desc_key)
+                qty = int(data.get(qty_key))
+                unit_price_cents = to_cents(data.get(unit_price_key))
+                total_cents = to_cents(data.get(total_key))
+
+                if description and qty >= 0 and unit_price_cents >= 0 and total_cents >= 0:
+                    invoice_data['line_items'].append({
+                        'description': description,
+                        'qty': qty,
+                        'unit_price': unit_price_cents / 100,
+                        'total': total_cents / 100
+                    })
+            except (ValueError, TypeError):
+                # Handle cases where conversion to int/float fails
+                pass
+        else:
+            # If a description is missing, assume no more line items for this index and break
+            if desc_key in data or qty_key in data or unit_price_key in data or total_key in data:
+                # If any part of a line item exists but not all, it's an incomplete entry, skip it
+                pass
+            else:
+                break # Stop if we encounter a missing description, assuming no more line items
+
+    invoice_data['total_payment_received'] = parse_amount(invoice_data['total_payment_received'])
+    invoice_data['invoice_total'] = sum_line_totals(invoice_data['line_items'])
+    return invoice_data
+
+
+def sum_line_totals(line_items):
+    """Invoice total of the line items, summed in cents so it never drifts"""
+    return sum(to_cents(item.get('total', 0)) for item in line_items) / 100
+
+
+def parse_amount(value, default=0.0):
+    """Parse a money value such as 'R1,234.50' or '1234.5' into a float"""
+    try:
+        return to_cents(value) / 100
+    except ValueError:
+        return default
+
+
+def normalize_invoice_number(raw_inv):
+    """Ensure the INV- prefix is always present"""
+    raw_inv = raw_inv.strip()
+    return raw_inv if raw_inv.startswith('INV-') else f"INV-{raw_inv}"
+
+
+@lru_cache(maxsize=1)
+def default_logo_url():
+    """
+    Logo for rendered invoices, worked out once per process: a scaled-down copy
+    inlined as a data URI, or the full-size file:// URI if it cannot be scaled.
+    """
+    logo_png = logo_png_bytes()
+    if logo_png:
+        return 'data:image/png;base64,' + base64.b64encode(logo_png).decode('ascii')
+    return Path(LOGO_PATH).resolve().as_uri()
+
+
+def build_render_context(invoice_data, inv_num, logo_url=None):
+    """
+    Build the invoice.html template context for one invoice.
+    Amounts are expected to be normalised already (see build_invoice_data / build_payload).
+    logo_url overrides the inlined logo (e.g. for previews shown in a browser).
+    """
+    if 'invoice_total' not in invoice_data:
+        invoice_data['invoice_total'] = sum_line_totals(invoice_data['line_items'])
+    payment_received = invoice_data.get('total_payment_received') or 0.0
+    if not isinstance(payment_received, (int, float)):
+        payment_received = parse_amount(payment_received)
+    outstanding = max(0.0, invoice_data['invoice_total'] - payment_received)
+
+    return {
+        'data': invoice_data,
+        'invoice_number': inv_num,
+        'today': format_invoice_date(invoice_data.get('invoice_date')),
+        'logo_file_url': logo_url or default_logo_url(),
+        'payment_received': payment_received,
+        'outstanding': outstanding,
+        # A generator, so the template pulls one page of rows at a time
+        'line_item_pages': paginate_line_items(invoice_data['line_items'])
+    }
+
+
+def render_invoice_html(invoice_data, inv_num, logo_url=None):
+    """Render invoice.html for the given invoice data (requires an app context)"""
+    return render_template('invoice.html', **build_render_context(invoice_data, inv_num, logo_url))
+
+
+def renderer_environ():
+    """Environment for wkhtmltopdf: the current one, pointed at the bundled fontconfig"""
+    environ = dict(os.environ)
+    if os.path.exists(FONTCONFIG_FILE):
+        environ['FONTCONFIG_FILE'] = FONTCONFIG_FILE
+    return environ
+
+
+def get_pdfkit_configuration():
+    """
+    The pdfkit configuration, resolved once per process so renders neither search
+    PATH for wkhtmltopdf nor rebuild the environment. Raises OSError when missing.
+    """
+    global _pdfkit_configuration
+    if _pdfkit_configuration is None:
+        _pdfkit_configuration = pdfkit.configuration(environ=renderer_environ())
+    return _pdfkit_configuration
+
+
+def stream_invoice_html(invoice_data, inv_num):
+    """Render invoice.html as a stream of string chunks (requires an app context)"""
+    return stream_template('invoice.html', **build_render_context(invoice_data, inv_num))
+
+
+def _read_pipe(pipe, chunks):
+    for chunk in iter(lambda: pipe.read(65536), b''):
+        chunks.append(chunk)
+    pipe.close()
+
+
+def html_stream_to_pdf(html_chunks):
+    """
+    Feed HTML chunks straight into wkhtmltopdf's stdin and return the PDF bytes,
+    so the rendered page never has to be held in memory as one string.
+    At most RENDER_CONCURRENCY processes run at once (others wait their turn), and a
+    process still running after RENDER_TIMEOUT seconds is killed.
+    """
+    kit = pdfkit.PDFKit('', 'string', options=PDF_OPTIONS, configuration=get_pdfkit_configuration())
+    with render_slot():
+        proc = subprocess.Popen(kit.command(), stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE, env=kit.environ)
+
+        # Kill a hung process; this also unblocks a write into its full stdin pipe
+        timed_out = threading.Event()
+
+        def kill_hung_render():
+            timed_out.set()
+            proc.kill()
+
+        watchdog = threading.Timer(render_manager.RENDER_TIMEOUT, kill_hung_render)
+        watchdog.daemon = True
+        watchdog.start()
+
+        # Drain stdout/stderr on threads so a full pipe can never stall the writer
+        stdout_chunks, stderr_chunks = [], []
+        readers = [threading.Thread(target=_read_pipe, args=(proc.stdout, stdout_chunks), daemon=True),
+                   threading.Thread(target=_read_pipe, args=(proc.stderr, stderr_chunks), daemon=True)]
+        for reader in readers:
+            reader.start()
+
+        try:
+            for chunk in html_chunks:
+                proc.stdin.write(chunk.encode('utf-8'))
+        except BrokenPipeError:
+            pass  # wkhtmltopdf exited early; its stderr says why
+        finally:
+            try:
+                proc.stdin.close()
+            except BrokenPipeError:
+                pass
+
+            exit_code = proc.wait()
+            watchdog.cancel()
+            for reader in readers:
+                reader.join()
+
+    if timed_out.is_set():
+        raise RenderTimeoutError(f"wkhtmltopdf did not finish within {render_manager.RENDER_TIMEOUT}s and was killed")
+    stderr = b''.join(stderr_chunks).decode('utf-8', errors='replace')
+    if exit_code != 0:
+        raise IOError(f"wkhtmltopdf exited with code {exit_code}:\n{stderr}")
+    pdf_bytes = b''.join(stdout_chunks)
+    if not pdf_bytes:
+        raise IOError(f"wkhtmltopdf produced no output:\n{stderr}")
+    return pdf_bytes
+
+
+def _deterministic_enabled(deterministic):
+    if deterministic is None:
+        return current_app.config.get('DETERMINISTIC_PDF', False)
+    return deterministic
+
+
+def render_invoice_pdf(invoice_data, inv_num, deterministic=None):
+    """
+    Render an invoice to PDF bytes with the active engine: wkhtmltopdf, or reportlab
+    when wkhtmltopdf is unavailable or fails. A RenderTimeoutError (overloaded or hung
+    wkhtmltopdf) is raised rather than answered with a different-looking invoice.
+    deterministic defaults to the app's DETERMINISTIC_PDF setting.
+    """
+    if active_engine() == 'wkhtmltopdf':
+        try:
+            return render_invoice_pdf_wkhtmltopdf(invoice_data, inv_num, deterministic)
+        except OSError as e:
+            print(f"DEBUG: wkhtmltopdf render failed, using reportlab instead: {e}")
+            if isinstance(e, FileNotFoundError):
+                # The binary disappeared after the probe; stop trying it
+                _mark_wkhtmltopdf_unavailable(e)
+    return render_invoice_pdf_reportlab(invoice_data, inv_num, deterministic)
+
+
+def render_invoice_pdf_wkhtmltopdf(invoice_data, inv_num, deterministic=None):
+    """Render an invoice to PDF bytes with wkhtmltopdf (no fallback)"""
+    pdf_bytes = html_stream_to_pdf(stream_invoice_html(invoice_data, inv_num))
+    return finalize_invoice_pdf(pdf_bytes, invoice_data, inv_num, _deterministic_enabled(deterministic))
+
+
+def render_invoice_pdf_reportlab(invoice_data, inv_num, deterministic=None):
+    """Render an invoice in-process with reportlab (no wkhtmltopdf needed)"""
+    deterministic = _deterministic_enabled(deterministic)
+    pdf_bytes = render_invoice_pdf_bytes(inv_num, invoice_data, invariant=deterministic)
+    return finalize_invoice_pdf(pdf_bytes, invoice_data, inv_num, deterministic)
+
+
+def _pdf_date(invoice_date):
+    """PDF date string for midnight UTC on the invoice date"""
+    try:
+        day = datetime.datetime.strptime(str(invoice_date), '%Y-%m-%d')
+    except ValueError:
+        day = datetime.datetime(2000, 1, 1)
+    return day.strftime("D:%Y%m%d000000+00'00'")
+
+
+def _rewrite_pdf(pdf_bytes, invoice_date=None, deterministic=False, attachments=()):
+    """
+    Copy a PDF through PyPDF2 once, adding (filename, data) attachments and,
+    when deterministic, pinning its metadata and /ID.
+    """
+    reader = PdfReader(io.BytesIO(pdf_bytes))
+    writer = PdfWriter()
+    writer.clone_document_from_reader(reader)
+    # PyPDF2's add_attachment replaces the name tree each time, so collect the entries
+    names = ArrayObject()
+    for filename, data in sorted(attachments):
+        writer.add_attachment(filename, data)
+        names.extend(writer._root_object['/Names']['/EmbeddedFiles']['/Names'])
+    if attachments:
+        writer._root_object['/Names']['/EmbeddedFiles'][NameObject('/Names')] = names
+
+    if not deterministic:
+        if reader.metadata:
+            writer.add_metadata(reader.metadata)
+        buffer = io.BytesIO()
+        writer.write(buffer)
+        return buffer.getvalue()
+
+    # Keep descriptive metadata (e.g. the title) but pin everything time- or tool-dependent
+    metadata = {key: value for key, value in (reader.metadata or {}).items()
+                if key not in ('/CreationDate', '/ModDate', '/Producer')}
+    pdf_date = _pdf_date(invoice_date)
+    metadata.update({
+        '/Producer': 'Ulendo Invoice Generator',
+        '/CreationDate': pdf_date,
+        '/ModDate': pdf_date
+    })
+    writer.add_metadata(metadata)
+
+    # PyPDF2 writes no /ID unless it encrypts; derive one from the content it did write
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    return _add_trailer_id(buffer.getvalue())
+
+
+def _add_trailer_id(pdf_bytes):
+    """
+    Add an /ID pair, the MD5 of the document, to the last trailer. The trailer follows
+    the xref table, so nothing the xref points at moves.
+    """
+    position = pdf_bytes.rfind(b'trailer')
+    start = pdf_bytes.find(b'<<', position)
+    if position < 0 or start < 0:
+        return pdf_bytes
+    file_id = hashlib.md5(pdf_bytes).hexdigest().encode('ascii')
+    start += 2
+    return pdf_bytes[:start] + b'\n/ID [ <' + file_id + b'> <' + file_id + b'> ]' + pdf_bytes[start:]
+
+
+def make_pdf_deterministic(pdf_bytes, invoice_date=None):
+    """
+    Rewrite a PDF so identical invoice data always gives identical bytes:
+    CreationDate/ModDate come from the invoice date, the producer is fixed and
+    the /ID is derived from a hash of the document content.
+    """
+    return _rewrite_pdf(pdf_bytes, invoice_date, deterministic=True)
+
+
+def finalize_invoice_pdf(pdf_bytes, invoice_data, inv_num, deterministic=False):
+    """Embed the structured invoice payload and optionally make the output byte-stable"""
+    attachments = [(PAYLOAD_FILENAME, payload_bytes(invoice_data, inv_num))]
+    return _rewrite_pdf(pdf_bytes, invoice_data.get('invoice_date'), deterministic, attachments)
+
+
+def wkhtmltopdf_available():
+    """Return True if pdfkit can find the wkhtmltopdf binary"""
+    try:
+        get_pdfkit_configuration()
+        return True
+    except OSError:
+        return False
+
+
+def _mark_wkhtmltopdf_unavailable(error):
+    RENDERER_STATUS.update({
+        'engine': 'reportlab',
+        'wkhtmltopdf': False,
+        'error': str(error).strip().splitlines()[0] if str(error).strip() else repr(error)
+    })
+
+
+def check_renderer():
+    """Look for the wkhtmltopdf binary once and choose the engine; the result is cached"""
+    try:
+        configuration = get_pdfkit_configuration()
+        path = configuration.wkhtmltopdf
+        RENDERER_STATUS.update({
+            'engine': 'wkhtmltopdf',
+            'wkhtmltopdf': True,
+            'wkhtmltopdf_path': path.decode() if isinstance(path, bytes) else path,
+            'error': None
+        })
+    except OSError as e:
+        print(f"DEBUG: wkhtmltopdf not available, falling back to reportlab: {e}")
+        _mark_wkhtmltopdf_unavailable(e)
+    RENDERER_STATUS['ready'] = True
+    RENDERER_STATUS['checked_at'] = datetime.datetime.now().isoformat(timespec='seconds')
+    return RENDERER_STATUS['engine']
+
+
+def active_engine():
+    return RENDERER_STATUS['engine'] or check_renderer()
+
+
+def _warmup_invoice():
+    return {
+        'voucher_number': 'WARMUP',
+        'passenger_names': 'WARM-UP, RENDER',
+        'customer_name': 'WARM-UP, RENDER',
+        'check_in': '2025/01/01',
+        'check_out': '2025/01/03',
+        'length_of_stay': '2',
+        'total_payment_received': 0.0,
+        'invoice_date': '2025-01-03',
+        'line_items': [
+            {'description': 'Accommodation', 'qty': 2, 'unit_price': 850.0, 'total': 1700.0},
+            {'description': 'Daily Transport', 'qty': 2, 'unit_price': 300.0, 'total': 600.0}
+        ]
+    }
+
+
+def warm_up_renderer(app):
+    """
+    Render a throwaway invoice with the active engine so the first real render does
+    not pay for loading the binary, shared libraries, fonts and templates.
+    Records the warm-up latency. If wkhtmltopdf is present but cannot render,
+    switches to reportlab and warms that up instead.
+    """
+    engine = active_engine()
+    started = time.perf_counter()
+    try:
+        with app.app_context():
+            if engine == 'wkhtmltopdf':
+                render_invoice_pdf_wkhtmltopdf(_warmup_invoice(), 'INV-WARMUP', deterministic=False)
+            else:
+                render_invoice_pdf_reportlab(_warmup_invoice(), 'INV-WARMUP', deterministic=False)
+    except Exception as e:
+        print(f"DEBUG: {engine} warm-up render failed: {e}")
+        if engine == 'wkhtmltopdf':
+            _mark_wkhtmltopdf_unavailable(e)
+            return warm_up_renderer(app)
+        # Not even the in-process engine can render
+        RENDERER_STATUS.update({'ready': False, 'warmed_up': False, 'error': str(e)})
+        return RENDERER_STATUS
+
+    RENDERER_STATUS.update({
+        'warmed_up': True,
+        'warmup_ms': round((time.perf_counter() - started) * 1000, 1)
+    })
+    print(f"DEBUG: {engine} renderer warmed up in {RENDERER_STATUS['warmup_ms']} ms")
+    return RENDERER_STATUS
+
+
+def probe_renderer(app, warm_up=True):
+    """
+    Startup probe: pick the engine now and, optionally, warm it up on a background
+    thread so app startup is not held up by the first render.
+    """
+    check_renderer()
+    if warm_up:
+        threading.Thread(target=warm_up_renderer, args=(app,), daemon=True).start()
+
+
+def renderer_status():
+    """Snapshot of renderer readiness for the health endpoint"""
+    status = dict(RENDERER_STATUS)
+    status['fallback'] = status['engine'] != 'wkhtmltopdf'
+    status.update(render_counts())
+    return status
+
+
+def finalize_combined_pdf(pdf_bytes, jobs, deterministic=False):
+    """
+    Embed the payload of every invoice in a combined PDF, one attachment per invoice
+    number, and optionally make it byte-stable like a single invoice.
+    """
+    if len(jobs) == 1:
+        return finalize_invoice_pdf(pdf_bytes, jobs[0][0], jobs[0][1], deterministic)
+    attachments = [(f'ulendo-invoice-{inv_num}.json', payload_bytes(invoice_data, inv_num))
+                   for invoice_data, inv_num in jobs]
+    return _rewrite_pdf(pdf_bytes, jobs[0][0].get('invoice_date'), deterministic, attachments)
+
+
+def render_invoices_combined_pdf(jobs, deterministic=None):
+    """
+    Render several (invoice_data, invoice_number) jobs into one PDF with a single
+    wkhtmltopdf run. Each invoice starts on its own page.
+    Without wkhtmltopdf the invoices are rendered with reportlab and joined.
+    """
+    deterministic = _deterministic_enabled(deterministic)
+    if active_engine() != 'wkhtmltopdf':
+        # Fallback: render each invoice in-process and concatenate the pages
+        writer = PdfWriter()
+        for invoice_data, inv_num in jobs:
+            pdf_bytes = render_invoice_pdf_bytes(inv_num, invoice_data, invariant=deterministic)
+            for page in PdfReader(io.BytesIO(pdf_bytes)).pages:
+                writer.add_page(page)
+        buffer = io.BytesIO()
+        writer.write(buffer)
+        return finalize_combined_pdf(buffer.getvalue(), jobs, deterministic)
+
+    contexts = [build_render_context(invoice_data, inv_num) for invoice_data, inv_num in jobs]
+    pdf_bytes = html_stream_to_pdf(stream_template('invoice_batch.html', invoices=contexts))
+    return finalize_combined_pdf(pdf_bytes, jobs, deterministic)
+
+
+def split_combined_pdf(pdf_bytes, jobs, deterministic=None):
+    """
+    Split a combined batch PDF back into one PDF per (invoice_data, invoice_number)
+    job, each finalized like a single invoice with its own embedded payload.
+    Returns a list of (invoice_number, pdf_bytes) in the original order.
+    """
+    deterministic = _deterministic_enabled(deterministic)
+    inv_nums = [inv_num for _, inv_num in jobs]
+    reader = PdfReader(io.BytesIO(pdf_bytes))
+    page_count = len(reader.pages)
+
+    if page_count == len(inv_nums):
+        # Common case: every invoice fits on a single page
+        starts = list(range(page_count))
+    else:
+        # Some invoices ran over a page; find where each one starts by its number
+        starts = []
+        for page_no, page in enumerate(reader.pages):
+            if len(starts) < len(inv_nums) and inv_nums[len(starts)] in (page.extract_text() or ''):
+                starts.append(page_no)
+        if len(starts) != len(inv_nums) or starts[0] != 0:
+            raise ValueError(f"Could not locate all {len(inv_nums)} invoices in the combined PDF")
+
+    results = []
+    for idx, (invoice_data, inv_num) in enumerate(jobs):
+        end = starts[idx + 1] if idx + 1 < len(starts) else page_count
+        writer = PdfWriter()
+        for page_no in range(starts[idx], end):
+            writer.add_page(reader.pages[page_no])
+        buffer = io.BytesIO()
+        writer.write(buffer)
+        results.append((inv_num, finalize_invoice_pdf(buffer.getvalue(), invoice_data, inv_num, deterministic)))
+    return results
+
+
+def _archive_invoice(inv_num, filename, pdf_bytes):
+    try:
+        store('invoice', inv_num, pdf_bytes, filename=filename)
+    except (OSError, sqlite3.Error) as e:
+        print(f"Failed to archive {filename}: {e}")
+
+
+def archive_pdf_async(inv_num, filename, pdf_bytes):
+    """Queue a generated PDF for the archive, under its invoice number, without blocking the request"""
+    return _archive_executor.submit(_archive_invoice, inv_num, filename, pdf_bytes)
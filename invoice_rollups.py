@@ -0,0 +1,124 @@
+import collections
+
+from db import connection
+
+# Revenue and room-night totals per day and month, per agency and line item category,
+# adjusted in the same transaction as every ledger write: an edited invoice takes its
+# old figures out and puts its new ones in. Reports read these rows directly, so they
+# cost the same however many invoices exist. Invoices are bucketed by invoice date.
+ROLLUP_SCHEMA = """CREATE TABLE revenue_rollups(
+    period_type TEXT NOT NULL,
+    period TEXT NOT NULL,
+    agency TEXT NOT NULL,
+    category TEXT NOT NULL,
+    invoices INTEGER NOT NULL DEFAULT 0,
+    quantity INTEGER NOT NULL DEFAULT 0,
+    revenue_cents INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (period_type, period, agency, category)) WITHOUT ROWID"""
+
+ALL = '*'  # agency / category value for totals across all of them
+PERIOD_TYPES = {'day': 10, 'month': 7}  # length of the YYYY-MM-DD prefix for each period
+
+
+def line_item_category(description):
+    """Report category of a line item, from its description"""
+    text = (description or '').lower()
+    # "Laundry Transport" is a laundry charge, so laundry is checked first
+    if 'laundry' in text:
+        return 'laundry'
+    if 'transport' in text or 'shuttle' in text:
+        return 'transport'
+    if 'accommodation' in text or 'room' in text:
+        return 'accommodation'
+    return 'other'
+
+
+def invoice_figures(items):
+    """
+    Totals per category for one invoice's line items, given as
+    (description, qty, total_cents) tuples: {category: (quantity, revenue_cents)}
+    """
+    figures = {ALL: [0, 0]}  # an invoice without line items still counts as an invoice
+    for description, qty, total_cents in items:
+        category = figures.setdefault(line_item_category(description), [0, 0])
+        category[0] += qty or 0
+        category[1] += total_cents or 0
+        figures[ALL][1] += total_cents or 0
+    return {category: tuple(values) for category, values in figures.items()}
+
+
+def apply_invoice(conn, invoice_date, agency, items, sign=1):
+    """Add (sign=1) or take out (sign=-1) one invoice's figures; call inside the ledger transaction"""
+    invoice_date = (invoice_date or '')[:10].replace('/', '-')
+    if len(invoice_date) != 10:
+        return
+    figures = invoice_figures(items)
+    rows = []
+    for period_type, length in PERIOD_TYPES.items():
+        for agency_key in {agency or '', ALL}:
+            for category, (quantity, revenue_cents) in figures.items():
+                rows.append((period_type, invoice_date[:length], agency_key, category,
+                             sign, sign * quantity, sign * revenue_cents))
+    conn.executemany("INSERT INTO revenue_rollups(period_type, period, agency, category, invoices, quantity, "
+                     "revenue_cents) VALUES(?, ?, ?, ?, ?, ?, ?) "
+                     "ON CONFLICT(period_type, period, agency, category) DO UPDATE SET "
+                     "invoices = invoices + excluded.invoices, quantity = quantity + excluded.quantity, "
+                     "revenue_cents = revenue_cents + excluded.revenue_cents", rows)
+    if sign < 0:
+        conn.executemany("DELETE FROM revenue_rollups WHERE period_type = ? AND period = ? AND agency = ? "
+                         "AND category = ? AND invoices = 0", [row[:4] for row in rows])
+
+
+def create_rollups(conn):
+    """Create the rollup table inside an open transaction, totalling existing invoices the first time"""
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'revenue_rollups'").fetchone()
+    if exists:
+        return
+    conn.execute(ROLLUP_SCHEMA)
+    items = collections.defaultdict(list)
+    for row in conn.execute("SELECT invoice_number, description, qty, total_cents FROM line_items"):
+        items[row['invoice_number']].append((row['description'], row['qty'], row['total_cents']))
+    for row in conn.execute("SELECT invoice_number, invoice_date, agency FROM invoices").fetchall():
+        apply_invoice(conn, row['invoice_date'], row['agency'], items.get(row['invoice_number'], []))
+
+
+def revenue_report(period_type='month', start=None, end=None, agency=None, by_agency=False, db_path=None):
+    """
+    Figures per period between start and end (inclusive, 'YYYY-MM' or 'YYYY-MM-DD'),
+    for one agency, all of them together, or each agency separately (by_agency).
+    Reads only the rollup rows in range.
+    """
+    if period_type not in PERIOD_TYPES:
+        raise ValueError(f"period must be one of: {', '.join(PERIOD_TYPES)}")
+    clauses, params = ["period_type = ?"], [period_type]
+    if by_agency:
+        clauses.append("agency != ?")
+        params.append(ALL)
+    else:
+        clauses.append("agency = ?")
+        params.append(agency or ALL)
+    if start:
+        clauses.append("period >= ?")
+        params.append(start[:PERIOD_TYPES[period_type]])
+    if end:
+        clauses.append("period <= ?")
+        params.append(end[:PERIOD_TYPES[period_type]])
+    report = collections.OrderedDict()
+    with connection(db_path) as conn:
+        for row in conn.execute(f"SELECT period, agency, category, invoices, quantity, revenue_cents "
+                                f"FROM revenue_rollups WHERE {' AND '.join(clauses)} ORDER BY period, agency", params):
+            entry = report.setdefault((row['period'], row['agency']), {
+                'period': row['period'], 'agency': row['agency'] if row['agency'] != ALL else 'All agencies',
+                'invoices': 0, 'revenue': 0.0, 'room_nights': 0, 'categories': {}
+            })
+            if row['category'] == ALL:
+                entry['invoices'] = row['invoices']
+                entry['revenue'] = row['revenue_cents'] / 100
+                continue
+            entry['categories'][row['category']] = {
+                'invoices': row['invoices'], 'quantity': row['quantity'], 'revenue': row['revenue_cents'] / 100
+            }
+            if row['category'] == 'accommodation':
+                entry['room_nights'] = row['quantity']
+    return list(report.values())
+
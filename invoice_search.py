@@ -0,0 +1,127 @@
+import re
+
+from db import connection, transaction
+
+# One FTS5 index over ledger invoices and uploaded vouchers, written in the same
+# transaction as the rows it describes. Invoice rows use the invoice's rowid and
+# voucher rows the negated voucher rowid, so both kinds rank against each other.
+SEARCH_SCHEMA = """CREATE VIRTUAL TABLE search_index USING fts5(
+    kind UNINDEXED,
+    key UNINDEXED,
+    invoice_number,
+    voucher_number,
+    guest,
+    descriptions,
+    remarks,
+    agency,
+    tokenize = 'unicode61 remove_diacritics 2',
+    prefix = '2 3')"""
+
+# bm25 weights per column, in table order: numbers and names outrank free text
+SEARCH_WEIGHTS = (0, 0, 10.0, 10.0, 8.0, 2.0, 1.0, 3.0)
+
+SEARCH_COLUMNS = ['invoice_number', 'voucher_number', 'guest', 'descriptions', 'remarks', 'agency']
+
+
+def create_search_index(conn):
+    """Create the index inside an open transaction, filling it from existing rows the first time"""
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'search_index'").fetchone()
+    if exists:
+        return
+    conn.execute(SEARCH_SCHEMA)
+    fill_search_index(conn)
+
+
+def fill_search_index(conn):
+    conn.execute("INSERT INTO search_index(rowid, kind, key, invoice_number, voucher_number, guest, "
+                 "descriptions, remarks, agency) "
+                 "SELECT i.rowid, 'invoice', i.invoice_number, i.invoice_number, i.voucher_number, "
+                 "i.passenger_names, (SELECT group_concat(description, ' ') FROM line_items l "
+                 "WHERE l.invoice_number = i.invoice_number), i.remarks, i.agency FROM invoices i")
+    conn.execute("INSERT INTO search_index(rowid, kind, key, invoice_number, voucher_number, guest, "
+                 "descriptions, remarks, agency) "
+                 "SELECT -v.rowid, 'voucher', v.voucher_ref, '', v.voucher_number, v.passenger_names, "
+                 "'', v.remarks, '' FROM vouchers v")
+
+
+def rebuild_search_index(db_path=None):
+    """
+    Re-create every index row from the ledger. Needed after VACUUM, which may
+    renumber the rowids the index rows are keyed on.
+    """
+    with transaction(db_path) as conn:
+        conn.execute("DELETE FROM search_index")
+        fill_search_index(conn)
+
+
+def _index_row(conn, rowid, kind, key, values):
+    conn.execute("DELETE FROM search_index WHERE rowid = ?", (rowid,))
+    conn.execute("INSERT INTO search_index(rowid, kind, key, invoice_number, voucher_number, guest, "
+                 "descriptions, remarks, agency) VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                 [rowid, kind, key] + [values.get(column) or '' for column in SEARCH_COLUMNS])
+
+
+def index_invoice(conn, inv_num, values):
+    """Replace an invoice's index row; call inside the transaction that wrote the invoice"""
+    rowid = conn.execute("SELECT rowid FROM invoices WHERE invoice_number = ?", (inv_num,)).fetchone()[0]
+    _index_row(conn, rowid, 'invoice', inv_num, dict(values, invoice_number=inv_num))
+
+
+def index_voucher(conn, voucher_ref, values):
+    """Replace a voucher's index row; call inside the transaction that wrote the voucher"""
+    rowid = conn.execute("SELECT rowid FROM vouchers WHERE voucher_ref = ?", (voucher_ref,)).fetchone()[0]
+    _index_row(conn, -rowid, 'voucher', voucher_ref, values)
+
+
+def build_match_query(text):
+    """
+    Turn what staff type into an FTS5 query: every word must match, each as a
+    prefix, with FTS syntax characters treated as plain text.
+    """
+    terms = [term for term in re.split(r'\s+', text or '') if term.replace('"', '')]
+    return ' AND '.join('"' + term.replace('"', '') + '"*' for term in terms)
+
+
+def _stored_date(value):
+    # Vouchers give dates as YYYY/MM/DD; accept the YYYY-MM-DD a date input sends
+    return value.replace('-', '/') if value else None
+
+
+def search(text, date_from=None, date_to=None, limit=50, db_path=None):
+    """
+    Invoices and vouchers matching every word of text, best match first, optionally
+    limited to stays checking in between date_from and date_to.
+    """
+    match = build_match_query(text)
+    if not match:
+        return []
+    date_from, date_to = _stored_date(date_from), _stored_date(date_to)
+    weights = ', '.join(str(w) for w in SEARCH_WEIGHTS)
+    with connection(db_path) as conn:
+        rows = conn.execute(f"""
+            SELECT s.kind, s.key,
+                   COALESCE(i.voucher_number, v.voucher_number) AS voucher_number,
+                   COALESCE(i.passenger_names, v.passenger_names) AS guest,
+                   COALESCE(i.check_in, v.check_in) AS check_in,
+                   COALESCE(i.check_out, v.check_out) AS check_out,
+                   i.agency, i.invoice_total_cents, v.uploaded_at
+            FROM search_index s
+            LEFT JOIN invoices i ON s.kind = 'invoice' AND i.invoice_number = s.key
+            LEFT JOIN vouchers v ON s.kind = 'voucher' AND v.voucher_ref = s.key
+            WHERE search_index MATCH ?
+              AND (? IS NULL OR COALESCE(i.check_in, v.check_in) >= ?)
+              AND (? IS NULL OR COALESCE(i.check_in, v.check_in) <= ?)
+            ORDER BY bm25(search_index, {weights})
+            LIMIT ?""", (match, date_from, date_from, date_to, date_to, int(limit))).fetchall()
+    return [{
+        'kind': row['kind'],
+        'invoice_number': row['key'] if row['kind'] == 'invoice' else '',
+        'voucher_ref': row['key'] if row['kind'] == 'voucher' else '',
+        'voucher_number': row['voucher_number'] or '',
+        'guest': row['guest'] or '',
+        'check_in': row['check_in'] or '',
+        'check_out': row['check_out'] or '',
+        'agency': row['agency'] or '',
+        'invoice_total': row['invoice_total_cents'] / 100 if row['invoice_total_cents'] is not None else None,
+        'uploaded_at': row['uploaded_at'] or ''
+    } for row in rows]
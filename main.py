@@ -1,16 +1,57 @@
-from flask import Flask, request, render_template, send_file, redirect, url_for, send_from_directory, session
+from flask import Flask, request, render_template, send_file, redirect, url_for, send_from_directory, session, Response, stream_with_context, g
 import datetime
-import pdfkit
-from pathlib import Path
 from voucher_parser import parse_voucher_pdf
 from invoice_generator import (
     clean_pdf_text,
-    get_next_invoice_number,
     cleanup_old_files,
     extract_text_with_words
 )
+from invoice_renderer import (
+    build_invoice_data,
+    normalize_invoice_number,
+    parse_amount,
+    render_invoice_html,
+    render_invoices_combined_pdf,
+    archive_pdf_async,
+    split_combined_pdf,
+    probe_renderer,
+    renderer_status
+)
+from bulk_export import (
+    invoice_data_from_payload,
+    parse_bulk_request,
+    start_job,
+    get_job_progress,
+    skipped_report,
+    stream_invoice_zip
+)
+from payment_stamp import stamp_payment
+from invoice_payload import read_payload, payload_to_review_data
+from invoice_formats import render_invoice, RENDERERS
+from submission_pack import save_voucher, load_voucher, build_submission_pack
+from money import format_zar
+from invoice_numbers import (peek_invoice_number, allocate_invoice_number, record_invoice_number, get_allocator,
+                             format_invoice_number, parse_invoice_number, is_number_issued, invoice_number_from_url)
+from render_manager import configure as configure_render_limits, RenderTimeoutError
+from invoice_ledger import (
+    record_invoice, record_voucher, record_payment_total, get_invoice, find_invoices, search_ledger,
+    find_invoiced_voucher, voucher_key, revenue_report
+)
+from db import configure as configure_database
+from archive_store import configure as configure_archive, load as load_archived
+from draft_store import configure as configure_drafts, create_draft, load_draft, save_draft, delete_draft
+from idempotency import (configure as configure_idempotency, request_key, claim, complete, release,
+                         wait_for_result, load_result)
+from invoice_export import stream_invoices_csv
 import os
+import hashlib
+import io
 import re
+import secrets
+import sqlite3
+import time
+import uuid
+import zipfile
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -20,26 +61,53 @@ app.secret_key = 'ulendo_secret_key_2025'
 app.config['UPLOAD_DIR'] = 'uploads'
 app.config['OUTPUT_DIR'] = 'generated'
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+app.config['BULK_RENDER_WORKERS'] = int(os.getenv('BULK_RENDER_WORKERS', 4))
+# Generated invoices and uploaded vouchers are kept in a content-addressed archive
+# (deduplicated, compressed where it helps) so they can be downloaded again later
+app.config['ARCHIVE_DIR'] = os.path.abspath(os.getenv('ARCHIVE_DIR', os.path.join(app.root_path, 'archive')))
+app.config['ARCHIVE_GENERATED'] = os.getenv('ARCHIVE_GENERATED', '1') == '1'
+# Byte-stable PDFs: the same invoice data always renders to the same bytes
+app.config['DETERMINISTIC_PDF'] = os.getenv('DETERMINISTIC_PDF', '1') == '1'
+# Vouchers saved before the archive existed; still read when a voucher is not in the archive
+app.config['VOUCHER_DIR'] = os.path.join(app.config['UPLOAD_DIR'], 'vouchers')
+# invoices.db lives at an absolute path, so it no longer depends on the working directory
+default_db_path = os.path.join(app.root_path, 'invoices.db')
+if not os.path.exists(default_db_path) and os.path.exists('invoices.db'):
+    # Older setups created the database in whatever the working directory was; keep using it
+    default_db_path = 'invoices.db'
+app.config['INVOICE_DB_PATH'] = os.path.abspath(os.getenv('INVOICE_DB_PATH', default_db_path))
+# WAL lets readers work during writes; set DELETE where the filesystem has no shared memory
+app.config['INVOICE_DB_JOURNAL_MODE'] = os.getenv('INVOICE_DB_JOURNAL_MODE', 'WAL')
+configure_database(db_path=app.config['INVOICE_DB_PATH'], journal_mode=app.config['INVOICE_DB_JOURNAL_MODE'])
+# Invoice numbers are reserved per worker process in blocks of this size
+app.config['INVOICE_NUMBER_BLOCK'] = int(os.getenv('INVOICE_NUMBER_BLOCK', 10))
+get_allocator(block_size=app.config['INVOICE_NUMBER_BLOCK'])
+configure_archive(archive_dir=app.config['ARCHIVE_DIR'])
+# Review drafts live server-side; only their id is passed between pages
+app.config['DRAFT_TTL_HOURS'] = float(os.getenv('DRAFT_TTL_HOURS', 24))
+configure_drafts(ttl_seconds=app.config['DRAFT_TTL_HOURS'] * 3600)
+# A resubmitted review form (double-click, browser retry) within this window gets the first response back
+app.config['IDEMPOTENCY_WINDOW_MINUTES'] = float(os.getenv('IDEMPOTENCY_WINDOW_MINUTES', 60))
+configure_idempotency(window_seconds=app.config['IDEMPOTENCY_WINDOW_MINUTES'] * 60)
 # Ensure directories exist
 os.makedirs(app.config['OUTPUT_DIR'], exist_ok=True)
 os.makedirs(app.config['UPLOAD_DIR'], exist_ok=True)
 
-# Jinja filter to format ZAR currency with space thousand separators
-@app.template_filter('zar')
-def format_zar(value):
-    try:
-        amount = float(value)
-        formatted = f"{amount:,.2f}".replace(",", " ")
-        return f"R {formatted}"
-    except Exception:
-        try:
-            # Try to clean string inputs like 'R1234,56'
-            s = str(value).replace('R', '').replace(',', '').strip()
-            amount = float(s)
-            formatted = f"{amount:,.2f}".replace(",", " ")
-            return f"R {formatted}"
-        except Exception:
-            return f"R {value}"
+# Jinja filter to format ZAR currency with space thousand separators (cents-based, cached)
+app.add_template_filter(format_zar, 'zar')
+
+# Bound wkhtmltopdf memory: at most RENDER_CONCURRENCY processes at once (others queue
+# in arrival order), each killed after RENDER_TIMEOUT seconds
+app.config['RENDER_CONCURRENCY'] = int(os.getenv('RENDER_CONCURRENCY', 2))
+app.config['RENDER_TIMEOUT'] = int(os.getenv('RENDER_TIMEOUT', 60))
+app.config['RENDER_QUEUE_TIMEOUT'] = int(os.getenv('RENDER_QUEUE_TIMEOUT', 30))
+configure_render_limits(concurrency=app.config['RENDER_CONCURRENCY'], timeout=app.config['RENDER_TIMEOUT'],
+                        queue_timeout=app.config['RENDER_QUEUE_TIMEOUT'])
+
+# Probe the PDF renderer once at startup (falling back to reportlab without wkhtmltopdf)
+# and warm it up in the background so the first invoice is not slow
+app.config['RENDERER_WARMUP'] = os.getenv('RENDERER_WARMUP', '1') == '1'
+probe_renderer(app, warm_up=app.config['RENDERER_WARMUP'])
 
 # Application configuration moved to main execution block
 
@@ -49,6 +117,19 @@ def index():
         return redirect(url_for('login'))
     return render_template('index.html')
 
+@app.route('/health/renderer')
+def renderer_health():
+    """Renderer readiness for load balancers and monitoring (no login required)"""
+    status = renderer_status()
+    return status, 200 if status['ready'] else 503
+
+@app.errorhandler(RenderTimeoutError)
+def render_timeout(e):
+    """wkhtmltopdf is saturated or hung: ask the client to come back rather than render differently"""
+    print(f"DEBUG: Render timed out: {e}")
+    return ('The invoice renderer is busy; please try again shortly', 503,
+            {'Retry-After': str(app.config['RENDER_QUEUE_TIMEOUT'])})
+
 @app.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
@@ -75,9 +156,23 @@ def upload_voucher():
     file = request.files['voucher_pdf']
     if not file:
         return "No file uploaded", 400
+    voucher_bytes = file.read()
+    try:
+        voucher_ref = save_voucher(voucher_bytes)
+    except (OSError, sqlite3.Error) as e:
+        # Without an archived copy the voucher can still be invoiced, just not attached later
+        print(f"DEBUG: Could not archive the uploaded voucher: {e}")
+        voucher_ref = hashlib.sha256(voucher_bytes).hexdigest()
     save_path = os.path.join(app.config['UPLOAD_DIR'], file.filename)
-    file.save(save_path)
+    with open(save_path, 'wb') as f:
+        f.write(voucher_bytes)
     data = parse_voucher_pdf(save_path)
+    if data is not None:
+        data['voucher_ref'] = voucher_ref
+        try:
+            record_voucher(data, voucher_ref)
+        except sqlite3.Error as e:
+            print(f"DEBUG: Could not record voucher {voucher_ref} for search: {e}")
     
     # Clean up the uploaded voucher immediately
     cleanup_old_files(app.config['UPLOAD_DIR'], days_old=0)
@@ -99,9 +194,7 @@ def upload_voucher():
         print("No data returned from parser")
     print("=== END DEBUG ===")
     
-    # Provide an auto-generated, editable invoice number to review form
-    auto_inv = get_next_invoice_number()
-    return render_template('review.html', data=data, auto_invoice_number=auto_inv)
+    return redirect(url_for('review', draft=create_draft(data or {})))
 
 @app.route('/review')
 def review():
@@ -109,57 +202,28 @@ def review():
         return redirect(url_for('login'))
     """Review and edit parsed voucher data before generating invoice"""
     
-    data = {}
-    # Try to retrieve data from session first (for edit-invoice flow)
-    if 'invoice_data_for_review' in session:
-        # Change from pop() to get() to ensure data persists for potential multiple GET requests to /review
-        data = session.get('invoice_data_for_review') 
-        print(f"DEBUG: Retrieved invoice_data from session for review: {data.get('invoice_number_from_pdf', 'N/A')}")
-    else:
-        # Otherwise, extract data from query parameters (for upload-voucher or manual-entry flow)
-        print("DEBUG: No invoice_data in session, retrieving from query parameters.")
-        for key in ['voucher_number', 'passenger_names', 'check_in', 'check_out', 
-                    'length_of_stay', 'description', 'rate_incl', 'max_total', 'invoice_total',
-                    'total_payment_received', 'transport_rate', 'transport_total', 'transport_description',
-                    'ancillary_charges', 'ancillary_description', 'has_transport', 'has_ancillary_services']:
-            data[key] = request.args.get(key, '')
-        
-        # Reconstruct additional service line items if passed as indexed query params (from manual entry)
-        manual_entry_line_items = []
-        idx = 0
-        while request.args.get(f'description_{idx}'):
-            manual_entry_line_items.append({
-                'description': request.args.get(f'description_{idx}', ''),
-                'qty': int(request.args.get(f'qty_{idx}', 0)),
-                'unit_price': float(request.args.get(f'unit_price_{idx}', 0)),
-                'total': float(request.args.get(f'total_{idx}', 0))
-            })
-        idx += 1
-        if manual_entry_line_items:
-            data['line_items'] = manual_entry_line_items
-
-        # Handle other indexed additional services from query params
-        for i in range(5):
-            desc = request.args.get(f'additional_service_desc_{i}', '')
-            if desc:
-                data[f'additional_service_desc_{i}'] = desc
-                data[f'additional_service_qty_{i}'] = request.args.get(f'additional_service_qty_{i}', '')
-                data[f'additional_service_rate_{i}'] = request.args.get(f'additional_service_rate_{i}', '')
-                data[f'additional_service_total_{i}'] = request.args.get(f'additional_service_total_{i}', '')
-
-    # The auto_invoice_number will always come from query parameters (either newly generated or extracted from PDF)
+    # Upload, manual entry and edit all store their data as a draft and pass its id
+    draft_id = request.args.get('draft', '')
+    data = load_draft(draft_id)
+    if data is None:
+        return 'This draft was not found or has expired; please upload the voucher or enter the invoice again', 404
+    print(f"DEBUG: Retrieved draft {draft_id} for review: {data.get('invoice_number_from_pdf', 'N/A')}")
+
+    # An auto_invoice_number in the query string still wins over the draft's invoice_number_from_pdf
     auto_inv_from_args = request.args.get('auto_invoice_number')
     # #region agent log
     with open(r'c:\Users\computer\Desktop\ULendo-Lodge-Invoice-Software-main\.cursor\debug.log', 'a', encoding='utf-8') as f:
         import json
         f.write(json.dumps({"location":"main.py:150","message":"review - auto_invoice_number from args","data":{"auto_inv_from_args":auto_inv_from_args},"timestamp":int(__import__('time').time()*1000),"sessionId":"debug-session","runId":"run1","hypothesisId":"B"})+"\n")
     # #endregion
-    auto_inv = auto_inv_from_args if auto_inv_from_args else get_next_invoice_number()
+    peeked_inv = None if auto_inv_from_args else peek_invoice_number()
+    auto_inv = auto_inv_from_args if auto_inv_from_args else peeked_inv
 
     # If the retrieved data already has an invoice_number, prioritize it over auto_inv if auto_inv is a newly generated one.
     # This ensures that when editing, the original invoice number from the PDF is retained.
     if data.get('invoice_number_from_pdf') and not request.args.get('auto_invoice_number'):
         auto_inv = data['invoice_number_from_pdf']
+        peeked_inv = None
 
     # #region agent log
     with open(r'c:\Users\computer\Desktop\ULendo-Lodge-Invoice-Software-main\.cursor\debug.log', 'a', encoding='utf-8') as f:
@@ -177,7 +241,36 @@ def review():
     print(f"DEBUG: Final data sent to template in review route: {data}")
     print(f"DEBUG: Auto-invoice number sent to template: {auto_inv}")
 
-    return render_template('review.html', data=data, auto_invoice_number=auto_inv)
+    duplicate_invoice = find_duplicate_voucher(data, current_invoice=auto_inv)
+    return render_template('review.html', data=data, auto_invoice_number=auto_inv, peeked_invoice_number=peeked_inv,
+                           duplicate_invoice=duplicate_invoice, draft_id=draft_id,
+                           idempotency_key=secrets.token_urlsafe(16))
+
+@app.route('/drafts/<draft_id>', methods=['POST'])
+def autosave_draft(draft_id):
+    """Autosave from the review page: store the form as it is now and keep the draft alive"""
+    if 'logged_in' not in session:
+        return redirect(url_for('login'))
+    data = load_draft(draft_id)
+    if data is None:
+        return 'Draft not found or expired', 404
+    data.update(review_form_to_draft(request.form))
+    if not save_draft(draft_id, data):
+        return 'Draft not found or expired', 404
+    return {'draft_id': draft_id, 'saved_at': datetime.datetime.now().isoformat(timespec='seconds')}
+
+def review_form_to_draft(form):
+    """The review form's fields in the shape the review page renders a draft from"""
+    values = build_invoice_data(form)
+    values.pop('customer_name', None)
+    if 'invoice_date' not in form:
+        values.pop('invoice_date', None)
+    values['invoice_total'] = sum(item['total'] for item in values['line_items'])
+    # A number still showing the peeked preview is not kept, or a later visit would
+    # treat a stale preview as a number typed on purpose
+    invoice_number = (form.get('invoice_number') or '').strip()
+    values['invoice_number'] = invoice_number if invoice_number != (form.get('auto_invoice_number') or '').strip() else ''
+    return values
 
 @app.route('/debug-parser')
 def debug_parser():
@@ -315,16 +408,20 @@ def manual_entry():
         
         data['line_items'] = line_items
         data['invoice_total'] = invoice_total
+        # The number the form displayed was only a preview; review peeks a fresh one, so a
+        # number allocated by someone else meanwhile is never carried over as typed
+        if (data.get('invoice_number') or '').strip() == (data.pop('auto_invoice_number', '') or '').strip():
+            data['invoice_number'] = ''
         # #region agent log
         with open(r'c:\Users\computer\Desktop\ULendo-Lodge-Invoice-Software-main\.cursor\debug.log', 'a', encoding='utf-8') as f:
             import json
             f.write(json.dumps({"location":"main.py:301","message":"manual_entry POST - invoice_number from form","data":{"invoice_number":data.get('invoice_number')},"timestamp":int(__import__('time').time()*1000),"sessionId":"debug-session","runId":"run1","hypothesisId":"A"})+"\n")
         # #endregion
-        return redirect(url_for('review', **data))
+        return redirect(url_for('review', draft=create_draft(data)))
     
     # Supply an auto-generated invoice number for manual entry form too
     # #region agent log
-    next_inv_raw = get_next_invoice_number()  # Already returns INV-XXXXXX
+    next_inv_raw = peek_invoice_number()  # Display only; allocated when the invoice is generated
     auto_inv = next_inv_raw
     with open(r'c:\Users\computer\Desktop\ULendo-Lodge-Invoice-Software-main\.cursor\debug.log', 'a', encoding='utf-8') as f:
         import json
@@ -339,52 +436,22 @@ def generate_invoice():
         return redirect(url_for('login'))
     data = {k: request.form[k] for k in request.form}
     
-    invoice_data = {
-        'check_in': data.get('check_in', ''),
-        'check_out': data.get('check_out', ''),
-        'length_of_stay': data.get('length_of_stay', ''),
-        'voucher_number': data.get('voucher_number', ''),
-        'passenger_names': data.get('passenger_names', ''),
-        'customer_name': data.get('passenger_names', ''), # Use passenger names as customer name
-        'total_payment_received': data.get('total_payment_received', '0.00'),
-        'line_items': []
-    }
-
-    # Calculate invoice total based on dynamically submitted line items
-    invoice_total = 0.0
-    for i in range(len(data.keys())): # Iterate through potential line item indices
-        desc_key = f'description_{i}'
-        qty_key = f'qty_{i}'
-        unit_price_key = f'unit_price_{i}'
-        total_key = f'total_{i}'
-
-        if data.get(desc_key) and data.get(qty_key) and data.get(unit_price_key) and data.get(total_key):
-            try:
-                description = data.get(desc_key)
-                qty = int(data.get(qty_key))
-                unit_price = float(data.get(unit_price_key))
-                total = float(data.get(total_key))
-
-                if description and qty >= 0 and unit_price >= 0 and total >= 0:
-                    invoice_data['line_items'].append({
-                        'description': description,
-                        'qty': qty,
-                        'unit_price': unit_price,
-                        'total': total
-                    })
-                invoice_total += total
-            except (ValueError, TypeError):
-                # Handle cases where conversion to int/float fails
-                pass
-        else:
-            # If a description is missing, assume no more line items for this index and break
-            if desc_key in data or qty_key in data or unit_price_key in data or total_key in data:
-                # If any part of a line item exists but not all, it's an incomplete entry, skip it
-                pass
-            else:
-                break # Stop if we encounter a missing description, assuming no more line items
+    invoice_data = build_invoice_data(data)
+
+    # pdf (default), html, csv or json; the text formats never start a PDF engine
+    output_format = (request.values.get('format') or 'pdf').lower()
+    if output_format not in RENDERERS:
+        return f"Unsupported format '{output_format}'. Choose one of: {', '.join(sorted(RENDERERS))}", 400
 
-    invoice_data['invoice_total'] = invoice_total
+    # A repeat of a submission that was already handled gets the same response back,
+    # before anything is allocated or rendered
+    req_key = request_key(data.get('idempotency_key'), data)
+    if req_key:
+        previous = claim(req_key)
+        if previous:
+            return replay_generated_invoice(req_key, previous)
+        # Released in teardown if this request fails before recording its result
+        g.idempotency_claim = req_key
 
     # Determine invoice number: use edited value if provided, else auto-generate
     # Ensure INV- prefix is always present
@@ -393,75 +460,349 @@ def generate_invoice():
         import json
         f.write(json.dumps({"location":"main.py:413","message":"generate_invoice - invoice_number from form","data":{"invoice_number":data.get('invoice_number')},"timestamp":int(__import__('time').time()*1000),"sessionId":"debug-session","runId":"run1","hypothesisId":"C"})+"\n")
     # #endregion
-    if data.get('invoice_number'):
+    # A number left exactly as the form displayed it was only a preview of the next
+    # number, so allocate the real one now; anything else was typed or kept on purpose.
+    # Every format is a deliverable (email body, portal upload), so each one issues the
+    # invoice; a draft that already issued one, e.g. CSV then PDF, keeps its number
+    draft = load_draft(data.get('draft_id')) if data.get('draft_id') else None
+    draft_inv = (draft or {}).get('invoice_number_from_pdf') or ''
+    editing_inv = data.get('editing_invoice_number') or draft_inv
+    peeked_inv = (data.get('auto_invoice_number') or '').strip()
+    if data.get('invoice_number') and data.get('invoice_number').strip() != peeked_inv:
         raw_inv = data.get('invoice_number').strip()
         # #region agent log
         with open(r'c:\Users\computer\Desktop\ULendo-Lodge-Invoice-Software-main\.cursor\debug.log', 'a', encoding='utf-8') as f:
             import json
             f.write(json.dumps({"location":"main.py:415","message":"generate_invoice - before prefix check","data":{"raw_inv":raw_inv,"starts_with_inv":raw_inv.startswith('INV-')},"timestamp":int(__import__('time').time()*1000),"sessionId":"debug-session","runId":"run1","hypothesisId":"C"})+"\n")
         # #endregion
-        inv_num = raw_inv if raw_inv.startswith('INV-') else f"INV-{raw_inv}"
+        inv_num = normalize_invoice_number(raw_inv)
         # #region agent log
         with open(r'c:\Users\computer\Desktop\ULendo-Lodge-Invoice-Software-main\.cursor\debug.log', 'a', encoding='utf-8') as f:
             import json
             f.write(json.dumps({"location":"main.py:415","message":"generate_invoice - after prefix check","data":{"inv_num":inv_num},"timestamp":int(__import__('time').time()*1000),"sessionId":"debug-session","runId":"run1","hypothesisId":"C"})+"\n")
         # #endregion
+        if typed_number_taken(inv_num, editing_inv):
+            return (f"Invoice number {inv_num} has already been issued. Leave the number as shown to use the "
+                    f"next free one, or open {inv_num} with Edit Invoice to generate it again"), 409
+        record_typed_invoice_number(inv_num)
+    elif draft_inv:
+        inv_num = normalize_invoice_number(draft_inv)
     else:
-        inv_num = get_next_invoice_number()  # Already returns INV-XXXXXX format
+        inv_num = allocate_invoice_number()  # Already returns INV-XXXXXX format
     
     # Add the determined invoice number to invoice_data for use in send_file
     invoice_data['invoice_number'] = inv_num
 
-    # Always use HTML-to-PDF (wkhtmltopdf via pdfkit)
-    today_str = datetime.datetime.now().strftime('%d %B %Y')
-
-    # Recompute payments and outstanding directly from invoice_total to ensure consistency
-    computed_total = sum(float(item.get('total', 0)) for item in invoice_data['line_items'])
-    invoice_data['invoice_total'] = computed_total
-
-    payment_received = float(str(invoice_data.get('total_payment_received') or 0).replace('R', '').replace(',', '').strip())
-    outstanding = max(0.0, float(computed_total) - payment_received)
-
-    # Build absolute file URL for the logo (file:// URI) so wkhtmltopdf can load it
-    logo_path = Path(os.getcwd()) / 'assets' / 'logo.png'
-    logo_file_url = logo_path.resolve().as_uri()
-
-    # Render the HTML template
-    rendered_html = render_template(
-        'invoice.html',
-        data=invoice_data,
-        invoice_number=inv_num,
-        today=today_str,
-        logo_file_url=logo_file_url, # Changed from logo_url to logo_file_path
-        payment_received=payment_received,
-        outstanding=outstanding
-    )
-
-    # Define PDF options for wkhtmltopdf (to ensure single page and other settings)
-    options = {
-        'page-size': 'A4',
-        'margin-top': '0mm',
-        'margin-right': '0mm',
-        'margin-bottom': '0mm',
-        'margin-left': '0mm',
-        'encoding': "UTF-8",
-        'enable-local-file-access': None # Add this option
-    }
-    
-    # Create the PDF file path
-    pdf_filename = f"Invoice_{inv_num}.pdf"
-    pdf_path = os.path.join(app.config['OUTPUT_DIR'], pdf_filename)
+    # Render straight into memory; nothing touches the output directory on the request path
+    content, mimetype, filename = render_invoice(invoice_data, inv_num, output_format)
 
-    # Convert HTML to PDF using pdfkit
-    pdfkit.from_string(rendered_html, pdf_path, options=options)
-    
-    # Clean up generated invoices immediately
-    cleanup_old_files(app.config['OUTPUT_DIR'], days_old=0)
-    
-    # Clear the invoice data from the session after use
-    session.pop('invoice_data_for_review', None)
+    # The ledger is the structured record of the invoice; a failed write must not lose the download
+    try:
+        record_invoice(invoice_data, inv_num)
+    except (sqlite3.Error, ValueError) as e:
+        print(f"DEBUG: Could not record {inv_num} in the ledger: {e}")
+
+    if output_format == 'pdf':
+        if app.config['ARCHIVE_GENERATED']:
+            archive_pdf_async(inv_num, filename, content)
+        # The draft has become an invoice
+        delete_draft(data.get('draft_id'))
+    elif draft is not None and draft_inv != inv_num:
+        # The PDF is usually still to come; the draft stays open and remembers its number
+        draft['invoice_number_from_pdf'] = inv_num
+        save_draft(data['draft_id'], draft)
+
+    if req_key:
+        try:
+            complete(req_key, inv_num, content, mimetype, filename)
+        except (OSError, sqlite3.Error) as e:
+            print(f"DEBUG: Could not record the response for {inv_num}; a repeat will generate again: {e}")
+
+    # A content hash is only a useful ETag when rendering is deterministic
+    deterministic = output_format != 'pdf' or app.config['DETERMINISTIC_PDF']
+    etag = hashlib.sha256(content).hexdigest() if deterministic else False
+    return send_file(io.BytesIO(content), mimetype=mimetype, as_attachment=True,
+                     download_name=filename, etag=etag)
 
-    return send_file(pdf_path, as_attachment=True, download_name=pdf_filename)
+def typed_number_taken(inv_num, editing_inv=None):
+    """
+    Whether a typed number already belongs to another invoice. Only the invoice being
+    edited (the number its draft was opened with) may be generated again under it.
+    """
+    number = parse_invoice_number(inv_num)
+    if number is not None and number == parse_invoice_number(editing_inv):
+        return False
+    try:
+        if is_number_issued(inv_num):
+            return True
+        return bool(get_invoice(inv_num) or (number is not None and get_invoice(format_invoice_number(number))))
+    except sqlite3.Error as e:
+        print(f"DEBUG: Could not check whether {inv_num} was issued: {e}")
+        return False
+
+def record_typed_invoice_number(inv_num):
+    """Keep a typed number out of the allocator's reach; re-generating an invoice keeps its number"""
+    try:
+        record_invoice_number(inv_num)
+    except sqlite3.Error as e:
+        print(f"DEBUG: Could not record typed invoice number {inv_num}: {e}")
+
+def replay_generated_invoice(req_key, previous):
+    """Answer a repeated generate request with the response the first one produced"""
+    if previous['state'] == 'pending':
+        # The first submission is still rendering; wait for it rather than render twice
+        previous = wait_for_result(req_key)
+        if previous is None:
+            return 'This invoice is still being generated (or failed); please try again in a moment', 409
+    result = load_result(previous)
+    if result is None:
+        return f"Invoice {previous['invoice_number']} was generated, but its file is no longer available", 410
+    content, mimetype, filename = result
+    print(f"DEBUG: Replaying {previous['invoice_number']} for a repeated submission")
+    response = send_file(io.BytesIO(content), mimetype=mimetype, as_attachment=True,
+                         download_name=filename, etag=previous['sha256'])
+    response.headers['X-Idempotent-Replay'] = previous['invoice_number']
+    return response
+
+@app.teardown_request
+def release_idempotency_claim(exc):
+    """Free the key of a generate request that ended without recording a result"""
+    req_key = g.pop('idempotency_claim', None)
+    if req_key:
+        release(req_key)
+
+@app.route('/preview-invoice', methods=['POST'])
+def preview_invoice():
+    """Show the final invoice as HTML from the review form, without rendering a PDF"""
+    if 'logged_in' not in session:
+        return redirect(url_for('login'))
+    data = {k: request.form[k] for k in request.form}
+    invoice_data = build_invoice_data(data)
+
+    # Never allocate an invoice number just to preview
+    raw_inv = (data.get('invoice_number') or '').strip()
+    inv_num = normalize_invoice_number(raw_inv) if raw_inv else 'PREVIEW'
+    invoice_data['invoice_number'] = inv_num
+
+    return render_invoice_html(invoice_data, inv_num,
+                               logo_url=url_for('static', filename='logo.png'))
+
+def find_duplicate_voucher(data, current_invoice=None):
+    """The invoice that already billed this voucher, if any (never the invoice being edited)"""
+    try:
+        return find_invoiced_voucher(voucher_number=data.get('voucher_number'), voucher_ref=data.get('voucher_ref'),
+                                     exclude_invoice=current_invoice)
+    except sqlite3.Error as e:
+        print(f"DEBUG: Could not check for duplicate vouchers: {e}")
+        return None
+
+def build_bulk_jobs(payloads):
+    """
+    Turn bulk payloads into (invoice_data, invoice_number) render jobs. Vouchers already
+    invoiced, or repeated within the batch, are skipped before a number is allocated;
+    returns (jobs, skipped) with skipped as (voucher, invoice) pairs. Jobs are recorded
+    in the ledger with record_bulk_invoice once their PDF has rendered.
+    """
+    jobs, skipped, seen = [], [], {}
+    for payload in payloads:
+        invoice_data = invoice_data_from_payload(payload)
+        requested = normalize_invoice_number(str(payload['invoice_number'])) if payload.get('invoice_number') else None
+        key = voucher_key(invoice_data.get('voucher_number'))
+        existing = seen.get(key) if key else None
+        if not existing:
+            # Re-sending an invoice under its own number is a re-render, not a duplicate
+            existing = find_invoiced_voucher(voucher_number=key, voucher_ref=invoice_data.get('voucher_ref'),
+                                             exclude_invoice=requested)
+        if existing:
+            skipped.append((invoice_data.get('voucher_number'), existing))
+            continue
+        if requested:
+            record_typed_invoice_number(requested)
+        inv_num = requested or allocate_invoice_number()
+        invoice_data['invoice_number'] = inv_num
+        if key:
+            seen[key] = inv_num
+        jobs.append((invoice_data, inv_num))
+    if skipped:
+        print(f"DEBUG: Bulk run skipped {len(skipped)} already invoiced voucher(s)")
+    return jobs, skipped
+
+def record_bulk_invoice(invoice_data, inv_num):
+    """Record a bulk-rendered invoice, claiming its voucher, now that its PDF exists"""
+    try:
+        record_invoice(invoice_data, inv_num)
+    except (sqlite3.Error, ValueError) as e:
+        print(f"DEBUG: Could not record {inv_num} in the ledger: {e}")
+
+@app.route('/bulk-export', methods=['POST'])
+def bulk_export():
+    """Render many invoices in parallel and stream them back as a ZIP"""
+    if 'logged_in' not in session:
+        return redirect(url_for('login'))
+    try:
+        payloads = parse_bulk_request(request)
+    except (ValueError, UnicodeDecodeError) as e:
+        return f'Could not read invoice list: {str(e)}', 400
+    if not payloads:
+        return 'No invoices supplied', 400
+
+    jobs, skipped = build_bulk_jobs(payloads)
+
+    # Clients may pick their own job id so they can poll progress while the ZIP downloads
+    job_id = request.args.get('job_id') or uuid.uuid4().hex
+    start_job(job_id, len(jobs), skipped=len(skipped))
+
+    stream = stream_invoice_zip(app, jobs, job_id, max_workers=app.config['BULK_RENDER_WORKERS'], skipped=skipped,
+                                on_rendered=record_bulk_invoice)
+    response = Response(stream_with_context(stream), mimetype='application/zip')
+    response.headers['Content-Disposition'] = f'attachment; filename=Invoices_{job_id[:8]}.zip'
+    response.headers['X-Bulk-Job-Id'] = job_id
+    response.headers['X-Skipped-Duplicates'] = str(len(skipped))
+    return response
+
+@app.route('/bulk-export/<job_id>/progress')
+def bulk_export_progress(job_id):
+    if 'logged_in' not in session:
+        return redirect(url_for('login'))
+    progress = get_job_progress(job_id)
+    if not progress:
+        return {'status': 'error', 'message': 'Unknown job'}, 404
+    return progress
+
+@app.route('/generate-batch', methods=['POST'])
+def generate_batch():
+    """Render many invoices in one wkhtmltopdf run, as one document or split per invoice"""
+    if 'logged_in' not in session:
+        return redirect(url_for('login'))
+    try:
+        payloads = parse_bulk_request(request)
+    except (ValueError, UnicodeDecodeError) as e:
+        return f'Could not read invoice list: {str(e)}', 400
+    if not payloads:
+        return 'No invoices supplied', 400
+
+    jobs, skipped = build_bulk_jobs(payloads)
+    if not jobs:
+        return 'Every voucher in this batch was already invoiced:\n' + skipped_report(skipped), 409
+    pdf_bytes = render_invoices_combined_pdf(jobs)
+    # One run renders every invoice, so they are recorded only once it has succeeded
+    for invoice_data, inv_num in jobs:
+        record_bulk_invoice(invoice_data, inv_num)
+
+    mode = request.args.get('mode') or request.form.get('mode', 'combined')
+    if mode != 'split':
+        response = send_file(io.BytesIO(pdf_bytes), mimetype='application/pdf', as_attachment=True,
+                             download_name='Invoices_combined.pdf')
+        response.headers['X-Skipped-Duplicates'] = str(len(skipped))
+        return response
+
+    try:
+        parts = split_combined_pdf(pdf_bytes, jobs)
+    except ValueError as e:
+        return f'Error splitting combined invoices: {str(e)}', 500
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_STORED) as zf:
+        for inv_num, part in parts:
+            zf.writestr(f"Invoice_{inv_num}.pdf", part)
+        if skipped:
+            zf.writestr("skipped_duplicates.txt", skipped_report(skipped))
+    buffer.seek(0)
+    return send_file(buffer, mimetype='application/zip', as_attachment=True, download_name='Invoices.zip')
+
+@app.route('/stamp-payment', methods=['GET', 'POST'])
+def stamp_payment_route():
+    """Overlay updated payment figures and a PAID / PART-PAID stamp onto existing invoices"""
+    if 'logged_in' not in session:
+        return redirect(url_for('login'))
+    if request.method == 'GET':
+        return render_template('stamp_payment.html')
+
+    files = [f for f in request.files.getlist('invoice_pdf') if f and f.filename]
+    totals = request.form.getlist('invoice_total')
+    payments = request.form.getlist('payment_received')
+    if not files:
+        return 'No file uploaded', 400
+    if len(payments) < len(files):
+        return 'Each invoice needs a payment received amount', 400
+    totals += [''] * (len(files) - len(totals))
+
+    stamped = []
+    for file, total, payment in zip(files, totals, payments):
+        if not file.filename.lower().endswith('.pdf'):
+            return f'{file.filename} is not a PDF', 400
+        try:
+            # A blank total means "use the total stored in the invoice itself"
+            invoice_total = parse_amount(total) if total.strip() else None
+            pdf_bytes = file.read()
+            stamped.append((file.filename, stamp_payment(pdf_bytes, invoice_total, parse_amount(payment))))
+        except ValueError as e:
+            return f'Error stamping {file.filename}: {str(e)}', 400
+        except Exception as e:
+            return f'Error stamping {file.filename}: {str(e)}', 500
+        # Invoices we generated name themselves; keep their ledger payments in step
+        embedded = read_payload(pdf_bytes)
+        if embedded and embedded.get('invoice_number'):
+            try:
+                record_payment_total(embedded['invoice_number'], parse_amount(payment))
+            except sqlite3.Error as e:
+                print(f"DEBUG: Could not record payment for {embedded['invoice_number']}: {e}")
+
+    if len(stamped) == 1:
+        filename, pdf_bytes = stamped[0]
+        return send_file(io.BytesIO(pdf_bytes), mimetype='application/pdf', as_attachment=True,
+                         download_name=filename)
+
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_STORED) as zf:
+        for filename, pdf_bytes in stamped:
+            zf.writestr(filename, pdf_bytes)
+    buffer.seek(0)
+    return send_file(buffer, mimetype='application/zip', as_attachment=True,
+                     download_name='Stamped_Invoices.zip')
+
+@app.route('/submission-pack', methods=['GET', 'POST'])
+def submission_pack():
+    """Merge generated invoices with their original vouchers into agency submission packs"""
+    if 'logged_in' not in session:
+        return redirect(url_for('login'))
+    if request.method == 'GET':
+        return render_template('submission_pack.html')
+
+    files = [f for f in request.files.getlist('invoice_pdf') if f and f.filename]
+    vouchers = request.files.getlist('voucher_pdf')
+    if not files:
+        return 'No file uploaded', 400
+    voucher_first = request.form.get('order') == 'voucher-first'
+
+    packs = []
+    for idx, file in enumerate(files):
+        if not file.filename.lower().endswith('.pdf'):
+            return f'{file.filename} is not a PDF', 400
+        # A voucher uploaded next to the invoice wins; otherwise use the one kept at upload
+        voucher = vouchers[idx] if idx < len(vouchers) else None
+        voucher_pdf = voucher.read() if voucher and voucher.filename else None
+        try:
+            pack = build_submission_pack(app.config['VOUCHER_DIR'], file.read(), voucher_pdf=voucher_pdf,
+                                         voucher_ref=request.form.get('voucher_ref') if len(files) == 1 else None,
+                                         voucher_first=voucher_first)
+        except ValueError as e:
+            return f'Error building pack for {file.filename}: {str(e)}', 400
+        except Exception as e:
+            return f'Error building pack for {file.filename}: {str(e)}', 500
+        packs.append((f"Pack_{os.path.basename(file.filename)}", pack))
+
+    if len(packs) == 1:
+        filename, pdf_bytes = packs[0]
+        return send_file(io.BytesIO(pdf_bytes), mimetype='application/pdf', as_attachment=True,
+                         download_name=filename)
+
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_STORED) as zf:
+        for filename, pdf_bytes in packs:
+            zf.writestr(filename, pdf_bytes)
+    buffer.seek(0)
+    return send_file(buffer, mimetype='application/zip', as_attachment=True,
+                     download_name='Submission_Packs.zip')
 
 @app.route('/edit-invoice', methods=['GET', 'POST'])
 def edit_invoice():
@@ -481,19 +822,20 @@ def edit_invoice():
             file.save(temp_path)
             
             try:
-                # Parse the existing invoice PDF to extract data
-                invoice_data = parse_existing_invoice(temp_path)
+                # Invoices we generated carry their own data; only scrape the text of legacy PDFs
+                embedded = read_payload(temp_path)
+                if embedded:
+                    invoice_data = payload_to_review_data(embedded)
+                else:
+                    invoice_data = parse_existing_invoice(temp_path)
                 
-                # Store the entire invoice_data in session for the review page
-                session['invoice_data_for_review'] = invoice_data
+                draft_id = create_draft(invoice_data)
                 
                 # Clean up temp file
                 os.remove(temp_path)
                 
-                # Redirect to review page. Only pass auto_invoice_number as query param
-                # The rest of the data will be retrieved from the session on the review page.
-                auto_inv_num_param = invoice_data.get('invoice_number_from_pdf', '')
-                return redirect(url_for('review', auto_invoice_number=auto_inv_num_param))
+                # The review page keeps the invoice number from the draft's invoice_number_from_pdf
+                return redirect(url_for('review', draft=draft_id))
                 
             except Exception as e:
                 # Clean up temp file on error
@@ -501,9 +843,119 @@ def edit_invoice():
                     os.remove(temp_path)
                 return f'Error parsing invoice: {str(e)}', 500
     
+    # Look an invoice up by number in the ledger instead of uploading its PDF
+    lookup = (request.args.get('invoice_number') or '').strip()
+    if lookup:
+        invoice = get_invoice(invoice_number_from_url(lookup))
+        if not invoice:
+            return render_template('edit_invoice.html', lookup_error=f'Invoice {lookup} was not found', lookup=lookup), 404
+        return redirect(url_for('review', draft=create_draft(payload_to_review_data(invoice))))
+
     # GET request - show upload form
     return render_template('edit_invoice.html')
 
+@app.route('/invoices')
+def list_invoices():
+    """Find ledger invoices by voucher number, guest name prefix or stay dates"""
+    if 'logged_in' not in session:
+        return redirect(url_for('login'))
+    args = request.args
+    try:
+        limit = min(int(args.get('limit', 100)), 1000)
+    except ValueError:
+        return 'limit must be a number', 400
+    return {'invoices': find_invoices(voucher_number=args.get('voucher_number'), guest=args.get('guest'),
+                                      check_in_from=args.get('check_in_from'), check_in_to=args.get('check_in_to'),
+                                      check_out_from=args.get('check_out_from'), check_out_to=args.get('check_out_to'),
+                                      limit=limit)}
+
+@app.route('/reports/revenue')
+def revenue_report_route():
+    """
+    Revenue, room nights and laundry/transport extras per month (or ?period=day), read
+    from the rollup tables. Filter with ?from=2025-01&to=2025-12 and ?agency=..., or
+    ?by_agency=1 for one row per agency and period.
+    """
+    if 'logged_in' not in session:
+        return redirect(url_for('login'))
+    args = request.args
+    try:
+        rows = revenue_report(period_type=args.get('period', 'month'), start=args.get('from'), end=args.get('to'),
+                              agency=args.get('agency'), by_agency=args.get('by_agency') == '1')
+    except ValueError as e:
+        return str(e), 400
+    return {'period': args.get('period', 'month'), 'rows': rows}
+
+@app.route('/export/invoices.csv')
+def export_invoices_csv():
+    """
+    Stream invoices dated ?from=..&to=.. (YYYY-MM-DD, inclusive) as CSV for accounting;
+    ?preset=summary (default), line_items, xero or quickbooks
+    """
+    if 'logged_in' not in session:
+        return redirect(url_for('login'))
+    start, end = request.args.get('from') or None, request.args.get('to') or None
+    try:
+        for value in (start, end):
+            if value:
+                datetime.date.fromisoformat(value)
+        preset = request.args.get('preset', 'summary')
+        chunks = stream_invoices_csv(preset, start=start, end=end)
+    except ValueError as e:
+        return f'Invalid export request: {str(e)}', 400
+    filename = f"Invoices_{preset}_{start or 'start'}_{end or 'today'}.csv"
+    return Response(chunks, mimetype='text/csv; charset=utf-8',
+                    headers={'Content-Disposition': f'attachment; filename={filename}'})
+
+@app.route('/search')
+def search_page():
+    """Full-text search over ledger invoices and uploaded vouchers (?format=json for the results alone)"""
+    if 'logged_in' not in session:
+        return redirect(url_for('login'))
+    query = (request.args.get('q') or '').strip()
+    date_from = request.args.get('date_from') or ''
+    date_to = request.args.get('date_to') or ''
+    started = time.perf_counter()
+    results = search_ledger(query, date_from=date_from, date_to=date_to) if query else []
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    if request.args.get('format') == 'json':
+        return {'query': query, 'results': results, 'elapsed_ms': round(elapsed_ms, 2)}
+    return render_template('search.html', query=query, date_from=date_from, date_to=date_to,
+                           results=results, elapsed_ms=elapsed_ms)
+
+@app.route('/vouchers/<voucher_ref>')
+def voucher_file(voucher_ref):
+    """An uploaded voucher PDF, as it was uploaded"""
+    if 'logged_in' not in session:
+        return redirect(url_for('login'))
+    voucher = load_voucher(app.config['VOUCHER_DIR'], voucher_ref)
+    if voucher is None:
+        return 'Voucher not found', 404
+    return send_file(io.BytesIO(voucher), mimetype='application/pdf', download_name=f'Voucher_{voucher_ref[:12]}.pdf')
+
+@app.route('/invoices/<invoice_number>/pdf')
+def invoice_pdf(invoice_number):
+    """The archived PDF of an invoice, exactly as it was last downloaded"""
+    if 'logged_in' not in session:
+        return redirect(url_for('login'))
+    inv_num = invoice_number_from_url(invoice_number)
+    archived = load_archived('invoice', inv_num)
+    if archived is None:
+        return f'No archived PDF for invoice {inv_num}', 404
+    pdf_bytes, filename = archived
+    return send_file(io.BytesIO(pdf_bytes), mimetype='application/pdf', as_attachment=True,
+                     download_name=filename or f'{inv_num}.pdf', etag=hashlib.sha256(pdf_bytes).hexdigest())
+
+@app.route('/invoices/<invoice_number>')
+def invoice_detail(invoice_number):
+    """One ledger invoice with its line items and payments"""
+    if 'logged_in' not in session:
+        return redirect(url_for('login'))
+    invoice = get_invoice(invoice_number_from_url(invoice_number))
+    if not invoice:
+        return f'Invoice {invoice_number} was not found', 404
+    return invoice
+
 def parse_existing_invoice(pdf_path):
     """Parse an existing invoice PDF to extract editable data"""
     try:
@@ -5,10 +5,10 @@ from pathlib import Path
 from voucher_parser import parse_voucher_pdf
 from invoice_generator import (
     clean_pdf_text,
-    get_next_invoice_number,
     cleanup_old_files,
     extract_text_with_words
 )
+from invoice_numbers import peek_invoice_number, allocate_invoice_number, record_invoice_number
 import os
 import re
 from dotenv import load_dotenv
@@ -82,9 +82,9 @@ def upload_voucher():
     # Clean up the uploaded voucher immediately
     cleanup_old_files(app.config['UPLOAD_DIR'], days_old=0)
     
-    # Provide an auto-generated, editable invoice number to review form
-    auto_inv = get_next_invoice_number()
-    return render_template('review.html', data=data, auto_invoice_number=auto_inv)
+    # Provide an editable preview of the next invoice number; it is allocated on generate
+    auto_inv = peek_invoice_number()
+    return render_template('review.html', data=data, auto_invoice_number=auto_inv, peeked_invoice_number=auto_inv)
 
 @app.route('/review')
 def review():
@@ -130,13 +130,16 @@ def review():
                 data[f'additional_service_rate_{i}'] = request.args.get(f'additional_service_rate_{i}', '')
                 data[f'additional_service_total_{i}'] = request.args.get(f'additional_service_total_{i}', '')
 
-    # The auto_invoice_number will always come from query parameters (either newly generated or extracted from PDF)
-    auto_inv = request.args.get('auto_invoice_number', get_next_invoice_number())
+    # The auto_invoice_number comes from query parameters (extracted from a PDF), else the
+    # next number is only peeked at; viewing the form never uses one up
+    peeked_inv = None if request.args.get('auto_invoice_number') else peek_invoice_number()
+    auto_inv = request.args.get('auto_invoice_number') or peeked_inv
 
     # If the retrieved data already has an invoice_number, prioritize it over auto_inv if auto_inv is a newly generated one.
     # This ensures that when editing, the original invoice number from the PDF is retained.
     if data.get('invoice_number_from_pdf') and not request.args.get('auto_invoice_number'):
         auto_inv = data['invoice_number_from_pdf']
+        peeked_inv = None
 
     if auto_inv and not auto_inv.startswith('INV-'):
         auto_inv = f"INV-{auto_inv}"
@@ -144,7 +147,7 @@ def review():
     print(f"DEBUG: Final data sent to template in review route: {data}")
     print(f"DEBUG: Auto-invoice number sent to template: {auto_inv}")
 
-    return render_template('review.html', data=data, auto_invoice_number=auto_inv)
+    return render_template('review.html', data=data, auto_invoice_number=auto_inv, peeked_invoice_number=peeked_inv)
 
 @app.route('/generate-invoice', methods=['POST'])
 def generate_invoice():
@@ -171,12 +174,14 @@ def generate_invoice():
     }
     
     # Determine invoice number: use edited value if provided, else auto-generate
-    # Ensure INV- prefix is always present
-    if request.form.get('invoice_number'):
+    # Ensure INV- prefix is always present. A number left as the form's preview is allocated now
+    peeked_inv = (request.form.get('auto_invoice_number') or '').strip()
+    if request.form.get('invoice_number') and request.form.get('invoice_number').strip() != peeked_inv:
         raw_inv = request.form.get('invoice_number').strip()
         inv_num = raw_inv if raw_inv.startswith('INV-') else f"INV-{raw_inv}"
+        record_invoice_number(inv_num)
     else:
-        inv_num = get_next_invoice_number()  # Already returns INV-XXXXXX format
+        inv_num = allocate_invoice_number()  # Already returns INV-XXXXXX format
     
     # Add the determined invoice number to invoice_data for use in send_file
     invoice_data['invoice_number'] = inv_num
@@ -0,0 +1,39 @@
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from functools import lru_cache
+
+
+def to_cents(value):
+    """
+    Parse a money value (number, or text such as 'R1,234.50' or 'R 1 234.50') into
+    integer cents. Raises ValueError for anything that is not an amount.
+    """
+    if isinstance(value, bool):
+        raise ValueError(f"Not an amount: {value!r}")
+    if isinstance(value, int):
+        return value * 100
+    if isinstance(value, float):
+        try:
+            return int(round(value * 100))
+        except (ValueError, OverflowError):
+            raise ValueError(f"Not an amount: {value!r}")
+    text = str(value).replace('R', '').replace(',', '').replace(' ', '').strip()
+    try:
+        return int(Decimal(text).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP) * 100)
+    except (InvalidOperation, ValueError):
+        raise ValueError(f"Not an amount: {value!r}")
+
+
+@lru_cache(maxsize=4096)
+def format_zar_cents(cents):
+    """Format integer cents as 'R 1 234.50' (space thousand separators)"""
+    rands, remainder = divmod(abs(cents), 100)
+    sign = '-' if cents < 0 else ''
+    return f"R {sign}{rands:,}.{remainder:02d}".replace(',', ' ')
+
+
+def format_zar(value):
+    """Format any money value for display, falling back to the raw value if it is not an amount"""
+    try:
+        return format_zar_cents(to_cents(value))
+    except ValueError:
+        return f"R {value}"
@@ -0,0 +1,209 @@
+import io
+
+import pdfplumber
+from PyPDF2 import PdfReader, PdfWriter
+from PyPDF2.generic import ContentStream, NameObject
+from reportlab.lib.units import mm
+from reportlab.pdfgen import canvas
+
+from invoice_payload import PAYLOAD_FILENAME, read_payload, invoice_payload_bytes
+
+PAID_COLOR = (0.16, 0.65, 0.27)       # Green #28a745
+PART_PAID_COLOR = (0.79, 0.50, 0.08)  # Golden-brown #ca8015
+TEXT_COLOR = (0.17, 0.24, 0.31)       # #2c3e50
+
+
+def _zar(amount):
+    return f"R {amount:,.2f}".replace(",", " ")
+
+
+def payment_status(invoice_total, payment_received):
+    """Return 'PAID', 'PART-PAID' or None for an invoice's payment position"""
+    if payment_received <= 0:
+        return None
+    if invoice_total - payment_received <= 0.005:
+        return 'PAID'
+    return 'PART-PAID'
+
+
+def find_payment_block(pdf_bytes):
+    """
+    Where the invoice prints its payment figures: (page index, box) with box as
+    (x0, y0, x1, y1) in PDF coordinates around the PAYMENT SUMMARY block, or
+    (index of the last page, None) when the invoice has no such block (the HTML
+    layout only prints the total, on its last page).
+    """
+    with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
+        for index in range(len(pdf.pages) - 1, -1, -1):
+            page = pdf.pages[index]
+            words = page.extract_words()
+            for first, second in zip(words, words[1:]):
+                if first['text'] != 'PAYMENT' or second['text'] != 'SUMMARY':
+                    continue
+                # The smallest box drawn around the heading is the block (a previous stamp's too)
+                shapes = [shape for shape in page.rects + page.curves
+                          if shape['x0'] <= first['x0'] and shape['x1'] >= second['x1']
+                          and shape['top'] <= first['top'] and shape['bottom'] >= first['bottom']]
+                if shapes:
+                    shape = min(shapes, key=lambda s: (s['x1'] - s['x0']) * (s['bottom'] - s['top']))
+                    height = float(page.height)
+                    return index, (float(shape['x0']), height - float(shape['bottom']),
+                                   float(shape['x1']), height - float(shape['top']))
+        return len(pdf.pages) - 1, None
+
+
+def _multiply(a, b):
+    """Product of two PDF matrices [a b c d e f]"""
+    return [a[0] * b[0] + a[1] * b[2], a[0] * b[1] + a[1] * b[3],
+            a[2] * b[0] + a[3] * b[2], a[2] * b[1] + a[3] * b[3],
+            a[4] * b[0] + a[5] * b[2] + b[4], a[4] * b[1] + a[5] * b[3] + b[5]]
+
+
+def remove_text_in_box(page, reader, box):
+    """
+    Drop the text drawn inside box from a page's content stream, so the figures the
+    stamp replaces are gone rather than merely painted over (and no longer extractable).
+    """
+    x0, y0, x1, y1 = box
+    content = ContentStream(page.get_contents(), reader)
+    identity = [1, 0, 0, 1, 0, 0]
+    ctm, stack = identity, []
+    tm = tlm = identity
+    leading = 0
+    kept = []
+    for operands, operator in content.operations:
+        if operator == b'q':
+            stack.append(ctm)
+        elif operator == b'Q' and stack:
+            ctm = stack.pop()
+        elif operator == b'cm':
+            ctm = _multiply([float(v) for v in operands], ctm)
+        elif operator == b'BT':
+            tm = tlm = identity
+        elif operator == b'Tm':
+            tm = tlm = [float(v) for v in operands]
+        elif operator in (b'Td', b'TD'):
+            if operator == b'TD':
+                leading = -float(operands[1])
+            tm = tlm = _multiply([1, 0, 0, 1, float(operands[0]), float(operands[1])], tlm)
+        elif operator == b'TL':
+            leading = float(operands[0])
+        elif operator in (b'T*', b"'", b'"'):
+            tm = tlm = _multiply([1, 0, 0, 1, 0, -leading], tlm)
+        if operator in (b'Tj', b'TJ', b"'", b'"'):
+            x, y = _multiply(tm, ctm)[4:]
+            if x0 <= x <= x1 and y0 <= y <= y1:
+                continue
+        kept.append((operands, operator))
+    content.operations = kept
+    page[NameObject('/Contents')] = content
+
+
+def build_payment_overlay(page_width, page_height, invoice_total, payment_received, box=None):
+    """
+    Draw a one-page overlay with the payment figures and a PAID / PART-PAID stamp.
+    box is the (x0, y0, x1, y1) area of the payment block to cover; by default the
+    summary goes in the bottom right corner. Returns the overlay as PDF bytes sized
+    to match the invoice page.
+    """
+    outstanding = max(0.0, invoice_total - payment_received)
+    status = payment_status(invoice_total, payment_received)
+
+    buffer = io.BytesIO()
+    c = canvas.Canvas(buffer, pagesize=(page_width, page_height), invariant=1)
+
+    # Payment summary box, opaque so it covers what was there
+    box_width, box_height = 85 * mm, 26 * mm
+    if box:
+        # Right-aligned over the old block, at least as large, growing to the left
+        box_width = max(box_width, box[2] - box[0])
+        box_height = max(box_height, box[3] - box[1])
+        x = box[2] - box_width
+        y = box[3] - box_height
+    else:
+        x = page_width - box_width - 8 * mm
+        y = 8 * mm
+    c.setFillColorRGB(1, 1, 1)
+    c.setStrokeColorRGB(*PART_PAID_COLOR)
+    c.setLineWidth(1)
+    c.roundRect(x, y, box_width, box_height, 2 * mm, fill=True, stroke=True)
+
+    c.setFillColorRGB(*PART_PAID_COLOR)
+    c.setFont("Helvetica-Bold", 10)
+    c.drawString(x + 4 * mm, y + box_height - 6 * mm, "PAYMENT SUMMARY")
+
+    c.setFillColorRGB(*TEXT_COLOR)
+    c.setFont("Helvetica", 9)
+    rows = [
+        ("Invoice Total:", invoice_total),
+        ("Payment Received:", payment_received),
+    ]
+    row_y = y + box_height - 11.5 * mm
+    for label, amount in rows:
+        c.drawString(x + 4 * mm, row_y, label)
+        c.drawRightString(x + box_width - 4 * mm, row_y, _zar(amount))
+        row_y -= 4.5 * mm
+    c.setFont("Helvetica-Bold", 10)
+    c.drawString(x + 4 * mm, row_y, "Outstanding Balance:")
+    c.drawRightString(x + box_width - 4 * mm, row_y, _zar(outstanding))
+
+    # Rotated rubber-stamp style marker, semi-transparent so the invoice stays readable
+    if status:
+        color = PAID_COLOR if status == 'PAID' else PART_PAID_COLOR
+        c.saveState()
+        c.translate(page_width - 70 * mm, page_height * 0.45)
+        c.rotate(20)
+        c.setStrokeColorRGB(*color)
+        c.setFillColorRGB(*color)
+        c.setStrokeAlpha(0.7)
+        c.setFillAlpha(0.7)
+        c.setLineWidth(3)
+        c.setFont("Helvetica-Bold", 30)
+        text_width = c.stringWidth(status, "Helvetica-Bold", 30)
+        c.roundRect(-text_width / 2 - 5 * mm, -5 * mm, text_width + 10 * mm, 18 * mm, 3 * mm,
+                    fill=False, stroke=True)
+        c.drawCentredString(0, 0, status)
+        c.restoreState()
+
+    c.showPage()
+    c.save()
+    return buffer.getvalue()
+
+
+def stamp_payment(pdf_bytes, invoice_total, payment_received):
+    """
+    Overlay updated payment figures and a PAID / PART-PAID stamp onto the page of
+    an existing invoice PDF that holds its totals (the last page). A printed payment
+    summary is replaced: its text is removed and the new figures are drawn over it.
+    The invoice is not re-rendered; its pages are otherwise copied as they are.
+    invoice_total may be None when the PDF carries an embedded invoice payload.
+    """
+    invoice = read_payload(pdf_bytes)
+    if invoice_total is None:
+        if not invoice:
+            raise ValueError("No invoice total given and the PDF has no embedded invoice data")
+        invoice_total = float(invoice.get('invoice_total') or 0)
+
+    reader = PdfReader(io.BytesIO(pdf_bytes))
+    page_index, box = find_payment_block(pdf_bytes)
+    totals_page = reader.pages[page_index]
+    if box:
+        remove_text_in_box(totals_page, reader, box)
+    page_width = float(totals_page.mediabox.width)
+    page_height = float(totals_page.mediabox.height)
+    overlay_bytes = build_payment_overlay(page_width, page_height, invoice_total, payment_received, box)
+    totals_page.merge_page(PdfReader(io.BytesIO(overlay_bytes)).pages[0])
+
+    writer = PdfWriter()
+    for page in reader.pages:
+        writer.add_page(page)
+    if reader.metadata:
+        writer.add_metadata(reader.metadata)
+    if invoice:
+        # Keep the embedded data in step with the figures now printed on the page
+        invoice['total_payment_received'] = payment_received
+        writer.add_attachment(PAYLOAD_FILENAME, invoice_payload_bytes(invoice))
+
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
@@ -0,0 +1,106 @@
+import collections
+import threading
+from contextlib import contextmanager
+
+# Bounds on wkhtmltopdf: each render is a separate WebKit process, so the number
+# running at once is what bounds render memory. Set from app config via configure().
+RENDER_CONCURRENCY = 2
+RENDER_TIMEOUT = 60        # seconds one render may take before its process is killed
+RENDER_QUEUE_TIMEOUT = 30  # seconds a request waits for a free render slot
+
+
+class RenderTimeoutError(RuntimeError):
+    """
+    A render did not finish, or never got a slot, in time. Not an OSError on purpose:
+    falling back to reportlab would bypass the render limit exactly when it is needed,
+    so callers answer 503 and let the client retry instead.
+    """
+
+
+class RenderLimiter:
+    """
+    Caps how many renders run at once. Waiters are admitted strictly in arrival
+    order: a finishing render hands its slot straight to the oldest waiter.
+    """
+
+    def __init__(self, limit):
+        self.limit = max(1, int(limit))
+        self.in_flight = 0
+        self._waiters = collections.deque()
+        self._lock = threading.Lock()
+
+    @property
+    def queued(self):
+        return len(self._waiters)
+
+    def acquire(self, timeout=None):
+        """Wait for a slot; returns False if none became free within timeout seconds"""
+        with self._lock:
+            if self.in_flight < self.limit and not self._waiters:
+                self.in_flight += 1
+                return True
+            waiter = threading.Event()
+            self._waiters.append(waiter)
+
+        if waiter.wait(timeout):
+            return True
+        with self._lock:
+            if waiter.is_set():
+                # The slot was handed over just as the wait timed out
+                return True
+            self._waiters.remove(waiter)
+            return False
+
+    def release(self):
+        with self._lock:
+            # Admit waiters while there is room (more than one if the limit was raised)
+            while self._waiters and self.in_flight <= self.limit:
+                self._waiters.popleft().set()
+                if self.in_flight < self.limit:
+                    self.in_flight += 1
+                else:
+                    return  # the slot passes straight to the waiter
+            self.in_flight -= 1
+
+    def set_limit(self, limit):
+        with self._lock:
+            self.limit = max(1, int(limit))
+            while self._waiters and self.in_flight < self.limit:
+                self._waiters.popleft().set()
+                self.in_flight += 1
+
+
+_limiter = RenderLimiter(RENDER_CONCURRENCY)
+
+
+def configure(concurrency=None, timeout=None, queue_timeout=None):
+    """Apply the app's render limits"""
+    global RENDER_TIMEOUT, RENDER_QUEUE_TIMEOUT
+    if concurrency is not None:
+        _limiter.set_limit(concurrency)
+    if timeout is not None:
+        RENDER_TIMEOUT = timeout
+    if queue_timeout is not None:
+        RENDER_QUEUE_TIMEOUT = queue_timeout
+
+
+@contextmanager
+def render_slot():
+    """Hold one render slot for the duration of the block, waiting in line for it"""
+    if not _limiter.acquire(RENDER_QUEUE_TIMEOUT):
+        raise RenderTimeoutError(f"No render slot became free within {RENDER_QUEUE_TIMEOUT}s "
+                                 f"({_limiter.in_flight} running, {_limiter.queued} waiting)")
+    try:
+        yield
+    finally:
+        _limiter.release()
+
+
+def render_counts():
+    """Current concurrency figures for the health endpoint"""
+    return {
+        'render_limit': _limiter.limit,
+        'renders_in_flight': _limiter.in_flight,
+        'renders_queued': _limiter.queued,
+        'render_timeout_s': RENDER_TIMEOUT
+    }
@@ -0,0 +1,76 @@
+import hashlib
+import io
+import os
+import re
+
+from PyPDF2 import PdfReader, PdfWriter
+
+from archive_store import store, load
+from invoice_payload import read_payload
+
+VOUCHER_REF_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+
+def save_voucher(pdf_bytes):
+    """
+    Keep the original bytes of an uploaded voucher in the archive, under their SHA-256.
+    Returns the voucher reference carried through the review form.
+    """
+    ref = hashlib.sha256(pdf_bytes).hexdigest()
+    store('voucher', ref, pdf_bytes, filename=f"{ref}.pdf")
+    return ref
+
+
+def load_voucher(directory, ref):
+    """
+    Return the stored voucher bytes for a reference, or None if unknown. directory
+    holds vouchers saved as plain files before they went into the archive.
+    """
+    ref = (ref or '').strip().lower()
+    if not VOUCHER_REF_PATTERN.match(ref):
+        return None
+    archived = load('voucher', ref)
+    if archived:
+        return archived[0]
+    try:
+        with open(os.path.join(directory, f"{ref}.pdf"), 'rb') as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def merge_submission_pack(invoice_pdf, voucher_pdf, voucher_first=False):
+    """
+    Combine an invoice and its voucher into one PDF. Pages are copied as they are,
+    with their content streams still compressed; nothing is re-rendered.
+    """
+    invoice_reader = PdfReader(io.BytesIO(invoice_pdf))
+    voucher_reader = PdfReader(io.BytesIO(voucher_pdf))
+    readers = [voucher_reader, invoice_reader] if voucher_first else [invoice_reader, voucher_reader]
+
+    writer = PdfWriter()
+    for reader in readers:
+        for page in reader.pages:
+            writer.add_page(page)
+    if invoice_reader.metadata:
+        writer.add_metadata(invoice_reader.metadata)
+
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+
+def build_submission_pack(directory, invoice_pdf, voucher_pdf=None, voucher_ref=None, voucher_first=False):
+    """
+    Build the pack for one invoice. The voucher comes from voucher_pdf, an explicit
+    voucher_ref, or the voucher_ref embedded in the invoice when it was generated.
+    Raises ValueError when no voucher can be found.
+    """
+    if voucher_pdf is None:
+        if not voucher_ref:
+            invoice = read_payload(invoice_pdf) or {}
+            voucher_ref = invoice.get('voucher_ref')
+        voucher_pdf = load_voucher(directory, voucher_ref)
+        if voucher_pdf is None:
+            raise ValueError("The original voucher for this invoice is not available; upload it with the invoice")
+    return merge_submission_pack(invoice_pdf, voucher_pdf, voucher_first)
@@ -0,0 +1,21 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# The app modules live at the top level of the repository
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('RENDERER_WARMUP', '0')
+# Keep the app away from the real invoices.db and archive
+_scratch = tempfile.mkdtemp(prefix='ulendo-tests-')
+os.environ.setdefault('INVOICE_DB_PATH', os.path.join(_scratch, 'invoices.db'))
+os.environ.setdefault('ARCHIVE_DIR', os.path.join(_scratch, 'archive'))
+
+
+@pytest.fixture
+def app_context():
+    """The Flask app context the HTML templates render in"""
+    from main import app
+    with app.app_context():
+        yield app
@@ -0,0 +1,18 @@
+import pytest
+
+
+@pytest.mark.parametrize('body, message', [
+    ({'invoices': [{'passenger_names': 'A'}, 'G846886']}, 'invoice 1 is not an object'),
+    ([{'line_items': [{'description': 'Night 1'}, 850]}], 'invoice 0 has a line item that is not an object'),
+    ({'invoices': 'G846886'}, 'expected a list of invoices'),
+])
+def test_malformed_bulk_payload_is_a_bad_request(monkeypatch, tmp_path, app_context, body, message):
+    # The routes append to a debug log relative to the working directory
+    monkeypatch.chdir(tmp_path)
+    client = app_context.test_client()
+    with client.session_transaction() as sess:
+        sess['logged_in'] = True
+    for url in ('/bulk-export', '/generate-batch'):
+        response = client.post(url, json=body)
+        assert response.status_code == 400
+        assert message in response.get_data(as_text=True)
@@ -0,0 +1,78 @@
+import io
+import time
+
+import pytest
+from PyPDF2 import PdfReader
+
+import invoice_renderer
+from invoice_payload import read_payload
+from invoice_renderer import (render_invoice_pdf_reportlab, render_invoice_pdf_wkhtmltopdf,
+                              render_invoices_combined_pdf, split_combined_pdf, wkhtmltopdf_available)
+
+INVOICE = {
+    'invoice_date': '2025-08-01',
+    'voucher_number': 'G846886',
+    'passenger_names': 'MR T KEKANA',
+    'customer_name': 'MR T KEKANA',
+    'check_in': '2025/08/01',
+    'check_out': '2025/08/04',
+    'total_payment_received': '0.00',
+    'line_items': [
+        {'description': 'Accommodation - Room booked, Single', 'qty': 3, 'unit_price': 850.0, 'total': 2550.0},
+        {'description': 'Laundry Transport', 'qty': 1, 'unit_price': 120.0, 'total': 120.0},
+    ]
+}
+
+ENGINES = [
+    pytest.param(render_invoice_pdf_reportlab, id='reportlab'),
+    pytest.param(render_invoice_pdf_wkhtmltopdf, id='wkhtmltopdf',
+                 marks=pytest.mark.skipif(not wkhtmltopdf_available(), reason='wkhtmltopdf is not installed')),
+]
+
+
+@pytest.mark.usefixtures('app_context')
+@pytest.mark.parametrize('render', ENGINES)
+def test_same_invoice_renders_to_same_bytes(render):
+    first = render(dict(INVOICE), 'INV-000001', deterministic=True)
+    time.sleep(1.1)  # a wall-clock timestamp in the output would now differ
+    second = render(dict(INVOICE), 'INV-000001', deterministic=True)
+    assert first == second
+
+
+@pytest.mark.usefixtures('app_context')
+@pytest.mark.parametrize('render', ENGINES)
+def test_id_and_dates_come_from_the_invoice(render):
+    reader = PdfReader(io.BytesIO(render(dict(INVOICE), 'INV-000001', deterministic=True)))
+    file_id = reader.trailer['/ID']
+    assert len(file_id) == 2 and file_id[0] == file_id[1]
+    assert reader.metadata['/CreationDate'] == "D:20250801000000+00'00'"
+    assert reader.metadata['/Producer'] == 'Ulendo Invoice Generator'
+
+
+def test_different_invoices_get_different_ids():
+    first = render_invoice_pdf_reportlab(dict(INVOICE), 'INV-000001', deterministic=True)
+    second = render_invoice_pdf_reportlab(dict(INVOICE), 'INV-000002', deterministic=True)
+    assert PdfReader(io.BytesIO(first)).trailer['/ID'][0] != PdfReader(io.BytesIO(second)).trailer['/ID'][0]
+
+
+@pytest.mark.usefixtures('app_context')
+@pytest.mark.parametrize('engine', [
+    'reportlab',
+    pytest.param('wkhtmltopdf', marks=pytest.mark.skipif(not wkhtmltopdf_available(),
+                                                         reason='wkhtmltopdf is not installed')),
+])
+def test_combined_batch_is_finalized(monkeypatch, engine):
+    monkeypatch.setattr(invoice_renderer, 'active_engine', lambda: engine)
+    jobs = [(dict(INVOICE), 'INV-000001'), (dict(INVOICE, voucher_number='G846887'), 'INV-000002')]
+    first = render_invoices_combined_pdf(jobs, deterministic=True)
+    time.sleep(1.1)
+    assert render_invoices_combined_pdf(jobs, deterministic=True) == first
+
+    reader = PdfReader(io.BytesIO(first))
+    assert reader.trailer['/ID'][0] == reader.trailer['/ID'][1]
+    names = reader.trailer['/Root']['/Names']['/EmbeddedFiles']['/Names']
+    assert [str(name) for name in names[::2]] == ['ulendo-invoice-INV-000001.json', 'ulendo-invoice-INV-000002.json']
+
+    for (_, inv_num), (split_num, part) in zip(jobs, split_combined_pdf(first, jobs, deterministic=True)):
+        assert split_num == inv_num and read_payload(part)['invoice_number'] == inv_num
+        assert '/ID' in PdfReader(io.BytesIO(part)).trailer
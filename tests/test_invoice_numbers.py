@@ -0,0 +1,72 @@
+from invoice_numbers import (FIRST_INVOICE_NUMBER, InvoiceNumberAllocator, find_number_gaps,
+                             format_invoice_number, is_number_issued, peek_unreserved_number)
+
+
+def test_typed_number_is_never_allocated(tmp_path):
+    db_path = str(tmp_path / 'numbers.db')
+    allocator = InvoiceNumberAllocator(db_path, block_size=5)
+    typed = format_invoice_number(FIRST_INVOICE_NUMBER + 2)
+    assert allocator.record(typed)
+    # Re-generating the typed invoice records it again without complaint
+    assert allocator.record(typed)
+
+    allocated = [allocator.allocate() for _ in range(4)]
+    assert typed not in allocated
+    assert is_number_issued('702', db_path) and is_number_issued('INV-000700', db_path)
+    assert not is_number_issued(format_invoice_number(705), db_path)
+    assert allocated == [format_invoice_number(n) for n in (700, 701, 703, 704)]
+    assert find_number_gaps(db_path) == []
+
+
+def test_typed_number_ahead_of_counter(tmp_path):
+    db_path = str(tmp_path / 'numbers.db')
+    allocator = InvoiceNumberAllocator(db_path, block_size=2)
+    allocator.record('900')
+    allocator.record('INV-000700')
+    assert peek_unreserved_number(db_path) == 701
+    # Typed numbers beyond the counter are not gaps
+    assert allocator.allocate() == format_invoice_number(701)
+    assert find_number_gaps(db_path) == []
+    assert not allocator.record('INV-ABC')
+
+
+def test_released_numbers_skip_typed_ones(tmp_path):
+    db_path = str(tmp_path / 'numbers.db')
+    allocator = InvoiceNumberAllocator(db_path, block_size=3)
+    allocator.allocate()
+    assert allocator.release() == 2
+    allocator.record('701')
+    assert peek_unreserved_number(db_path) == 702
+    assert InvoiceNumberAllocator(db_path, block_size=3).allocate() == format_invoice_number(702)
+
+
+def test_allocation_is_unique_across_processes(tmp_path):
+    # The benchmark's workers are separate spawned processes sharing one database
+    import benchmark_db
+
+    db_path = str(tmp_path / 'numbers.db')
+    collected, _ = benchmark_db.run(processes=4, threads=2, count=20, block_size=3, db_path=db_path,
+                                    journal_mode='WAL')
+    numbers = [n for _, out, _, _ in collected for n in out['numbers']]
+    assert len(numbers) == 4 * 2 * 20
+    assert len(set(numbers)) == len(numbers)
+    assert find_number_gaps(db_path) == []
+
+
+def test_invoice_urls_accept_bare_numbers(monkeypatch, tmp_path, app_context):
+    from invoice_ledger import record_invoice
+    from invoice_numbers import invoice_number_from_url
+
+    assert invoice_number_from_url(' 712 ') == 'INV-000712'
+    assert invoice_number_from_url('INV-000712') == 'INV-000712'
+    assert invoice_number_from_url('ABC') == 'INV-ABC'
+
+    # The routes append to a debug log relative to the working directory
+    monkeypatch.chdir(tmp_path)
+    record_invoice({'voucher_number': 'G712', 'line_items': []}, 'INV-000712')
+    client = app_context.test_client()
+    with client.session_transaction() as sess:
+        sess['logged_in'] = True
+    for number in ('712', 'INV-000712'):
+        assert client.get(f'/invoices/{number}').status_code == 200
+    assert client.get('/edit-invoice?invoice_number=712').status_code == 302
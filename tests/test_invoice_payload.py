@@ -0,0 +1,15 @@
+from invoice_payload import build_payload
+from money import format_zar
+
+
+def test_payload_amounts_go_through_cents():
+    invoice = build_payload({
+        'total_payment_received': format_zar(1234.5),
+        'line_items': [
+            {'description': 'Accommodation', 'qty': 3, 'unit_price': 'R 850.10', 'total': 'R 2 550.30'},
+            {'description': 'Laundry', 'qty': 1, 'unit_price': 0.1, 'total': 0.2},
+        ],
+    }, 'INV-000700')['invoice']
+    assert invoice['total_payment_received'] == 1234.5
+    assert [item['total'] for item in invoice['line_items']] == [2550.3, 0.2]
+    assert invoice['invoice_total'] == 2550.5
@@ -0,0 +1,25 @@
+from invoice_generator import paginate_line_items, SINGLE_PAGE_ROWS, FIRST_PAGE_ROWS, PAGE_ROWS
+
+
+def items(count):
+    return [{'description': f'Night {i + 1}', 'qty': 1, 'unit_price': 100.0, 'total': 100.0} for i in range(count)]
+
+
+def test_invoice_that_fits_one_page_is_not_split():
+    pages = list(paginate_line_items(items(SINGLE_PAGE_ROWS)))
+    assert len(pages) == 1
+    assert pages[0]['is_first'] and pages[0]['is_last']
+    assert len(pages[0]['rows']) == SINGLE_PAGE_ROWS
+
+
+def test_long_invoice_carries_subtotals_forward():
+    count = SINGLE_PAGE_ROWS + PAGE_ROWS
+    pages = list(paginate_line_items(iter(items(count))))
+    assert [len(page['rows']) for page in pages] == [FIRST_PAGE_ROWS, PAGE_ROWS, count - FIRST_PAGE_ROWS - PAGE_ROWS]
+    assert [page['is_last'] for page in pages] == [False, False, True]
+    assert pages[1]['brought_forward'] == pages[0]['carried_forward'] == FIRST_PAGE_ROWS * 100.0
+    assert pages[-1]['carried_forward'] == count * 100.0
+
+
+def test_no_line_items_still_gives_one_page():
+    assert [page['rows'] for page in paginate_line_items([])] == [[]]
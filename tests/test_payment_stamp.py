@@ -0,0 +1,52 @@
+import io
+
+import pdfplumber
+
+from invoice_generator import render_invoice_pdf_bytes
+from payment_stamp import find_payment_block, stamp_payment
+
+
+def invoice(items, payment_received='500.00'):
+    return {
+        'invoice_date': '2025-08-01',
+        'voucher_number': 'G846886',
+        'passenger_names': 'MR T KEKANA',
+        'customer_name': 'MR T KEKANA',
+        'total_payment_received': payment_received,
+        'line_items': [{'description': f'Night {i + 1}', 'qty': 1, 'unit_price': 850.0, 'total': 850.0}
+                       for i in range(items)],
+    }
+
+
+def page_texts(pdf_bytes):
+    """Text of each page, leaving out the rotated PAID / PART-PAID stamp"""
+    with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
+        return [page.filter(lambda obj: obj['object_type'] != 'char' or obj['matrix'][1] == 0).extract_text()
+                for page in pdf.pages]
+
+
+def test_stamp_replaces_the_printed_payment_summary():
+    original = render_invoice_pdf_bytes('INV-000700', invoice(3), invariant=True)
+    assert 'ZAR 500.00' in page_texts(original)[0]
+
+    text, = page_texts(stamp_payment(original, 2550.0, 2550.0))
+    assert 'Payment Received: R 2 550.00' in text
+    assert 'ZAR 500.00' not in text
+    assert text.count('Payment Received') == 1
+
+
+def test_stamp_lands_on_the_page_with_the_totals():
+    original = render_invoice_pdf_bytes('INV-000700', invoice(40), invariant=True)
+    page_index, box = find_payment_block(original)
+    assert page_index == len(page_texts(original)) - 1 and box
+
+    stamped = stamp_payment(original, 34000.0, 1000.0)
+    texts = page_texts(stamped)
+    assert 'Payment Received' not in texts[0]
+    assert 'Payment Received: R 1 000.00' in texts[-1]
+    assert 'Outstanding Balance: R 33 000.00' in texts[-1]
+
+    # Stamping again replaces the previous stamp in place
+    restamped = stamp_payment(stamped, 34000.0, 2000.0)
+    assert find_payment_block(restamped)[1] == find_payment_block(stamped)[1]
+    assert page_texts(restamped)[-1].count('Payment Received') == 1
@@ -0,0 +1,51 @@
+import pytest
+
+import invoice_renderer
+import render_manager
+from render_manager import RenderTimeoutError, render_slot
+
+
+def test_full_queue_times_out(monkeypatch):
+    monkeypatch.setattr(render_manager, 'RENDER_QUEUE_TIMEOUT', 0.1)
+    limiter = render_manager._limiter
+    held = [limiter.acquire() for _ in range(limiter.limit)]
+    try:
+        with pytest.raises(RenderTimeoutError):
+            with render_slot():
+                pass
+    finally:
+        for _ in held:
+            limiter.release()
+    assert not issubclass(RenderTimeoutError, OSError)
+
+
+def test_timeout_does_not_fall_back_to_reportlab(monkeypatch):
+    def timed_out(*args, **kwargs):
+        raise RenderTimeoutError('wkhtmltopdf did not finish')
+
+    def reportlab(*args, **kwargs):
+        raise AssertionError('reportlab must not render around the limit')
+
+    monkeypatch.setattr(invoice_renderer, 'active_engine', lambda: 'wkhtmltopdf')
+    monkeypatch.setattr(invoice_renderer, 'render_invoice_pdf_wkhtmltopdf', timed_out)
+    monkeypatch.setattr(invoice_renderer, 'render_invoice_pdf_reportlab', reportlab)
+    with pytest.raises(RenderTimeoutError):
+        invoice_renderer.render_invoice_pdf({}, 'INV-000700')
+
+
+def test_generate_answers_503(monkeypatch, tmp_path, app_context):
+    import main
+
+    # generate_invoice appends to a debug log relative to the working directory
+    monkeypatch.chdir(tmp_path)
+
+    def timed_out(*args, **kwargs):
+        raise RenderTimeoutError('No render slot became free')
+
+    monkeypatch.setattr(main, 'render_invoice', timed_out)
+    client = app_context.test_client()
+    with client.session_transaction() as sess:
+        sess['logged_in'] = True
+    response = client.post('/generate-invoice', data={'invoice_number': 'INV-TEST-503', 'passenger_names': 'A'})
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == str(app_context.config['RENDER_QUEUE_TIMEOUT'])
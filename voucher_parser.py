@@ -366,6 +366,8 @@ def convert_to_invoice_format(data):
     # Assuming 'remarks' is a key in 'data' and 'voucher' under 'remarks' is a list of strings
     voucher_remarks_list = data.get('remarks', {}).get('voucher', [])
     voucher_remarks_text = " ".join(voucher_remarks_list) # Join all remarks into a single string
+    # Kept with the invoice so the ledger can search it
+    invoice_data['remarks'] = " ".join(voucher_remarks_text.split())
     
     # #region agent log
     with open(r'c:\Users\computer\Desktop\ULendo-Lodge-Invoice-Software-main\.cursor\debug.log', 'a', encoding='utf-8') as f: